@@ -0,0 +1,4 @@
+"""Block-rewrite codemods for the Flutter tree.
+
+``modify_trends.py`` is the entry point; ``python -m codemod`` works too.
+"""
@@ -0,0 +1,311 @@
+"""Shared per-file analysis store, keyed by content hash and memory-mapped.
+
+Rewriting, scanning, import checks and the l10n audit all start from the
+same facts about a file: its token stream, its bracket spans and calls, its
+directive header and the localization keys it references. Each is worked
+out once per file content and stored under
+``.dart_tool/codemod/analysis/<sha256[:2]>/<sha256[2:]>.<section>``, so any
+command, worker process or server after the first starts from it instead
+of lexing the file again. An edited file has a new hash and simply gets new
+entries; entries are never updated in place.
+
+A section is a small header followed by flat arrays: the token section
+holds the distinct symbols once and the stream as ``uint32`` symbol ids,
+start and end offsets; the structure section holds spans, calls and
+arguments as ``uint32`` records. Sections are mapped read-only with
+:mod:`mmap`, so processes share the pages, and the offset arrays are used
+in place as memoryviews rather than copied into lists. Directives and key
+references are small and stored as JSON.
+
+Sections are computed when first asked for: a rewrite that never meets a
+structural anchor does not pay for the structure section. The oldest
+entries are removed once the store grows past :data:`MAX_BYTES`.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from codemod import fileio
+from codemod.cache import content_digest
+from codemod.imports import Directive, directives
+from codemod.l10n import extract
+from codemod.structure import Arg, Call, StructureIndex
+from codemod.tokens import TokenIndex
+
+STORE_VERSION = 1
+MAGIC = b'CMA1'
+# Entries kept before the least recently used are removed.
+MAX_BYTES = 64 << 20
+
+_HEADER = struct.Struct('<4sII')          # magic, version, field count
+_FIELD = struct.Struct('<12s1s3xQQ')      # name, typecode, offset, item count
+_UINT = 'I'
+assert array(_UINT).itemsize == 4
+
+
+def _pack(fields: Dict[str, array]) -> bytes:
+    """A section: the header, the field table, then each array 8-byte aligned."""
+    offset = _HEADER.size + _FIELD.size * len(fields)
+    table = []
+    data = []
+    for name, values in fields.items():
+        pad = -offset % 8
+        data.append(b'\0' * pad)
+        offset += pad
+        raw = values.tobytes()
+        table.append(_FIELD.pack(name.encode(), values.typecode.encode(), offset, len(values)))
+        data.append(raw)
+        offset += len(raw)
+    return _HEADER.pack(MAGIC, STORE_VERSION, len(fields)) + b''.join(table) + b''.join(data)
+
+
+def _unpack(view: memoryview) -> Optional[Dict[str, memoryview]]:
+    """The fields of a section as typed views into it, or None if it is not one."""
+    try:
+        magic, version, count = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != STORE_VERSION:
+            return None
+        fields = {}
+        for i in range(count):
+            name, code, offset, items = _FIELD.unpack_from(view, _HEADER.size + i * _FIELD.size)
+            code = code.decode()
+            size = array(code).itemsize
+            if offset + items * size > len(view):
+                return None
+            part = view[offset:offset + items * size]
+            fields[name.rstrip(b'\0').decode()] = part if code == 'B' else part.cast(code)
+    except (struct.error, ValueError, TypeError):
+        # Truncated or corrupt: a short field table, or a bad typecode or name.
+        return None
+    return fields
+
+
+def _strings(values: List[bytes]) -> Dict[str, array]:
+    """A string table: the values concatenated, and where each one starts and ends."""
+    bounds = array(_UINT, [0])
+    for value in values:
+        bounds.append(bounds[-1] + len(value))
+    return {'text': array('B', b''.join(values)), 'bounds': bounds}
+
+
+def _unstrings(fields: Dict[str, memoryview]) -> List[bytes]:
+    text = bytes(fields['text'])
+    bounds = fields['bounds']
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+# -- sections ---------------------------------------------------------------
+
+def _encode_tokens(index: TokenIndex) -> Dict[str, array]:
+    ids: Dict[bytes, int] = {}
+    stream = array(_UINT, [ids.setdefault(s, len(ids)) for s in index.symbols])
+    fields = _strings(list(ids))
+    fields['ids'] = stream
+    fields['starts'] = array(_UINT, index.starts)
+    fields['ends'] = array(_UINT, index.ends)
+    return fields
+
+
+def _decode_tokens(fields, buf) -> TokenIndex:
+    table = _unstrings(fields)
+    return TokenIndex.restore(tuple(map(table.__getitem__, fields['ids'])),
+                              fields['starts'], fields['ends'])
+
+
+def _encode_structure(index: StructureIndex) -> Dict[str, array]:
+    names: Dict[bytes, int] = {}
+    spans = array(_UINT)
+    for start, end, char in index.spans:
+        spans.extend((start, end, char[0]))
+    calls = array(_UINT)
+    args = array(_UINT)
+    for call in index.calls:
+        name = names.setdefault(call.name.encode('utf-8'), len(names))
+        calls.extend((name, call.start, call.name_start, call.open, call.end, call.depth, len(call.args)))
+        for arg in call.args:
+            # Name ids are shifted by one so that 0 stands for a positional argument.
+            label = 0 if arg.name is None else names.setdefault(arg.name.encode('utf-8'), len(names)) + 1
+            args.extend((label, arg.start, arg.end))
+    fields = _strings(list(names))
+    fields.update(spans=spans, calls=calls, args=args)
+    return fields
+
+
+def _decode_structure(fields, buf) -> StructureIndex:
+    names = [n.decode('utf-8') for n in _unstrings(fields)]
+    s = fields['spans']
+    spans = [(s[i], s[i + 1], bytes((s[i + 2],))) for i in range(0, len(s), 3)]
+    c = fields['calls']
+    a = fields['args']
+    calls = []
+    k = 0
+    for i in range(0, len(c), 7):
+        call = Call(names[c[i]], c[i + 1], c[i + 2], c[i + 3], c[i + 5])
+        call.end = c[i + 4]
+        for _ in range(c[i + 6]):
+            label = a[k]
+            call.args.append(Arg(names[label - 1] if label else None, a[k + 1], a[k + 2]))
+            k += 3
+        calls.append(call)
+    return StructureIndex.restore(buf, spans, calls)
+
+
+def _encode_json(value) -> Dict[str, array]:
+    return {'json': array('B', json.dumps(value, separators=(',', ':')).encode('utf-8'))}
+
+
+def _decode_directives(fields, buf) -> List[Directive]:
+    return [Directive(*d) for d in json.loads(bytes(fields['json']))]
+
+
+def _decode_refs(fields, buf) -> Dict[str, List[int]]:
+    return json.loads(bytes(fields['json']))
+
+
+# name -> (compute from a FileAnalysis, encode, decode)
+SECTIONS: Dict[str, tuple] = {
+    'tokens': (lambda a: TokenIndex(a.buf), _encode_tokens, _decode_tokens),
+    'structure': (lambda a: StructureIndex(a.buf, a.tokens), _encode_structure, _decode_structure),
+    'imports': (
+        lambda a: directives(a.buf, a.tokens),
+        lambda found: _encode_json([[d.keyword, d.uri, d.start, d.end] for d in found]),
+        _decode_directives,
+    ),
+    'l10n': (lambda a: extract(a.buf, a.tokens), _encode_json, _decode_refs),
+}
+
+
+class FileAnalysis:
+    """What is known about one file content; each part is loaded or computed on first use."""
+
+    __slots__ = ('store', 'buf', 'sha256', '_parts')
+
+    def __init__(self, store: 'AnalysisStore', buf, sha256: str):
+        self.store = store
+        self.buf = buf
+        self.sha256 = sha256
+        self._parts: Dict[str, object] = {}
+
+    def _get(self, section: str):
+        part = self._parts.get(section)
+        if part is None:
+            part = self._parts[section] = self.store.load(self, section)
+        return part
+
+    @property
+    def tokens(self) -> TokenIndex:
+        return self._get('tokens')
+
+    @property
+    def structure(self) -> StructureIndex:
+        return self._get('structure')
+
+    @property
+    def directives(self) -> List[Directive]:
+        return self._get('imports')
+
+    @property
+    def l10n_refs(self) -> Dict[str, List[int]]:
+        return self._get('l10n')
+
+
+class AnalysisStore:
+    """Analysis sections on disk by content hash; with no directory, computed and not kept."""
+
+    def __init__(self, directory: Optional[Path]):
+        self.directory = None if directory is None else Path(directory)
+        self.loaded = 0
+        self.computed = 0
+
+    def analysis(self, buf, sha256: Optional[str] = None) -> FileAnalysis:
+        if sha256 is None:
+            sha256 = content_digest(buf)
+        return FileAnalysis(self, buf, sha256)
+
+    def path(self, sha256: str, section: str) -> Path:
+        return self.directory / sha256[:2] / f'{sha256[2:]}.{section}'
+
+    def load(self, analysis: FileAnalysis, section: str):
+        compute, encode, decode = SECTIONS[section]
+        if self.directory is None:
+            self.computed += 1
+            return compute(analysis)
+        path = self.path(analysis.sha256, section)
+        fields = _map(path)
+        if fields is not None:
+            try:
+                part = decode(fields, analysis.buf)
+            except (KeyError, IndexError, ValueError, TypeError):
+                # Well-formed arrays that do not make a section; rebuilt below.
+                part = None
+            if part is not None:
+                self.loaded += 1
+                try:
+                    # Recently used entries are the last to be pruned.
+                    os.utime(path)
+                except OSError:
+                    pass
+                return part
+        self.computed += 1
+        part = compute(analysis)
+        _write(path, _pack(encode(part)))
+        return part
+
+    def prune(self, max_bytes: int = MAX_BYTES) -> int:
+        """Remove least recently used entries past ``max_bytes``; returns how many."""
+        if self.directory is None or not self.directory.is_dir():
+            return 0
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+        removed = 0
+        if total <= max_bytes:
+            return 0
+        # Down to three quarters, so the next runs do not prune again at once.
+        for _, size, path in sorted(entries):
+            if total <= max_bytes * 3 // 4:
+                break
+            fileio.discard(path)
+            total -= size
+            removed += 1
+        return removed
+
+
+def _map(path: Path) -> Optional[Dict[str, memoryview]]:
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Missing, or empty and so not mappable.
+        return None
+    return _unpack(memoryview(mapped))
+
+
+def _write(path: Path, data: bytes) -> None:
+    """Put a section in place atomically; another process may be writing the same one."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.analysis-')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        fileio.discard(tmp)
+
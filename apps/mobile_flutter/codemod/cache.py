@@ -0,0 +1,86 @@
+"""On-disk manifest of what has already been applied to which file.
+
+Each entry records a file's size, mtime and content hash after the last run,
+plus the digests of the rules already evaluated against that content. A
+rerun skips a file without reading it when its stat matches and no rule was
+added, and only evaluates the new rules when its content hash still matches.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional
+
+from codemod.rules import RuleSet
+
+MANIFEST_VERSION = 1
+
+
+def rule_digests(ruleset: RuleSet) -> Dict[str, str]:
+    """Digest per rule name, covering its templates and required import."""
+    digests = {}
+    for rule in ruleset.rules:
+        h = hashlib.sha256()
+        parts = (rule.name, rule.before, rule.after, rule.requires_import or '', rule.match or '')
+        for part in parts:
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        digests[rule.name] = h.hexdigest()[:16]
+    return digests
+
+
+def content_digest(data) -> str:
+    """SHA-256 of a bytes-like object, ``mmap`` included."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def entry(self, path: str) -> Optional[dict]:
+        return self.files.get(path)
+
+    def is_fresh(self, path: str, st: os.stat_result, digests: FrozenSet[str]) -> bool:
+        """True when ``path`` is untouched since the last run and every rule was applied."""
+        entry = self.files.get(path)
+        return (
+            entry is not None
+            and entry['size'] == st.st_size
+            and entry['mtime_ns'] == st.st_mtime_ns
+            and digests.issubset(entry['rules'])
+        )
+
+    def record(self, path: str, size: int, mtime_ns: int, sha256: str, rules) -> None:
+        self.files[path] = {
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': sha256,
+            'rules': sorted(rules),
+        }
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.manifest-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': self.files}, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
@@ -0,0 +1,524 @@
+"""Command line interface shared by ``modify_trends.py`` and ``python -m codemod``."""
+
+import argparse
+import os
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from codemod import journal, l10n, packs, report, runner, scan
+from codemod.analysis import AnalysisStore
+from codemod.cache import Manifest
+from codemod.engine import Task
+from codemod.structure import Pattern
+from codemod.trigrams import TrigramIndex
+from codemod.watch import Watcher
+
+APP_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_ROOTS = ('lib', 'test')
+CACHE_DIR = APP_ROOT / '.dart_tool' / 'codemod'
+L10N_DIR = APP_ROOT / 'lib' / 'l10n'
+JOURNAL_DIR = CACHE_DIR / 'journal'
+ANALYSIS_DIR = CACHE_DIR / 'analysis'
+
+
+def add_common_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        'paths', nargs='*', type=Path,
+        help='files or directories to process (default: lib and test)',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '-p', '--pack', type=Path, default=packs.DEFAULT_PACK,
+        help='rule pack directory or JSON file (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='ignore and do not update the caches in .dart_tool/codemod; '
+        'undo journals are still written there',
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py',
+        description='Apply block-rewrite rules to the Dart files of the Flutter app.',
+        epilog='Other commands: ' + ', '.join(c for c in COMMANDS if c != 'rewrite')
+        + '. Run "modify_trends.py COMMAND -h" for their options.',
+    )
+    add_common_args(parser)
+    parser.add_argument(
+        '-n', '--dry-run', action='store_true',
+        help='write nothing; print one unified diff of all changes to stdout',
+    )
+    parser.add_argument(
+        '--fixed-point', action='store_true',
+        help='re-apply the rules to their own output until files stop changing',
+    )
+    parser.add_argument(
+        '--max-passes', type=int, default=16, metavar='N',
+        help='with --fixed-point, give up on a file after N passes (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--report', type=Path, default=None, metavar='FILE',
+        help='write a JSON run report with per-rule and per-phase statistics',
+    )
+    parser.add_argument(
+        '--profile', type=Path, default=None, metavar='DIR',
+        help='profile each phase and write <phase>.pstats files to DIR',
+    )
+    return parser
+
+
+def build_watch_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py watch',
+        description='Re-apply the rules to Dart files whenever they are saved.',
+    )
+    add_common_args(parser)
+    parser.add_argument(
+        '--interval', type=float, default=0.1,
+        help='seconds between polls (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--debounce', type=float, default=0.1,
+        help='quiet seconds to wait after a change before rewriting (default: %(default)s)',
+    )
+    return parser
+
+
+def build_scan_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py scan',
+        description='Rank structural migration candidates without changing any file.',
+    )
+    parser.add_argument(
+        'paths', nargs='*', type=Path,
+        help='files or directories to scan (default: lib and test)',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '-p', '--pack', type=Path, default=packs.PACKS_DIR / 'appcard_outlined_container',
+        help='scan for the match patterns of this pack (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--pattern', default=None, metavar='JSON',
+        help='scan for this pattern instead, given inline or as a JSON file',
+    )
+    parser.add_argument(
+        '--min-confidence', type=float, default=0.5,
+        help='drop candidates satisfying less of the pattern than this (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='parse every file and do not update .dart_tool/codemod/analysis',
+    )
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+
+def build_l10n_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py l10n',
+        description='Report unused, missing and untranslated localization keys.',
+    )
+    parser.add_argument(
+        'paths', nargs='*', type=Path,
+        help='files or directories to index (default: lib and test)',
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='re-parse every file and do not update the caches in .dart_tool/codemod',
+    )
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+
+def open_l10n_index(no_cache: bool = False) -> l10n.L10nIndex:
+    path = None if no_cache else CACHE_DIR / 'l10n_index.json'
+    return l10n.L10nIndex(path, L10N_DIR, L10N_DIR / 'generated', open_store(no_cache))
+
+
+def open_store(no_cache: bool = False) -> AnalysisStore:
+    """The per-file analysis store; with ``no_cache`` it keeps nothing."""
+    return AnalysisStore(None if no_cache else ANALYSIS_DIR)
+
+
+def build_undo_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py undo',
+        description='Restore the files of a rewrite run from its journal.',
+    )
+    parser.add_argument(
+        'journal', nargs='?', default=None,
+        help='journal file or name in .dart_tool/codemod/journal (default: the latest)',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='worker processes (default: number of CPUs)',
+    )
+    parser.add_argument('--list', action='store_true', help='list the journals and exit')
+    return parser
+
+
+def build_serve_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='modify_trends.py serve',
+        description='Answer rewrite, dry-run and scan requests on a Unix socket, '
+                    'keeping rules and indexes warm; see codemod/client.py.',
+    )
+    parser.add_argument(
+        '--socket', type=Path, default=CACHE_DIR / 'serve.sock',
+        help='socket path (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--idle-timeout', type=float, default=0, metavar='SECONDS',
+        help='exit after this long without a request (default: never)',
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='ignore and do not update the caches in .dart_tool/codemod; '
+        'undo journals are still written there',
+    )
+    return parser
+
+
+def label(path: Path) -> str:
+    """``path`` relative to the app root when inside it, else to the cwd, for diff headers."""
+    try:
+        return path.relative_to(APP_ROOT).as_posix()
+    except ValueError:
+        return Path(os.path.relpath(path)).as_posix()
+
+
+def load_compiled(args):
+    """The compiled pack named by ``args``, or None after reporting why not."""
+    try:
+        return packs.compile_pack(args.pack, None if args.no_cache else CACHE_DIR)
+    except (OSError, packs.PackError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return None
+
+
+def plan(paths, manifest, digests):
+    """Tasks for the ``paths`` not fresh in ``manifest``, and the number of fresh ones."""
+    tasks = []
+    fresh = 0
+    for path in paths:
+        key = str(path.resolve())
+        st = os.stat(key)
+        entry = manifest and manifest.entry(key)
+        if entry is None:
+            tasks.append(Task(Path(key), st.st_size, label=label(Path(key))))
+        elif manifest.is_fresh(key, st, digests):
+            fresh += 1
+        else:
+            tasks.append(Task(
+                Path(key), st.st_size, entry['sha256'], frozenset(entry['rules']), label(Path(key))
+            ))
+    return tasks, fresh
+
+
+def prefilter(tasks, compiled, manifest, index=None):
+    """Drop the tasks of lib and test files that no rule can match, per the trigram index.
+
+    Dropped files are recorded in ``manifest`` as having run every rule.
+    ``index`` is a loaded index to reuse; by default the one in the cache
+    directory is opened. Returns the remaining tasks and the number dropped.
+    """
+    roots = tuple(str(APP_ROOT / r) + os.sep for r in DEFAULT_ROOTS)
+    indexed = [t for t in tasks if str(t.path).startswith(roots)]
+    if not indexed:
+        return tasks, 0
+    if index is None:
+        index = TrigramIndex(CACHE_DIR / 'trigrams.pickle')
+    index.update(t.path for t in indexed)
+    index.save()
+    candidates = index.candidates(compiled.literals)
+    digests = set(compiled.digests.values())
+    kept = []
+    for task in tasks:
+        key = str(task.path)
+        sha = index.sha256(key)
+        if sha is None or key in candidates:
+            kept.append(task)
+            continue
+        if manifest is not None:
+            st = os.stat(key)
+            done = task.done if task.sha256 == sha else frozenset()
+            manifest.record(key, st.st_size, st.st_mtime_ns, sha, digests | done)
+    return kept, len(tasks) - len(kept)
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    command = argv.pop(0) if argv and argv[0] in COMMANDS else 'rewrite'
+    return COMMANDS[command](argv)
+
+
+def rewrite_main(argv) -> int:
+    args = build_parser().parse_args(argv)
+    roots = args.paths or [APP_ROOT / r for r in DEFAULT_ROOTS]
+    paths = runner.discover(roots)
+    if not paths:
+        print('No Dart files found.', file=sys.stderr)
+        return 1
+
+    compiled = load_compiled(args)
+    if compiled is None:
+        return 2
+    ruleset = compiled.ruleset
+    digests = frozenset(compiled.digests.values())
+    manifest = None if args.no_cache else Manifest(CACHE_DIR / 'manifest.json')
+
+    tasks, fresh = plan(paths, manifest, digests)
+    ruled_out = 0
+    if manifest is not None:
+        tasks, ruled_out = prefilter(tasks, compiled, manifest)
+
+    started = time.perf_counter()
+    max_passes = args.max_passes if args.fixed_point else 1
+    store = open_store(args.no_cache)
+    results = runner.run(
+        tasks, compiled, args.jobs, args.dry_run, args.profile, max_passes, store
+    )
+    wall = time.perf_counter() - started
+
+    failed = 0
+    for result in results:
+        if result.error:
+            failed += 1
+            print(f'error: {result.path}: {result.error}', file=sys.stderr)
+            continue
+        for conflict in result.conflicts:
+            print(f'conflict: {result.path}: {conflict}', file=sys.stderr)
+        if args.dry_run:
+            sys.stdout.write(result.diff)
+            continue
+        if manifest is not None:
+            manifest.record(result.path, result.size, result.mtime_ns, result.sha256, result.rules)
+        if result.changed:
+            rules = ', '.join(f'{k} x{v}' for k, v in sorted(result.matches.items()))
+            passes = f' in {result.passes} passes' if result.passes > 1 else ''
+            print(f'rewrote {result.path} ({rules}){passes}')
+    records = [
+        journal.Record(r.path, r.original_sha256, r.sha256, r.reverse)
+        for r in results if r.changed and not args.dry_run
+    ]
+    if records:
+        path = journal.write(JOURNAL_DIR, records)
+        print(
+            f'journal: {label(path)} ({path.stat().st_size / 1024:.1f} KiB), '
+            f'"modify_trends.py undo" restores these files',
+            file=sys.stderr,
+        )
+    if manifest is not None and not args.dry_run:
+        manifest.save()
+        index = open_l10n_index()
+        index.refresh(r.path for r in results if r.changed)
+        index.save()
+    store.prune()
+
+    matched = set()
+    applied = set()
+    for result in results:
+        matched.update(result.matches)
+        applied.update(result.applied)
+        matched.update(owner for c in result.conflicts for owner in c.owners)
+    evaluated = ruled_out or any(not r.skipped for r in results)
+    for rule in ruleset.rules:
+        if evaluated and rule.name not in matched and rule.name not in applied:
+            print(f'warning: rule {rule.name} matched nothing', file=sys.stderr)
+
+    if args.report is not None:
+        data = report.build(results, ruleset, wall, fresh, args.dry_run, ruled_out)
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(data, indent=2) + '\n', encoding='utf-8')
+
+    changed = sum(r.changed for r in results)
+    unchanged = fresh + sum(r.skipped for r in results)
+    if args.dry_run:
+        print_summary(results, ruleset)
+    else:
+        skipped = f', {ruled_out} ruled out by the index' if ruled_out else ''
+        print(
+            f'{changed} of {len(paths)} files rewritten '
+            f'({unchanged} unchanged since last run{skipped}).'
+        )
+    return 1 if failed else 0
+
+
+def print_summary(results, ruleset) -> None:
+    """Rule matches, files touched and line counts of a dry run, on stderr."""
+    totals = {}
+    for result in results:
+        for name, count in result.matches.items():
+            totals[name] = totals.get(name, 0) + count
+    touched = sum(r.changed for r in results)
+    added = sum(r.added for r in results)
+    removed = sum(r.removed for r in results)
+    out = sys.stderr
+    print('dry run, nothing written', file=out)
+    for rule in ruleset.rules:
+        print(f'  {rule.name}: {totals.get(rule.name, 0)} matches', file=out)
+    print(f'  {touched} files would change, +{added} -{removed} lines', file=out)
+    conflicts = sum(len(r.conflicts) for r in results)
+    if conflicts:
+        print(f'  {conflicts} conflicting edits left out', file=out)
+
+
+def watch_main(argv) -> int:
+    args = build_watch_parser().parse_args(argv)
+    compiled = load_compiled(args)
+    if compiled is None:
+        return 2
+    manifest = None if args.no_cache else Manifest(CACHE_DIR / 'manifest.json')
+    roots = args.paths or [APP_ROOT / r for r in DEFAULT_ROOTS]
+    index = None if args.no_cache else open_l10n_index()
+    watcher = Watcher(
+        roots, compiled, manifest, args.interval, args.debounce,
+        l10n_index=index, store=open_store(args.no_cache), journal_dir=JOURNAL_DIR,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def scan_main(argv) -> int:
+    args = build_scan_parser().parse_args(argv)
+    try:
+        if args.pattern is not None:
+            text = args.pattern
+            if not text.lstrip().startswith('{'):
+                text = Path(text).read_text(encoding='utf-8')
+            patterns = [('pattern', Pattern(json.loads(text)))]
+        else:
+            patterns = [
+                (rule.name, Pattern(json.loads(rule.match)))
+                for rule in packs.load(args.pack).rules if rule.match is not None
+            ]
+        for _, p in patterns:
+            p.anchor()
+    except (OSError, ValueError, packs.PackError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    if not patterns:
+        print(f'error: {args.pack} has no structural rules to scan for', file=sys.stderr)
+        return 2
+
+    roots = args.paths or [APP_ROOT / r for r in DEFAULT_ROOTS]
+    paths = runner.discover(roots)
+    tasks = [Task(p, p.stat().st_size, label=label(p.resolve())) for p in paths]
+    store = open_store(args.no_cache)
+    found, errors = scan.run(tasks, patterns, args.jobs, args.min_confidence, store)
+    store.prune()
+    for error in errors:
+        print(f'error: {error}', file=sys.stderr)
+
+    if args.json:
+        json.dump([c.to_dict() for c in found], sys.stdout, indent=2)
+        print()
+    else:
+        for c in found:
+            print(f'{c.confidence:5.0%}  depth {c.depth:<3} {c.path}:{c.line}  {c.call} [{c.rule}]')
+        files = len({c.path for c in found})
+        exact = sum(c.confidence >= 1 for c in found)
+        print(f'{len(found)} candidates in {files} of {len(paths)} files, {exact} full matches.',
+              file=sys.stderr)
+    return 1 if errors else 0
+
+
+def l10n_main(argv) -> int:
+    args = build_l10n_parser().parse_args(argv)
+    roots = args.paths or [APP_ROOT / r for r in DEFAULT_ROOTS]
+    index = open_l10n_index(args.no_cache)
+    try:
+        parsed = index.update(runner.discover(roots))
+    except (OSError, ValueError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    index.save()
+    index.store.prune()
+    data = index.report(lambda p: label(Path(p)))
+
+    if args.json:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+    else:
+        for key in data['unused']:
+            print(f'unused: {key}')
+        for key, places in sorted(data['missing'].items()):
+            print(f'missing: {key} ({", ".join(places)})')
+        for locale, keys in data['untranslated'].items():
+            for key in keys:
+                print(f'untranslated: {key} [{locale}]')
+        print(
+            f'{data["referenced"]} of {data["keys"]} keys referenced, {len(data["unused"])} unused, '
+            f'{len(data["missing"])} missing ({parsed} files re-indexed).',
+            file=sys.stderr,
+        )
+    return 1 if data['missing'] else 0
+
+
+def undo_main(argv) -> int:
+    args = build_undo_parser().parse_args(argv)
+    available = journal.journals(JOURNAL_DIR)
+    if args.list:
+        for path in available:
+            records = journal.decode(path.read_bytes())
+            print(f'{path.name}  {len(records)} files  {path.stat().st_size / 1024:.1f} KiB')
+        return 0
+    if args.journal is None:
+        if not available:
+            print('error: no journal to undo', file=sys.stderr)
+            return 2
+        path = available[-1]
+    else:
+        path = Path(args.journal)
+        if not path.exists():
+            path = JOURNAL_DIR / args.journal
+    try:
+        records = journal.decode(path.read_bytes())
+    except (OSError, ValueError, zlib.error) as e:
+        print(f'error: {path}: {e}', file=sys.stderr)
+        return 2
+
+    failed = 0
+    for file, problem in journal.undo(records, args.jobs):
+        if problem is None:
+            print(f'restored {file}')
+        else:
+            failed += 1
+            print(f'error: {file}: {problem}', file=sys.stderr)
+    print(f'{len(records) - failed} of {len(records)} files restored from {path.name}.')
+    if failed:
+        return 1
+    path.unlink()
+    return 0
+
+
+def serve_main(argv) -> int:
+    args = build_serve_parser().parse_args(argv)
+    # The server is built on this module's helpers, so it imports it, not the other way round.
+    from codemod import server
+    return server.serve(args.socket, args.no_cache, args.idle_timeout)
+
+
+COMMANDS = {
+    'l10n': l10n_main,
+    'rewrite': rewrite_main,
+    'scan': scan_main,
+    'serve': serve_main,
+    'undo': undo_main,
+    'watch': watch_main,
+}
@@ -0,0 +1,168 @@
+"""Thin client of ``modify_trends.py serve``: one request, one reply.
+
+It imports nothing from the codemod package, so its cost is the
+interpreter's start-up plus the server's work on the files asked about::
+
+    python3 -S codemod/client.py lib/screens/reports/trends_screen.dart
+    python3 -S codemod/client.py dry-run lib/screens/reports
+    python3 -S codemod/client.py scan --min-confidence 0.8
+    python3 -S codemod/client.py ping
+
+Output and exit status follow the matching ``modify_trends.py`` command;
+``--json`` prints the server's reply as is. Exits with 3 when no server
+is listening on the socket.
+"""
+
+import json
+import os
+import socket
+import sys
+
+SOCKET = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.dart_tool', 'codemod', 'serve.sock'
+)
+COMMANDS = ('rewrite', 'dry-run', 'scan', 'ping', 'stop')
+USAGE = (
+    'usage: client.py [rewrite|dry-run|scan|ping|stop] [paths ...] [--socket PATH] [-p PACK]\n'
+    '                 [--fixed-point] [--max-passes N] [--pattern JSON] [--min-confidence X] [--json]'
+)
+# Options taking a value: request key and conversion.
+VALUED = {
+    '-p': ('pack', str),
+    '--pack': ('pack', str),
+    '--max-passes': ('max_passes', int),
+    '--pattern': ('pattern', str),
+    '--min-confidence': ('min_confidence', float),
+}
+
+
+def parse(argv):
+    """The request, socket path and --json flag for ``argv``."""
+    args = list(argv)
+    request = {'command': 'rewrite', 'cwd': os.getcwd(), 'paths': []}
+    path = os.environ.get('CODEMOD_SOCKET', SOCKET)
+    raw = False
+    positional = False
+    while args:
+        arg = args.pop(0)
+        if arg in ('-h', '--help'):
+            print(USAGE)
+            sys.exit(0)
+        elif arg == '--json':
+            raw = True
+        elif arg == '--fixed-point':
+            request['fixed_point'] = True
+        elif arg == '--socket' or arg in VALUED:
+            if not args:
+                raise ValueError(f'{arg} needs a value')
+            value = args.pop(0)
+            if arg == '--socket':
+                path = value
+            else:
+                key, kind = VALUED[arg]
+                request[key] = kind(value)
+        elif arg.startswith('-'):
+            raise ValueError(f'unknown option {arg}')
+        elif arg in COMMANDS and not positional:
+            request['command'] = arg
+        else:
+            request['paths'].append(arg)
+        positional = positional or not arg.startswith('-')
+    return request, path, raw
+
+
+def call(request: dict, path: str = SOCKET) -> dict:
+    """Send ``request`` to the server at ``path`` and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path)
+        conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        chunks = []
+        while True:
+            chunk = conn.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+    if not chunks:
+        raise ConnectionError('the server closed the connection without replying')
+    return json.loads(b''.join(chunks))
+
+
+def show(command: str, reply: dict) -> int:
+    """Print ``reply`` like the matching command line run; returns its exit status."""
+    err = sys.stderr
+    if command in ('rewrite', 'dry-run'):
+        failed = 0
+        for f in reply['files']:
+            if f['error']:
+                failed += 1
+                print(f'error: {f["path"]}: {f["error"]}', file=err)
+                continue
+            for conflict in f['conflicts']:
+                print(f'conflict: {f["path"]}: {conflict}', file=err)
+            if f['changed'] and command == 'rewrite':
+                rules = ', '.join(f'{k} x{v}' for k, v in sorted(f['matches'].items()))
+                passes = f' in {f["passes"]} passes' if f['passes'] > 1 else ''
+                print(f'rewrote {f["path"]} ({rules}){passes}')
+        if reply['journal']:
+            print(f'journal: {reply["journal"]}, "modify_trends.py undo" restores these files', file=err)
+        for name in reply['unmatched']:
+            print(f'warning: rule {name} matched nothing', file=err)
+        if command == 'dry-run':
+            sys.stdout.write(reply['diff'])
+            print('dry run, nothing written', file=err)
+            for name, count in reply['rules'].items():
+                print(f'  {name}: {count} matches', file=err)
+            print(f'  {reply["changed"]} files would change, '
+                  f'+{reply["added"]} -{reply["removed"]} lines', file=err)
+        else:
+            skipped = f', {reply["ruled_out"]} ruled out by the index' if reply['ruled_out'] else ''
+            print(f'{reply["changed"]} of {reply["total"]} files rewritten '
+                  f'({reply["unchanged"]} unchanged since last run{skipped}).')
+        return 1 if failed else 0
+    if command == 'scan':
+        for error in reply['errors']:
+            print(f'error: {error}', file=err)
+        found = reply['candidates']
+        for c in found:
+            print(f'{c["confidence"]:5.0%}  depth {c["depth"]:<3} {c["path"]}:{c["line"]}  '
+                  f'{c["call"]} [{c["rule"]}]')
+        files = len({c['path'] for c in found})
+        exact = sum(c['confidence'] >= 1 for c in found)
+        print(f'{len(found)} candidates in {files} of {reply["total"]} files, {exact} full matches.',
+              file=err)
+        return 1 if reply['errors'] else 0
+    if command == 'ping':
+        print(f'pid {reply["pid"]}, up {reply["uptime"]:.0f} s, {reply["requests"]} requests, '
+              f'{reply["analysis"]["loaded"]} analyses loaded, '
+              f'{reply["analysis"]["computed"]} computed, {reply["ms"]:.2f} ms')
+    return 0
+
+
+def main(argv=None) -> int:
+    try:
+        request, path, raw = parse(sys.argv[1:] if argv is None else argv)
+    except ValueError as e:
+        print(f'error: {e}\n{USAGE}', file=sys.stderr)
+        return 2
+    try:
+        reply = call(request, path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'error: no server on {path}; start one with "modify_trends.py serve"', file=sys.stderr)
+        return 3
+    except (OSError, ValueError) as e:
+        print(f'error: {path}: {e}', file=sys.stderr)
+        return 3
+    if raw:
+        json.dump(reply, sys.stdout, indent=2)
+        print()
+    if not reply.get('ok'):
+        if not raw:
+            print(f'error: {reply.get("error")}', file=sys.stderr)
+        return 2
+    return 0 if raw else show(request['command'], reply)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""Unified diffs of rewritten files, for ``--dry-run``."""
+
+import difflib
+from typing import Tuple
+
+
+def unified(old: bytes, new: bytes, label: str) -> Tuple[str, int, int]:
+    """A git-style unified diff of ``old`` to ``new``, with lines added and removed."""
+    a = old.decode('utf-8', errors='replace').splitlines(keepends=True)
+    b = new.decode('utf-8', errors='replace').splitlines(keepends=True)
+    out = []
+    added = removed = 0
+    for i, line in enumerate(difflib.unified_diff(a, b, f'a/{label}', f'b/{label}')):
+        # Past the ---/+++ file headers, since a content line may itself
+        # start with ++ or --, like ``--count;``.
+        if i >= 2:
+            added += line.startswith('+')
+            removed += line.startswith('-')
+        if line.endswith('\n'):
+            out.append(line)
+        else:
+            out.append(line + '\n\\ No newline at end of file\n')
+    return ''.join(out), added, removed
@@ -0,0 +1,78 @@
+"""Edits against an original buffer, checked for overlap before one splice.
+
+Every rule match becomes a ``(start, end, replacement)`` edit on the bytes
+that were read, never on text another rule already produced. The edits are
+sorted once and swept as intervals: runs of overlapping edits are conflicts
+and are reported, not applied, so the result does not depend on which rule
+happened to be tried first. What remains is spliced in a single pass by
+:func:`codemod.fileio.pieces`.
+
+Two insertions at the same offset, or an insertion where a replacement
+starts or ends, do not overlap and are kept in the order they were added.
+"""
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from codemod.fileio import Edit
+
+
+@dataclass
+class Conflict:
+    """Overlapping edits that were left out: their owners and byte spans."""
+
+    owners: List[str]
+    spans: List[Tuple[int, int]]
+    line: int = 0
+
+    @property
+    def start(self) -> int:
+        return min(s for s, _ in self.spans)
+
+    def __str__(self) -> str:
+        return f'line {self.line}: {" / ".join(self.owners)} overlap, left unchanged'
+
+
+class EditBuffer:
+    def __init__(self):
+        self._edits: List[Tuple[int, int, int, bytes, str]] = []
+
+    def add(self, start: int, end: int, text: bytes, owner: str) -> None:
+        if not 0 <= start <= end:
+            raise ValueError(f'bad edit span {start}..{end} from {owner}')
+        self._edits.append((start, end, len(self._edits), text, owner))
+
+    def __len__(self) -> int:
+        return len(self._edits)
+
+    def resolve(self) -> Tuple[List[Edit], List[str], List[Conflict]]:
+        """Sorted non-overlapping edits, the owner of each, and the conflicts."""
+        edits: List[Edit] = []
+        owners: List[str] = []
+        conflicts: List[Conflict] = []
+        group = []
+        group_end = -1
+        for edit in sorted(self._edits):
+            start, end = edit[0], edit[1]
+            # Sorted by start then end, an insertion comes before a
+            # replacement at the same offset, so only starting before the
+            # run's end means crossing one of its edits.
+            if group and start < group_end:
+                group.append(edit)
+                group_end = max(group_end, end)
+                continue
+            self._flush(group, edits, owners, conflicts)
+            group = [edit]
+            group_end = end
+        self._flush(group, edits, owners, conflicts)
+        return edits, owners, conflicts
+
+    @staticmethod
+    def _flush(group, edits, owners, conflicts) -> None:
+        if len(group) == 1:
+            start, end, _, text, owner = group[0]
+            edits.append((start, end, text))
+            owners.append(owner)
+        elif group:
+            conflicts.append(Conflict([e[4] for e in group], [(e[0], e[1]) for e in group]))
+
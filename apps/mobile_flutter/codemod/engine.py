@@ -0,0 +1,569 @@
+"""Apply a rule set to one file."""
+
+import bisect
+import contextlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from codemod import diff, fileio
+from codemod.analysis import AnalysisStore, FileAnalysis
+from codemod.cache import content_digest, rule_digests
+from codemod.fileio import Edit
+from codemod.editbuffer import Conflict, EditBuffer
+from codemod.matcher import Automaton, Match
+from codemod.report import PhaseTimer, new_rule_stats
+from codemod.imports import ImportTable
+from codemod.rules import Rule, RuleSet
+from codemod.structure import CLOSERS, OPENERS, PREFIXES, Pattern, StructureIndex, render
+from codemod.tokens import TokenIndex, line_indent, newline_at, pattern
+from codemod.trigrams import Literals, literals
+
+
+@dataclass
+class Task:
+    """One file to process, with what the manifest knows about it."""
+
+    path: Path
+    size: int
+    sha256: Optional[str] = None
+    done: FrozenSet[str] = frozenset()
+    label: str = ''
+
+
+@dataclass
+class FileResult:
+    path: str
+    matches: Dict[str, int] = field(default_factory=dict)
+    applied: List[str] = field(default_factory=list)
+    changed: bool = False
+    skipped: bool = False
+    error: Optional[str] = None
+    size: int = 0
+    mtime_ns: int = 0
+    sha256: str = ''
+    rules: List[str] = field(default_factory=list)
+    diff: str = ''
+    added: int = 0
+    removed: int = 0
+    phases: Dict[str, float] = field(default_factory=dict)
+    rule_stats: Dict[str, dict] = field(default_factory=dict)
+    conflicts: List[Conflict] = field(default_factory=list)
+    passes: int = 0
+    # What the journal needs to undo a write: the hash before it and the
+    # edits that turn the new contents back into the old.
+    original_sha256: str = ''
+    reverse: List[Edit] = field(default_factory=list)
+
+
+# What each automaton pattern stands for.
+BEFORE, AFTER, ANCHOR = range(3)
+
+
+class CycleError(ValueError):
+    """Rules kept rewriting a file without reaching a fixed point."""
+
+
+class CompiledRuleSet:
+    """A rule set with every anchor loaded into one token automaton.
+
+    Text rules contribute their ``before`` block, and their ``after`` block
+    to notice rules that are already applied. Structural rules contribute
+    the ``Callee(`` their pattern starts with; hits are checked against the
+    file's :class:`~codemod.structure.StructureIndex`, built only when some
+    anchor was seen. ``kinds[p]`` says which of these pattern ``p`` is and
+    for which rule. Matching runs on the normalized token stream, so
+    indentation and trailing commas in the file do not have to agree with
+    the templates.
+
+    ``literals[i]`` lists the alternatives of identifiers a file needs for
+    rule ``i`` to match it or to be found already applied, for the
+    :class:`~codemod.trigrams.TrigramIndex` prefilter.
+    """
+
+    def __init__(self, ruleset: RuleSet):
+        self.ruleset = ruleset
+        self.digests = rule_digests(ruleset)
+        self.replacements: List[bytes] = []
+        self.structural: Dict[int, Pattern] = {}
+        self.kinds: List[Tuple[int, int]] = []
+        self.literals: List[List[Literals]] = []
+        patterns = []
+        for i, rule in enumerate(ruleset.rules):
+            if rule.match is not None:
+                node = Pattern(json.loads(rule.match))
+                self.structural[i] = node
+                self.literals.append([literals(node.words())])
+                self.replacements.append(_replacement(rule, False))
+                patterns.append(pattern(node.anchor().decode('utf-8'))[0])
+                self.kinds.append((ANCHOR, i))
+                continue
+            symbols, dropped_comma = pattern(rule.before)
+            if not symbols:
+                raise ValueError(f'rule {rule.name} has an empty before block')
+            self.replacements.append(_replacement(rule, dropped_comma))
+            patterns.append(symbols)
+            self.kinds.append((BEFORE, i))
+            alternatives = [literals(symbols)]
+            after = pattern(rule.after)[0]
+            if after:
+                patterns.append(after)
+                self.kinds.append((AFTER, i))
+                alternatives.append(literals(after))
+            self.literals.append(alternatives)
+        self.automaton = Automaton(patterns)
+        # No match reaches further than this from a token it covers.
+        self.max_tokens = max(map(len, patterns))
+
+    def rewrite(
+        self, buf, enabled: Optional[FrozenSet[int]] = None, path: Optional[str] = None
+    ) -> Tuple[List[Edit], Dict[str, int], List[str]]:
+        """Return the edits for ``buf``, matches per rule and the rules found already applied.
+
+        Only rules whose index is in ``enabled`` are applied, all of them by
+        default. Required imports are added only when ``path`` is known.
+        """
+        index, found, applied = self.scan(buf, enabled)
+        edits, matches, _ = self.edits(buf, index, found, path=path)
+        return edits, matches, sorted(applied - matches.keys())
+
+    def scan(
+        self,
+        buf,
+        enabled: Optional[FrozenSet[int]] = None,
+        index: Optional[TokenIndex] = None,
+        analysis: Optional[FileAnalysis] = None,
+        rule_stats: Optional[Dict[str, dict]] = None,
+    ):
+        """Tokenize ``buf``, unless its ``index`` is given, and run the automaton over it once.
+
+        The token and structure indexes come from ``analysis`` when given.
+        Confirming structural matches is timed per rule into ``rule_stats``.
+
+        Returns the token index, every match as a ``(first, last, pattern)``
+        token range, overlapping ones included, and the names of rules
+        whose ``after`` block is present. A structural match carries its
+        rendered replacement as a fourth element. A ``before`` match inside
+        its own rule's ``after`` block is that rule's earlier output, not
+        a new match, so a rule whose replacement wraps its own pattern is
+        not applied again.
+        """
+        rules = self.ruleset.rules
+        kinds = self.kinds
+        if index is None:
+            index = analysis.tokens if analysis is not None else TokenIndex(buf)
+        found = []
+        anchors = []
+        applied = set()
+        afters: Dict[int, List[Tuple[int, int]]] = {}
+        for match in self.automaton.iter_matches(index.symbols):
+            kind, i = kinds[match[2]]
+            if enabled is not None and i not in enabled:
+                continue
+            if kind == AFTER:
+                applied.add(rules[i].name)
+                afters.setdefault(i, []).append(match[:2])
+            elif kind == ANCHOR:
+                anchors.append(match)
+            else:
+                found.append(match)
+        found = self._outside_afters(found, afters)
+        if anchors:
+            found += self._structural(buf, index, anchors, analysis, rule_stats)
+        return index, found, applied
+
+    def _outside_afters(
+        self, found: List[tuple], afters: Dict[int, List[Tuple[int, int]]]
+    ) -> List[tuple]:
+        """Leave out ``before`` matches that lie inside an ``after`` match of the same rule."""
+        if not afters:
+            return found
+        kinds = self.kinds
+        return [
+            m for m in found
+            if not any(a0 <= m[0] and m[1] <= a1 for a0, a1 in afters.get(kinds[m[2]][1], ()))
+        ]
+
+    def _structural(
+        self,
+        buf,
+        index: TokenIndex,
+        anchors: List[Match],
+        analysis: Optional[FileAnalysis] = None,
+        rule_stats: Optional[Dict[str, dict]] = None,
+    ) -> List[tuple]:
+        """Confirm structural anchor hits against the file's call index."""
+        structure = analysis.structure if analysis is not None else StructureIndex(buf, index)
+        found = []
+        for first, _, p in anchors:
+            t0 = time.perf_counter()
+            match = self._confirm(structure, buf, 0, index, index.starts[first], p)
+            self._charge(rule_stats, p, t0)
+            if match is not None:
+                found.append(match)
+        return found
+
+    def _charge(self, rule_stats: Optional[Dict[str, dict]], p: int, t0: float) -> None:
+        """Add the time since ``t0`` to the ``match_seconds`` of pattern ``p``'s rule."""
+        if rule_stats is not None:
+            rule_stats[self.ruleset.rules[self.kinds[p][1]].name]['match_seconds'] += (
+                time.perf_counter() - t0
+            )
+
+    def _confirm(
+        self, structure: StructureIndex, buf, base: int, index: TokenIndex, name_start: int, p: int
+    ) -> Optional[tuple]:
+        """The match of the call named at ``name_start``, if pattern ``p`` accepts it.
+
+        ``structure`` and ``buf`` may cover just a slice of the file that
+        starts at byte ``base`` on a line boundary.
+        """
+        i = self.kinds[p][1]
+        at = structure.call_index(name_start - base)
+        if at < 0:
+            return None
+        call = structure.calls[at]
+        captures = self.structural[i].match(structure, buf, call.start, call.end, at)
+        if captures is None:
+            return None
+        first = bisect.bisect_left(index.starts, base + call.start)
+        last = bisect.bisect_left(index.starts, base + call.end)
+        return first, last, p, render(self.replacements[i], captures, buf)
+
+    def rescan(
+        self,
+        buf,
+        index: TokenIndex,
+        windows: List[Tuple[int, int]],
+        regions: List[Tuple[int, int]],
+        enabled: Optional[FrozenSet[int]] = None,
+        rule_stats: Optional[Dict[str, dict]] = None,
+    ) -> List[tuple]:
+        """Matches overlapping the byte ``regions`` an edit just produced.
+
+        The automaton runs over the token ``windows`` around the regions
+        only, as returned by :meth:`TokenIndex.patched` with a margin of
+        :attr:`max_tokens`. Structural rules also look at the calls that
+        enclose a region, whose anchors may be further away; each is indexed
+        on its own slice of the file.
+        """
+        kinds = self.kinds
+        found = []
+        anchors = set()
+        afters: Dict[int, List[Tuple[int, int]]] = {}
+        for w0, w1 in windows:
+            for first, last, p in self.automaton.iter_matches(index.symbols[w0:w1]):
+                kind, i = kinds[p]
+                if enabled is not None and i not in enabled:
+                    continue
+                first, last = first + w0, last + w0
+                if kind == AFTER:
+                    afters.setdefault(i, []).append((first, last))
+                elif kind == ANCHOR:
+                    anchors.add((first, p))
+                elif _touches(index, first, last, regions):
+                    found.append((first, last, p))
+        found = self._outside_afters(found, afters)
+        if self.structural:
+            anchors.update(self._enclosing(index, regions, enabled))
+        for first, p in sorted(anchors):
+            close = _closing(index.symbols, first + len(self.automaton.patterns[p]) - 1)
+            if close is None or not _touches(index, first, close + 1, regions):
+                continue
+            t0 = time.perf_counter()
+            start = index.starts[first - 1 if first and index.symbols[first - 1] in PREFIXES else first]
+            base = buf.rfind(b'\n', 0, start) + 1
+            piece = bytes(buf[base:index.ends[close]])
+            match = self._confirm(StructureIndex(piece), piece, base, index, index.starts[first], p)
+            self._charge(rule_stats, p, t0)
+            if match is not None:
+                found.append(match)
+        return found
+
+    def _enclosing(self, index: TokenIndex, regions, enabled) -> List[Tuple[int, int]]:
+        """Structural anchors whose call's parentheses are open around a region.
+
+        One walk up to the last region keeps the open brackets on a stack,
+        so the cost is a pass over the tokens however many regions there are.
+        """
+        heads = {}
+        for p, pat in enumerate(self.automaton.patterns):
+            kind, i = self.kinds[p]
+            if kind == ANCHOR and (enabled is None or i in enabled):
+                heads.setdefault(pat[-2], []).append((p, pat))
+        if not heads:
+            return []
+        symbols = index.symbols
+        found = []
+        stack: List[int] = []
+        j = 0
+        for start in sorted(lo for lo, _ in regions):
+            stop = bisect.bisect_left(index.starts, start)
+            while j < stop:
+                tok = symbols[j]
+                if tok in OPENERS:
+                    stack.append(j)
+                elif tok in CLOSERS and stack:
+                    stack.pop()
+                j += 1
+            for k in stack:
+                if symbols[k] != b'(' or not k:
+                    continue
+                for p, pat in heads.get(symbols[k - 1], ()):
+                    first = k + 1 - len(pat)
+                    if first >= 0 and symbols[first:k + 1] == pat:
+                        found.append((first, p))
+        return found
+
+    def converge(
+        self,
+        buf,
+        index: TokenIndex,
+        edits: List[Edit],
+        matches: Dict[str, int],
+        conflicts: List[Conflict],
+        enabled: Optional[FrozenSet[int]] = None,
+        max_passes: int = 16,
+        path: Optional[str] = None,
+        rule_stats: Optional[Dict[str, dict]] = None,
+    ) -> Tuple[bytes, int]:
+        """Apply ``edits``, then the rules again to their own output, until nothing changes.
+
+        Each pass after the first re-lexes and re-matches only around what
+        the previous pass rewrote. ``matches`` and ``conflicts`` are
+        extended in place. Returns the final contents and the number of
+        passes that changed something. Raises :class:`CycleError` when a
+        pass recreates earlier contents, or after ``max_passes``.
+        """
+        seen = {content_digest(buf): 0}
+        history: List[Set[str]] = []  # rules applied by each pass
+        applied = set(matches)
+        data = buf
+        while edits:
+            if len(history) == max_passes:
+                raise CycleError(f'no fixed point after {max_passes} passes')
+            new = fileio.splice(data, edits)
+            history.append(applied)
+            digest = content_digest(new)
+            if digest in seen:
+                rules = set().union(*history[seen[digest]:])
+                raise CycleError(
+                    f'rules undo each other ({", ".join(sorted(rules))}): '
+                    f'pass {len(history)} recreated the file as of pass {seen[digest]}'
+                )
+            seen[digest] = len(history)
+            index, windows, regions = index.patched(new, edits, self.max_tokens)
+            data = new
+            found = self.rescan(data, index, windows, regions, enabled, rule_stats)
+            edits, more, clashes = self.edits(data, index, found, rule_stats, path)
+            for name, count in more.items():
+                matches[name] = matches.get(name, 0) + count
+            conflicts += clashes
+            applied = set(more)
+        return bytes(data), len(history)
+
+    def edits(
+        self,
+        buf,
+        index: TokenIndex,
+        found: List[tuple],
+        rule_stats: Optional[Dict[str, dict]] = None,
+        path: Optional[str] = None,
+        analysis: Optional[FileAnalysis] = None,
+    ) -> Tuple[List[Edit], Dict[str, int], List[Conflict]]:
+        """Turn matches from :meth:`scan` into sorted, non-overlapping byte edits.
+
+        Every match becomes an edit of the original ``buf``; overlapping
+        ones, say a rule whose ``before`` block contains another rule's, are
+        returned as conflicts and left out. Replacements use the line ending
+        of the line they land on, so CRLF and LF files, or mixed ones, keep
+        their newlines. Splice time and bytes per rule are added to ``rule_stats``
+        when given. The imports required by the rules that were applied are
+        added where the file at ``path`` lacks them, reading its import
+        table only in that case, from ``analysis`` when given.
+        """
+        rules = self.ruleset.rules
+        buffer = EditBuffer()
+        for first, last, p, *rendered in found:
+            start, end = index.span(first, last)
+            i = self.kinds[p][1]
+            t0 = time.perf_counter()
+            text = rendered[0] if rendered else self.replacements[i]
+            text = reindent(text, line_indent(buf, start))
+            buffer.add(start, end, text.replace(b'\n', newline_at(buf, start)), rules[i].name)
+            if rule_stats is not None:
+                rule_stats[rules[i].name]['splice_seconds'] += time.perf_counter() - t0
+        edits, owners, conflicts = buffer.resolve()
+        for conflict in conflicts:
+            conflict.line = buf[:conflict.start].count(b'\n') + 1
+
+        applied = set(owners)
+        wanted = {r.requires_import for r in rules if r.name in applied and r.requires_import}
+        if wanted and path is not None:
+            table = ImportTable(
+                buf, path, parsed=analysis.directives if analysis is not None else None
+            )
+            if table.package is not None:
+                buffer = EditBuffer()
+                for (start, end, text), name in zip(edits, owners):
+                    buffer.add(start, end, text, name)
+                for lib_path in sorted(wanted):
+                    target = table.target(lib_path)
+                    if not table.provides(target):
+                        at, text = table.insertion(target)
+                        buffer.add(at, at, text, f'import {lib_path}')
+                edits, owners, more = buffer.resolve()
+                for conflict in more:
+                    conflict.line = buf[:conflict.start].count(b'\n') + 1
+                conflicts += more
+
+        # Counted from what is left: an import insertion may have taken rule edits down with it.
+        names = {r.name for r in rules}
+        matches: Dict[str, int] = {}
+        for (start, end, _), name in zip(edits, owners):
+            if name not in names:
+                continue
+            matches[name] = matches.get(name, 0) + 1
+            if rule_stats is not None:
+                rule_stats[name]['matches'] += 1
+                rule_stats[name]['bytes_rewritten'] += end - start
+        return edits, matches, conflicts
+
+
+def _touches(index: TokenIndex, first: int, last: int, regions: List[Tuple[int, int]]) -> bool:
+    """Whether tokens ``first`` to ``last`` overlap a region, or straddle an empty one."""
+    start, end = index.span(first, last)
+    for lo, hi in regions:
+        if start < hi and end > lo or lo == hi and start < lo < end:
+            return True
+    return False
+
+
+def _closing(symbols, open_: int) -> Optional[int]:
+    """Token index of the bracket closing the one at ``open_``."""
+    depth = 0
+    for j in range(open_, len(symbols)):
+        tok = symbols[j]
+        if tok in OPENERS:
+            depth += 1
+        elif tok in CLOSERS:
+            depth -= 1
+            if depth == 0:
+                return j
+    return None
+
+
+def _replacement(rule: Rule, dropped_comma: bool) -> bytes:
+    """``rule.after`` dedented to column 0, minus the comma the match leaves behind."""
+    after = rule.after.strip('\n')
+    base = _indent_width((rule.before or after).lstrip('\n'))
+    lines = after.split('\n')
+    lines = [line[min(base, _indent_width(line)):] for line in lines]
+    after = '\n'.join(lines).rstrip()
+    if dropped_comma and after.endswith(','):
+        after = after[:-1]
+    return after.encode('utf-8')
+
+
+def _indent_width(line: str) -> int:
+    return len(line) - len(line.lstrip(' '))
+
+
+def reindent(text: bytes, indent: bytes) -> bytes:
+    """Indent every line but the first, which continues the matched line."""
+    if not indent:
+        return text
+    lines = text.split(b'\n')
+    return b'\n'.join(lines[:1] + [indent + line if line else line for line in lines[1:]])
+
+
+def process_file(
+    task: Task,
+    compiled: CompiledRuleSet,
+    dry_run: bool = False,
+    timer: Optional[PhaseTimer] = None,
+    max_passes: int = 1,
+    store: Optional[AnalysisStore] = None,
+) -> FileResult:
+    """Apply the rules of ``compiled`` that ``task`` has not seen yet.
+
+    With ``dry_run`` nothing is written; the result carries a unified diff
+    of the change instead. Phase timings and per-rule counters are recorded
+    on the result; ``timer`` may profile the phases. With ``max_passes``
+    above one the rules are re-applied to their own output until it stops
+    changing, see :meth:`CompiledRuleSet.converge`; a file that does not
+    settle is left alone and reported as an error.
+    Lexing and parsing the file are looked up in ``store`` first.
+    """
+    timer = timer or PhaseTimer()
+    result = FileResult(str(task.path))
+    phases = result.phases
+    tmp = None
+    try:
+        with contextlib.ExitStack() as stack:
+            with timer('read', phases):
+                buf = stack.enter_context(fileio.open_buffer(task.path))
+                sha = content_digest(buf)
+            done = task.done if sha == task.sha256 else frozenset()
+            digests = compiled.digests
+            rules = compiled.ruleset.rules
+            pending = frozenset(i for i, r in enumerate(rules) if digests[r.name] not in done)
+            result.rules = sorted(done)
+            if pending:
+                for i in pending:
+                    stats = result.rule_stats[rules[i].name] = new_rule_stats()
+                    stats['bytes_scanned'] = len(buf)
+                analysis = store.analysis(buf, sha) if store is not None else None
+                with timer('match', phases):
+                    index, found, applied = compiled.scan(
+                        buf, pending, analysis=analysis, rule_stats=result.rule_stats
+                    )
+                with timer('splice', phases):
+                    edits, result.matches, result.conflicts = compiled.edits(
+                        buf, index, found, result.rule_stats, str(task.path), analysis
+                    )
+                    result.passes = 1 if edits else 0
+                    if edits and max_passes > 1:
+                        data, result.passes = compiled.converge(
+                            buf, index, edits, result.matches, result.conflicts, pending,
+                            max_passes, str(task.path), result.rule_stats,
+                        )
+                        edits = fileio.line_edits(buf, data)
+                    result.applied = sorted(applied - result.matches.keys())
+                    if edits and dry_run:
+                        result.diff, result.added, result.removed = diff.unified(
+                            bytes(buf), fileio.splice(buf, edits), task.label or str(task.path)
+                        )
+                        result.changed = True
+                # Rules left in a conflict run again next time, so it is reported again.
+                conflicted = {owner for c in result.conflicts for owner in c.owners}
+                ran = [digests[rules[i].name] for i in pending if rules[i].name not in conflicted]
+                if edits and not dry_run:
+                    with timer('write', phases):
+                        tmp = fileio.stage(task.path, buf, edits)
+                        result.original_sha256 = sha
+                        result.reverse = fileio.invert(buf, edits)
+                    # Recorded against the new contents, the rules must have
+                    # seen them: only converging re-matched the rules' output.
+                    result.rules = ran if max_passes > 1 else []
+                else:
+                    result.rules += ran
+            else:
+                result.skipped = True
+        if tmp is not None:
+            with timer('write', phases):
+                with open(tmp, 'rb') as f:
+                    sha = content_digest(f.read())
+                fileio.commit(tmp, task.path)
+            tmp = None
+            result.changed = True
+        st = os.stat(task.path)
+        result.size, result.mtime_ns, result.sha256 = st.st_size, st.st_mtime_ns, sha
+    except (OSError, ValueError) as e:
+        if tmp is not None:
+            fileio.discard(tmp)
+        result.error = str(e)
+    return result
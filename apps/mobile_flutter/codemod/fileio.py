@@ -0,0 +1,127 @@
+"""Raw-byte file access: mmap for large files, atomic temp-file-and-rename writes."""
+
+import contextlib
+import difflib
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+# Files at least this large are mapped instead of read, e.g. the generated
+# app_localizations*.dart sources.
+MMAP_THRESHOLD = 256 * 1024
+
+Edit = Tuple[int, int, bytes]  # replace buf[start:end] with the bytes
+
+
+@contextlib.contextmanager
+def open_buffer(path: Path) -> Iterator:
+    """Yield the file's contents as ``bytes`` or a read-only ``mmap``."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def pieces(buf, edits: List[Edit]) -> Iterator:
+    """Unchanged spans of ``buf`` as memoryviews, interleaved with the edits.
+
+    ``edits`` must be sorted and non-overlapping.
+    """
+    view = memoryview(buf)
+    try:
+        pos = 0
+        for start, end, text in edits:
+            if start > pos:
+                yield view[pos:start]
+            if text:
+                yield text
+            pos = end
+        if pos < len(buf):
+            yield view[pos:]
+    finally:
+        view.release()
+
+
+def splice(buf, edits: List[Edit]) -> bytes:
+    """The edited contents as one ``bytes`` object."""
+    return b''.join(pieces(buf, edits))
+
+
+def invert(buf, edits: List[Edit]) -> List[Edit]:
+    """Edits that turn ``splice(buf, edits)`` back into ``buf``."""
+    out = []
+    delta = 0
+    for start, end, text in edits:
+        at = start + delta
+        out.append((at, at + len(text), bytes(buf[start:end])))
+        delta += len(text) - (end - start)
+    return out
+
+
+def line_edits(old, new: bytes) -> List[Edit]:
+    """Edits turning ``old`` into ``new``, one per run of differing lines."""
+    old = bytes(old)
+    if old == new:
+        return []
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    a_offsets = [0]
+    for line in a:
+        a_offsets.append(a_offsets[-1] + len(line))
+    b_offsets = [0]
+    for line in b:
+        b_offsets.append(b_offsets[-1] + len(line))
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return [
+        (a_offsets[i1], a_offsets[i2], new[b_offsets[j1]:b_offsets[j2]])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+
+def stage(path: Path, buf, edits: List[Edit]) -> str:
+    """Write ``buf`` with ``edits`` applied to a temp file next to ``path``.
+
+    Returns the temp file's name; :func:`commit` renames it into place. The
+    two steps are separate so a mapped ``buf`` can be closed in between,
+    which Windows needs before the original can be replaced.
+    """
+    path = Path(path)
+    mode = os.stat(path).st_mode
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for piece in pieces(buf, edits):
+                f.write(piece)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode & 0o7777)
+    except BaseException:
+        discard(tmp)
+        raise
+    return tmp
+
+
+def commit(tmp: str, path: Path) -> None:
+    """Atomically replace ``path`` with the staged temp file.
+
+    The original stays intact until the rename, so a crash midway leaves
+    either the old or the new contents, never a truncated file.
+    """
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        discard(tmp)
+        raise
+
+
+def discard(tmp: str) -> None:
+    with contextlib.suppress(OSError):
+        os.unlink(tmp)
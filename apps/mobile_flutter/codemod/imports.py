@@ -0,0 +1,235 @@
+"""Import tables of Dart files, with URIs resolved to files of the package.
+
+Only the directive header of a file is lexed: ``library``, ``import``,
+``export`` and ``part`` directives and annotations, up to the first other
+declaration. Relative URIs and ``package:<name>/`` URIs of the enclosing
+package (found through the nearest ``pubspec.yaml``) resolve to absolute
+paths; other URIs such as ``dart:async`` are kept as they are.
+
+A rule's required import is satisfied when the file imports the target
+directly or imports a file of the package that re-exports it, like
+``config/app_theme.dart`` exporting ``design/design.dart``, which exports
+``design/components/components.dart``.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from codemod.tokens import TOKEN_RE, TokenIndex, kind as token_kind, newline_at
+
+DIRECTIVES = frozenset((b'library', b'import', b'export', b'part'))
+NAME_RE = re.compile(rb'^name:\s*([A-Za-z_]\w*)', re.MULTILINE)
+
+
+class Package:
+    """A pub package: its root directory, ``lib`` directory and name."""
+
+    __slots__ = ('root', 'lib', 'name')
+
+    def __init__(self, root: str, name: str):
+        self.root = root
+        self.lib = os.path.join(root, 'lib')
+        self.name = name
+
+    def resolve(self, uri: str, importer: str) -> str:
+        """Absolute path of ``uri`` as seen from the file ``importer``, or ``uri`` itself."""
+        prefix = f'package:{self.name}/'
+        if uri.startswith(prefix):
+            return os.path.normpath(os.path.join(self.lib, uri[len(prefix):]))
+        if ':' in uri:
+            return uri
+        return os.path.normpath(os.path.join(os.path.dirname(importer), uri))
+
+    def uri(self, target: str, importer: str, relative: bool) -> str:
+        """How ``importer`` should spell an import of the absolute path ``target``."""
+        if relative:
+            return Path(os.path.relpath(target, os.path.dirname(importer))).as_posix()
+        return f'package:{self.name}/' + Path(os.path.relpath(target, self.lib)).as_posix()
+
+
+_packages: Dict[str, Optional[Package]] = {}
+
+
+def find_package(path: str) -> Optional[Package]:
+    """The package whose ``pubspec.yaml`` is nearest above ``path``."""
+    directory = os.path.dirname(os.path.abspath(path))
+    seen = []
+    package = None
+    while True:
+        if directory in _packages:
+            package = _packages[directory]
+            break
+        seen.append(directory)
+        pubspec = os.path.join(directory, 'pubspec.yaml')
+        if os.path.isfile(pubspec):
+            with open(pubspec, 'rb') as f:
+                m = NAME_RE.search(f.read())
+            package = Package(directory, m.group(1).decode()) if m else None
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    for d in seen:
+        _packages[d] = package
+    return package
+
+
+class Directive:
+    __slots__ = ('keyword', 'uri', 'start', 'end')
+
+    def __init__(self, keyword: str, uri: str, start: int, end: int):
+        self.keyword = keyword
+        self.uri = uri
+        self.start = start
+        self.end = end      # just past the ';'
+
+
+def directives(buf, index: Optional[TokenIndex] = None) -> List[Directive]:
+    """The directives at the top of a Dart file, in source order.
+
+    Only the header is lexed, unless the file's ``index`` is given.
+    """
+    found = []
+    keyword = None
+    start = uri = None
+    depth = 0
+    skipping = False  # inside an annotation's arguments
+    if index is None:
+        stream = ((m.group(), m.start(), m.end()) for m in TOKEN_RE.finditer(buf)
+                  if m.lastgroup != 'ws')
+    else:
+        stream = zip(index.symbols, index.starts, index.ends)
+    for tok, tok_start, tok_end in stream:
+        kind = token_kind(tok)
+        if kind == 'comment':
+            continue
+        if skipping:
+            depth += tok == b'('
+            depth -= tok == b')'
+            skipping = depth > 0
+            continue
+        if keyword is None:
+            if tok in DIRECTIVES:
+                keyword, start, uri = tok.decode(), tok_start, None
+            elif tok == b'@':
+                keyword = '@'
+            else:
+                break
+        elif keyword == '@':
+            if tok == b'(':
+                depth, skipping = 1, True
+            elif tok != b'.' and kind != 'word':
+                break
+            elif kind == 'word' and tok in DIRECTIVES:
+                keyword, start, uri = tok.decode(), tok_start, None
+        elif tok == b';':
+            if uri is not None:
+                found.append(Directive(keyword, uri, start, tok_end))
+            keyword = None
+        elif kind == 'string' and uri is None:
+            uri = _unquote(tok)
+    return found
+
+
+def _unquote(tok: bytes) -> str:
+    text = tok.decode('utf-8', 'replace')
+    quote = text[0]
+    if text[:3] in ("'''", '"""'):
+        return text[3:-3]
+    return text.strip(quote)
+
+
+_exports: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+
+
+def exports_of(path: str, package: Package) -> List[str]:
+    """Resolved ``export`` targets of a package file, cached by stat."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return []
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _exports.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'rb') as f:
+        found = [
+            package.resolve(d.uri, path) for d in directives(f.read()) if d.keyword == 'export'
+        ]
+    _exports[path] = (key, found)
+    return found
+
+
+class ImportTable:
+    """What one file imports, with URIs resolved against its package."""
+
+    def __init__(
+        self, buf, path: str, package: Optional[Package] = None,
+        parsed: Optional[List[Directive]] = None,
+    ):
+        self.buf = buf
+        self.path = os.path.abspath(path)
+        self.package = package if package is not None else find_package(self.path)
+        self.directives = parsed if parsed is not None else directives(buf)
+        self.imports: Dict[str, Directive] = {}
+        for d in self.directives:
+            if d.keyword == 'import':
+                self.imports.setdefault(self._resolve(d.uri), d)
+
+    def _resolve(self, uri: str) -> str:
+        return self.package.resolve(uri, self.path) if self.package is not None else uri
+
+    def target(self, lib_path: str) -> Optional[str]:
+        """Absolute path of a ``lib``-relative path, or None outside a package."""
+        if self.package is None:
+            return None
+        return os.path.normpath(os.path.join(self.package.lib, lib_path))
+
+    def provides(self, target: str) -> bool:
+        """Whether ``target`` is imported, directly or through re-exports."""
+        if target in self.imports:
+            return True
+        package = self.package
+        stack = [p for p in self.imports if p.startswith(package.lib + os.sep)]
+        seen: Set[str] = set(stack)
+        while stack:
+            for exported in exports_of(stack.pop(), package):
+                if exported == target:
+                    return True
+                if exported not in seen and exported.startswith(package.lib + os.sep):
+                    seen.add(exported)
+                    stack.append(exported)
+        return False
+
+    def insertion(self, target: str) -> Tuple[int, bytes]:
+        """Offset and text of an ``import`` of ``target`` placed among its peers.
+
+        Files that import their own package with ``package:`` URIs, and files
+        outside ``lib``, get a ``package:`` import; others a relative one. It
+        goes before the first import of the same kind that sorts after it,
+        or after the last one.
+        """
+        package = self.package
+        in_lib = self.path.startswith(package.lib + os.sep)
+        own = f'package:{package.name}/'
+        relative = in_lib and not any(d.uri.startswith(own) for d in self.imports.values())
+        uri = package.uri(target, self.path, relative)
+        line = f"import '{uri}';".encode('utf-8')
+
+        peers = [
+            d for d in self.directives if d.keyword == 'import'
+            and (':' not in d.uri if relative else d.uri.startswith(own))
+        ]
+        for d in peers:
+            if d.uri > uri:
+                at = self.buf.rfind(b'\n', 0, d.start) + 1
+                return at, line + newline_at(self.buf, at)
+        after = peers or [d for d in self.directives if d.keyword != 'part']
+        if after:
+            at = after[-1].end
+            return at, newline_at(self.buf, at) + line
+        nl = newline_at(self.buf, 0)
+        return 0, line + nl + nl
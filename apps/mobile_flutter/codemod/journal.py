@@ -0,0 +1,150 @@
+"""Reverse-patch journal of a rewrite run, and the undo that replays it.
+
+For every file a run rewrites, the journal keeps the reverse edits only:
+where each replacement landed in the new file and the original bytes it
+replaced, plus the SHA-256 of the file before and after. A migration of
+hundreds of files therefore costs kilobytes, not a copy of the tree.
+
+Journals are zlib-compressed records in ``.dart_tool/codemod/journal``,
+named by the time of the run. Undo restores the files of one journal in
+parallel, each only if it still has the post-run hash and through the same
+temp-file-and-rename write as a rewrite, and checks the result against the
+pre-run hash before putting it in place.
+"""
+
+import os
+import struct
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from codemod import fileio
+from codemod.cache import content_digest
+from codemod.engine import Task
+from codemod.fileio import Edit
+from codemod.runner import map_batches
+
+MAGIC = b'CMJ1'
+# Journals kept; older ones are removed when a new one is written.
+KEEP = 20
+
+_HEADER = struct.Struct('<32s32sI')  # pre hash, post hash, edit count
+_EDIT = struct.Struct('<QQI')        # start, end in the new file, length of original bytes
+
+
+@dataclass
+class Record:
+    path: str
+    pre: str
+    post: str
+    edits: List[Edit]
+
+
+def encode(records: List[Record]) -> bytes:
+    parts = []
+    for record in records:
+        path = record.path.encode('utf-8')
+        parts.append(struct.pack('<I', len(path)) + path)
+        parts.append(_HEADER.pack(
+            bytes.fromhex(record.pre), bytes.fromhex(record.post), len(record.edits)
+        ))
+        for start, end, text in record.edits:
+            parts.append(_EDIT.pack(start, end, len(text)))
+            parts.append(text)
+    return MAGIC + zlib.compress(b''.join(parts), 9)
+
+
+def decode(data: bytes) -> List[Record]:
+    if not data.startswith(MAGIC):
+        raise ValueError('not a codemod journal')
+    raw = zlib.decompress(data[len(MAGIC):])
+    records = []
+    pos = 0
+    while pos < len(raw):
+        (size,) = struct.unpack_from('<I', raw, pos)
+        pos += 4
+        path = raw[pos:pos + size].decode('utf-8')
+        pos += size
+        pre, post, count = _HEADER.unpack_from(raw, pos)
+        pos += _HEADER.size
+        edits = []
+        for _ in range(count):
+            start, end, length = _EDIT.unpack_from(raw, pos)
+            pos += _EDIT.size
+            edits.append((start, end, raw[pos:pos + length]))
+            pos += length
+        records.append(Record(path, pre.hex(), post.hex(), edits))
+    return records
+
+
+def write(directory: Path, records: List[Record]) -> Path:
+    """Store ``records`` as a new journal in ``directory``; returns its path."""
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    path = directory / f'{stamp}-{os.getpid()}.journal'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.journal-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(encode(records))
+        os.replace(tmp, path)
+    except BaseException:
+        fileio.discard(tmp)
+        raise
+    for old in journals(directory)[:-KEEP]:
+        fileio.discard(str(old))
+    return path
+
+
+def journals(directory: Path) -> List[Path]:
+    """Journals in ``directory``, oldest first."""
+    return sorted(directory.glob('*.journal'))
+
+
+def undo_file(record: Record) -> Optional[str]:
+    """Restore one file; returns why it was not restored, or None."""
+    path = Path(record.path)
+    tmp = None
+    try:
+        with fileio.open_buffer(path) as buf:
+            digest = content_digest(buf)
+            if digest == record.pre:
+                return None  # restored by an earlier, partly failed undo
+            if digest != record.post:
+                return 'changed since the run, left as is'
+            restored = fileio.splice(buf, record.edits)
+            if content_digest(restored) != record.pre:
+                return 'reverse edits do not reproduce the original, left as is'
+            tmp = fileio.stage(path, restored, [])
+        fileio.commit(tmp, path)
+    except OSError as e:
+        if tmp is not None:
+            fileio.discard(tmp)
+        return str(e)
+    return None
+
+
+def _undo_batch(tasks: List[Task], records: dict) -> List[Tuple[str, Optional[str]]]:
+    return [(str(t.path), undo_file(records[str(t.path)])) for t in tasks]
+
+
+def undo(records: List[Record], jobs: Optional[int] = None) -> List[Tuple[str, Optional[str]]]:
+    """Restore every file of a journal on up to ``jobs`` processes.
+
+    Returns ``(path, problem)`` pairs, sorted by path; ``problem`` is None
+    for restored files.
+    """
+    by_path = {r.path: r for r in records}
+    tasks = []
+    for record in records:
+        try:
+            size = os.stat(record.path).st_size
+        except OSError:
+            size = 0
+        tasks.append(Task(Path(record.path), size))
+    outcome = []
+    for batch in map_batches(_undo_batch, tasks, jobs, by_path):
+        outcome.extend(batch)
+    return sorted(outcome)
@@ -0,0 +1,319 @@
+"""Index of localization key references across the Dart sources.
+
+References are accesses on an ``AppLocalizations`` value: a variable
+declared with that type (or a generated ``AppLocalizationsEn``-style
+subclass) or assigned ``AppLocalizations.of(...)`` in the same file, or
+``AppLocalizations.of(context).key`` directly, including inside string
+interpolations. They are cross-checked against the ARB files rather than
+the generated ``app_localizations*.dart`` sources, which are skipped.
+
+Per-file results are kept in ``.dart_tool/codemod/l10n_index.json`` keyed by
+stat and content hash, so a report only re-parses files that changed, and
+the rewrite command refreshes the entries of files it rewrites. A file that
+did change takes its references from the shared analysis store, which
+another command may have filled already.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from codemod import fileio
+from codemod.cache import content_digest
+from codemod.tokens import TokenIndex, kind as token_kind
+
+INDEX_VERSION = 1
+CLASS = b'AppLocalizations'
+# Members of the generated class that are not message keys.
+NON_KEYS = frozenset(('localeName', 'delegate', 'supportedLocales', 'localizationsDelegates', 'of'))
+
+
+def _tokens(buf, base: int = 0, index: Optional[TokenIndex] = None) -> Iterator[Tuple[bytes, int]]:
+    """Significant tokens with their offsets, descending into ``${...}`` interpolations."""
+    if index is None:
+        index = TokenIndex(buf)
+    for tok, start in zip(index.symbols, index.starts):
+        kind = token_kind(tok)
+        if kind == 'comment':
+            continue
+        if kind == 'string':
+            if b'${' in tok and not tok.startswith(b'r'):
+                for a, b in _interpolations(tok):
+                    yield from _tokens(tok[a:b], base + start + a)
+            continue
+        yield tok, base + start
+
+
+def _interpolations(tok: bytes) -> Iterator[Tuple[int, int]]:
+    """Spans of the expressions inside ``${...}`` in a string literal token."""
+    pos = tok.find(b'${')
+    while pos >= 0:
+        depth = 0
+        i = pos + 2
+        while i < len(tok):
+            c = tok[i:i + 1]
+            if c == b'{':
+                depth += 1
+            elif c == b'}':
+                if depth == 0:
+                    yield pos + 2, i
+                    break
+                depth -= 1
+            i += 1
+        pos = tok.find(b'${', i)
+
+
+def _is_word(tok: bytes) -> bool:
+    return tok[:1].isalpha() or tok[:1] in b'_$'
+
+
+def extract(buf, index: Optional[TokenIndex] = None) -> Dict[str, List[int]]:
+    """``{key: [line, ...]}`` of every access on an ``AppLocalizations`` value.
+
+    ``index`` is the file's token index, if the caller already has it.
+    """
+    toks = list(_tokens(buf, 0, index))
+    n = len(toks)
+    receivers: Set[bytes] = set()
+    direct: List[int] = []  # token index just past AppLocalizations.of(...)
+
+    for i, (tok, _) in enumerate(toks):
+        if not tok.startswith(CLASS) or i + 1 >= n:
+            continue
+        nxt = toks[i + 1][0]
+        if nxt == b'?' and i + 2 < n:
+            nxt = toks[i + 2][0]
+        if _is_word(nxt) and not nxt.startswith(CLASS):
+            receivers.add(nxt)
+            continue
+        if nxt == b'(' and i >= 2 and toks[i - 1][0] == b'=' and _is_word(toks[i - 2][0]):
+            # ``en = AppLocalizationsEn()`` in tests of the generated classes.
+            receivers.add(toks[i - 2][0])
+            continue
+        if (
+            tok == CLASS and nxt == b'.' and i + 3 < n
+            and toks[i + 2][0] == b'of' and toks[i + 3][0] == b'('
+        ):
+            j = _close(toks, i + 3)
+            if j is None:
+                continue
+            if j < n and toks[j][0] in (b'.', b'!', b'?.'):
+                direct.append(j)
+            elif i >= 2 and toks[i - 1][0] == b'=' and _is_word(toks[i - 2][0]):
+                receivers.add(toks[i - 2][0])
+
+    newlines = _newlines(buf)
+    refs: Dict[str, List[int]] = {}
+
+    def add(j: int) -> None:
+        if j < n and toks[j][0] == b'!':
+            j += 1
+        if j + 1 < n and toks[j][0] in (b'.', b'?.') and _is_word(toks[j + 1][0]):
+            key = toks[j + 1][0].decode('utf-8', 'replace')
+            if key not in NON_KEYS:
+                line = bisect.bisect_left(newlines, toks[j + 1][1]) + 1
+                refs.setdefault(key, []).append(line)
+
+    for j in direct:
+        add(j)
+    if receivers:
+        shadowed = 0
+        for i, (tok, _) in enumerate(toks):
+            if i < shadowed or tok not in receivers:
+                continue
+            if i and toks[i - 1][0] in (b'.', b'?.'):
+                continue
+            if _is_param(toks, i):
+                # ``(t) => t.totalHours``: a closure parameter hides the receiver.
+                shadowed = _closure_end(toks, i)
+                continue
+            add(i + 1)
+    return refs
+
+
+def _is_param(toks, i: int) -> bool:
+    return (
+        0 < i < len(toks) - 1
+        and toks[i - 1][0] in (b'(', b',')
+        and toks[i + 1][0] in (b')', b',')
+    )
+
+
+def _closure_end(toks, i: int) -> int:
+    """Token index where the body of the closure declaring parameter ``i`` ends."""
+    n = len(toks)
+    j = i
+    while j < n and toks[j][0] != b')':
+        j += 1
+    j += 1
+    if j < n and toks[j][0] == b'{':
+        return _close(toks, j) or n
+    if j < n and toks[j][0] == b'=>':
+        depth = 0
+        for k in range(j + 1, n):
+            tok = toks[k][0]
+            if tok in (b'(', b'[', b'{'):
+                depth += 1
+            elif tok in (b')', b']', b'}'):
+                if depth == 0:
+                    return k
+                depth -= 1
+            elif depth == 0 and tok in (b',', b';'):
+                return k
+        return n
+    return i
+
+
+def _close(toks, open_: int) -> Optional[int]:
+    """Index just past the ``)`` matching the ``(`` at ``open_``."""
+    depth = 0
+    for j in range(open_, len(toks)):
+        tok = toks[j][0]
+        if tok in (b'(', b'[', b'{'):
+            depth += 1
+        elif tok in (b')', b']', b'}'):
+            depth -= 1
+            if depth == 0:
+                return j + 1
+    return None
+
+
+def _newlines(buf) -> List[int]:
+    out = []
+    pos = buf.find(b'\n')
+    while pos >= 0:
+        out.append(pos)
+        pos = buf.find(b'\n', pos + 1)
+    return out
+
+
+def arb_keys(path: Path) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return sorted(k for k in json.load(f) if not k.startswith('@'))
+
+
+class L10nIndex:
+    """Persistent key-reference index over Dart files and ARB files."""
+
+    def __init__(self, path: Optional[Path], arb_dir: Path, generated_dir: Path, store=None):
+        # A codemod.analysis.AnalysisStore to take references from, if any;
+        # that module builds on this one, so it is not imported here.
+        self.store = store
+        self.path = path
+        self.arb_dir = Path(arb_dir)
+        self.generated_dir = Path(generated_dir).resolve()
+        self.files: Dict[str, dict] = {}
+        self.arbs: Dict[str, dict] = {}
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.files = data['files']
+                self.arbs = data['arbs']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def wants(self, path: Path) -> bool:
+        """Dart sources outside the generated l10n directory."""
+        return path.suffix == '.dart' and self.generated_dir not in path.resolve().parents
+
+    def update(self, dart_paths: Iterable[Path]) -> int:
+        """Bring the index in line with ``dart_paths`` and the ARB files; returns files re-parsed."""
+        parsed = 0
+        live = set()
+        for path in dart_paths:
+            if not self.wants(path):
+                continue
+            key = str(path.resolve())
+            live.add(key)
+            parsed += self._refresh(key)
+        for key in set(self.files) - live:
+            del self.files[key]
+            self.dirty = True
+
+        arbs = {str(p.resolve()): p for p in sorted(self.arb_dir.glob('*.arb'))}
+        for key in set(self.arbs) - set(arbs):
+            del self.arbs[key]
+            self.dirty = True
+        for key, path in arbs.items():
+            st = os.stat(key)
+            entry = self.arbs.get(key)
+            if entry is None or entry['mtime_ns'] != st.st_mtime_ns or entry['size'] != st.st_size:
+                self.arbs[key] = {
+                    'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'keys': arb_keys(path),
+                }
+                self.dirty = True
+        return parsed
+
+    def refresh(self, paths: Iterable[str]) -> None:
+        """Re-index files that were just rewritten, if this index tracks them."""
+        for key in paths:
+            if key in self.files:
+                self._refresh(key)
+
+    def _refresh(self, key: str) -> int:
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            if self.files.pop(key, None) is not None:
+                self.dirty = True
+            return 0
+        entry = self.files.get(key)
+        if entry is not None and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return 0
+        with fileio.open_buffer(Path(key)) as buf:
+            sha = content_digest(buf)
+            if entry is not None and entry['sha256'] == sha:
+                refs = entry['refs']
+            elif self.store is not None:
+                refs = self.store.analysis(buf, sha).l10n_refs
+            else:
+                refs = extract(buf)
+        self.files[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha, 'refs': refs}
+        self.dirty = True
+        return 1
+
+    def save(self) -> None:
+        if self.path is None or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.l10n-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'version': INDEX_VERSION, 'files': self.files, 'arbs': self.arbs},
+                    f, separators=(',', ':'),
+                )
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
+
+    def report(self, label=str) -> dict:
+        """Unused keys, references to missing keys, and keys absent from some locale."""
+        locales = {Path(p).stem: set(e['keys']) for p, e in self.arbs.items()}
+        defined = set().union(*locales.values()) if locales else set()
+        used: Dict[str, int] = {}
+        missing: Dict[str, List[str]] = {}
+        for path, entry in sorted(self.files.items()):
+            for key, lines in entry['refs'].items():
+                used[key] = used.get(key, 0) + len(lines)
+                if key not in defined:
+                    missing.setdefault(key, []).extend(f'{label(path)}:{line}' for line in lines)
+        return {
+            'keys': len(defined),
+            'referenced': len(used.keys() & defined),
+            'unused': sorted(defined - used.keys()),
+            'missing': missing,
+            'untranslated': {
+                locale: sorted(defined - keys) for locale, keys in sorted(locales.items())
+                if defined - keys
+            },
+        }
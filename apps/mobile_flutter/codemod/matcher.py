@@ -0,0 +1,65 @@
+"""Aho-Corasick multi-pattern matching.
+
+All rule anchors go into one automaton, so a file is scanned once no matter
+how many rules there are. Patterns and haystacks are sequences of hashable
+symbols: characters of a ``str`` work, and so do tuples of tokens.
+"""
+
+from typing import Hashable, Iterable, Iterator, List, Sequence, Tuple
+
+Match = Tuple[int, int, int]  # (start, end, pattern index)
+
+
+class Automaton:
+    def __init__(self, patterns: Sequence[Sequence[Hashable]]):
+        self.patterns = list(patterns)
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                raise ValueError(f'pattern {index} is empty')
+            self._add(index, pattern)
+        self._link()
+
+    def _add(self, index: int, pattern: Sequence[Hashable]) -> None:
+        state = 0
+        for symbol in pattern:
+            nxt = self._goto[state].get(symbol)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][symbol] = nxt
+            state = nxt
+        self._out[state] += (index,)
+
+    def _link(self) -> None:
+        # Breadth-first, so every fail target is finished before it is used.
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for symbol, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(symbol, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def iter_matches(self, haystack: Iterable[Hashable]) -> Iterator[Match]:
+        """Yield every occurrence of every pattern, overlaps included."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        root = goto[0]
+        state = 0
+        for pos, symbol in enumerate(haystack):
+            if state == 0 and symbol not in root:
+                continue
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for index in out[state]:
+                end = pos + 1
+                yield end - len(patterns[index]), end, index
+
@@ -0,0 +1,148 @@
+"""Rule packs: rules declared in data files, compiled once and cached.
+
+A pack is a directory holding ``pack.json``, or a bare JSON file::
+
+    {
+      "name": "trends_appcard",
+      "rules": [
+        {
+          "name": "weekly_hours_chart",
+          "before_file": "weekly_hours_chart.before",
+          "after_file": "weekly_hours_chart.after",
+          "requires_import": "design/components/components.dart"
+        }
+      ]
+    }
+
+``before``/``after`` may be given inline instead of as ``*_file`` paths,
+which are relative to the JSON file. ``requires_import`` is optional and
+relative to the ``lib`` directory of the package being rewritten. A structural
+rule gives a ``match`` pattern instead of ``before``; see
+:mod:`codemod.structure`.
+
+The compiled rule set is pickled to the cache directory under the digest of
+the JSON and every template it references, so an unchanged pack loads
+without being re-tokenized or having its automaton rebuilt.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from codemod.engine import CompiledRuleSet
+from codemod.rules import Rule, RuleSet
+from codemod.structure import Pattern
+
+PACKS_DIR = Path(__file__).resolve().parent / 'packs'
+DEFAULT_PACK = PACKS_DIR / 'trends_appcard'
+
+# Bump when the compiled form changes shape so stale pickles are ignored.
+COMPILER_VERSION = 5
+
+
+class PackError(ValueError):
+    pass
+
+
+def pack_file(path: Path) -> Path:
+    path = Path(path)
+    return path / 'pack.json' if path.is_dir() else path
+
+
+def _read_template(spec: dict, key: str, base: Path, rule: str) -> str:
+    if key in spec:
+        return spec[key]
+    if f'{key}_file' in spec:
+        return (base / spec[f'{key}_file']).read_text(encoding='utf-8')
+    raise PackError(f'rule {rule}: missing {key!r} or {key + "_file"!r}')
+
+
+def load(path: Path) -> RuleSet:
+    """Parse a pack into a :class:`RuleSet`."""
+    path = pack_file(path)
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        raise PackError(f'{path}: {e}') from e
+    base = path.parent
+    rules = []
+    names = set()
+    for spec in data.get('rules', []):
+        name = spec.get('name')
+        if not name or name in names:
+            raise PackError(f'{path}: rule names must be present and unique, got {name!r}')
+        names.add(name)
+        if 'import' in spec:
+            raise PackError(
+                f'rule {name}: "import" anchors are no longer supported, '
+                'declare "requires_import" relative to lib/ instead'
+            )
+        requires = spec.get('requires_import')
+        if requires is not None and (not isinstance(requires, str) or ':' in requires):
+            raise PackError(f'rule {name}: "requires_import" must be a path relative to lib/')
+        match = spec.get('match')
+        if match is not None:
+            try:
+                Pattern(match).anchor()
+            except (ValueError, AttributeError, TypeError) as e:
+                raise PackError(f'rule {name}: bad match pattern: {e}') from e
+        rules.append(Rule(
+            name=name,
+            before='' if match is not None else _read_template(spec, 'before', base, name),
+            after=_read_template(spec, 'after', base, name),
+            requires_import=requires,
+            match=json.dumps(match, sort_keys=True) if match is not None else None,
+        ))
+    if not rules:
+        raise PackError(f'{path}: no rules')
+    return RuleSet(name=data.get('name', base.name), rules=tuple(rules))
+
+
+def digest(path: Path) -> str:
+    """Digest of a pack's JSON and the template files it references."""
+    path = pack_file(path)
+    raw = path.read_bytes()
+    h = hashlib.sha256(f'codemod-pack-{COMPILER_VERSION}\0'.encode())
+    h.update(raw)
+    try:
+        specs = json.loads(raw).get('rules', [])
+    except ValueError:
+        specs = []
+    for spec in specs:
+        for key in ('before_file', 'after_file'):
+            if key in spec:
+                h.update(b'\0')
+                try:
+                    h.update((path.parent / spec[key]).read_bytes())
+                except OSError:
+                    pass
+    return h.hexdigest()
+
+
+def compile_pack(path: Path, cache_dir: Optional[Path] = None) -> CompiledRuleSet:
+    """Load a compiled pack from ``cache_dir``, compiling and storing it on a miss."""
+    if cache_dir is None:
+        return CompiledRuleSet(load(path))
+    cached = Path(cache_dir) / 'compiled' / f'{digest(path)}.pickle'
+    try:
+        with open(cached, 'rb') as f:
+            compiled = pickle.load(f)
+        if isinstance(compiled, CompiledRuleSet):
+            return compiled
+    except Exception:
+        # Missing, truncated or written by an older engine: rebuild it.
+        pass
+    compiled = CompiledRuleSet(load(path))
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cached.parent, prefix='.compiled-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cached)
+    except OSError:
+        os.unlink(tmp)
+    return compiled
@@ -0,0 +1,121 @@
+"""Run instrumentation: phase timers, per-rule counters and the JSON run report."""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import time
+from pathlib import Path
+from typing import Dict, List
+
+PHASES = ('read', 'match', 'splice', 'write')
+
+
+def new_rule_stats() -> dict:
+    """Per-rule counters of one file.
+
+    ``match_seconds`` is the time spent confirming a structural rule's
+    anchor hits against the call index; text rules share one automaton
+    pass, whose time is the ``match`` phase's and is not split by rule.
+    ``splice_seconds`` is the time spent turning the rule's matches into
+    edits: rendering, reindenting and newline substitution.
+    """
+    return {
+        'matches': 0, 'match_seconds': 0.0, 'splice_seconds': 0.0,
+        'bytes_scanned': 0, 'bytes_rewritten': 0,
+    }
+
+
+class PhaseTimer:
+    """Times the phases of a worker, optionally under one cProfile per phase."""
+
+    def __init__(self, profile: bool = False):
+        self.profilers = {p: cProfile.Profile() for p in PHASES} if profile else {}
+
+    @contextlib.contextmanager
+    def __call__(self, phase: str, into: Dict[str, float]):
+        profiler = self.profilers.get(phase)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            into[phase] = into.get(phase, 0.0) + time.perf_counter() - start
+
+    def dump(self, directory: Path) -> List[str]:
+        """Write this worker's profiles as ``<phase>-<pid>.prof`` files."""
+        written = []
+        for phase, profiler in self.profilers.items():
+            profiler.create_stats()
+            if not profiler.stats:
+                # Phase never ran in this worker, e.g. no file needed writing.
+                continue
+            path = Path(directory) / f'{phase}-{os.getpid()}-{id(self):x}.prof'
+            profiler.dump_stats(path)
+            written.append(str(path))
+        return written
+
+
+def merge_profiles(directory: Path, parts: List[str]) -> List[Path]:
+    """Merge per-worker profiles into one ``<phase>.pstats`` per phase."""
+    merged = []
+    for phase in PHASES:
+        files = [p for p in parts if Path(p).name.startswith(f'{phase}-')]
+        if not files:
+            continue
+        stats = pstats.Stats(*files)
+        out = Path(directory) / f'{phase}.pstats'
+        stats.dump_stats(out)
+        merged.append(out)
+        for f in files:
+            os.unlink(f)
+    return merged
+
+
+def build(
+    results, ruleset, wall: float, fresh: int = 0, dry_run: bool = False, ruled_out: int = 0
+) -> dict:
+    """The machine-readable report of one run.
+
+    ``fresh`` files were untouched since the last run and ``ruled_out`` ones
+    were skipped by the trigram index; neither has a result.
+    """
+    phases = dict.fromkeys(PHASES, 0.0)
+    rules = {r.name: dict(new_rule_stats(), files=0, applied_files=0) for r in ruleset.rules}
+    for result in results:
+        for phase, seconds in result.phases.items():
+            phases[phase] += seconds
+        for name, stats in result.rule_stats.items():
+            entry = rules[name]
+            for key, value in stats.items():
+                entry[key] += value
+            if stats['matches']:
+                entry['files'] += 1
+        for name in result.applied:
+            rules[name]['applied_files'] += 1
+    return {
+        'pack': ruleset.name,
+        'dry_run': dry_run,
+        'wall_seconds': wall,
+        'files': {
+            'total': len(results) + fresh + ruled_out,
+            'ruled_out_by_index': ruled_out,
+            'unchanged_since_last_run': fresh + sum(r.skipped for r in results),
+            'evaluated': sum(not r.skipped and not r.error for r in results),
+            'changed': sum(r.changed for r in results),
+            'errors': sum(bool(r.error) for r in results),
+        },
+        'phases': phases,
+        'rules': rules,
+        'conflicts': [
+            {'path': r.path, 'line': c.line, 'rules': c.owners, 'spans': c.spans}
+            for r in results for c in r.conflicts
+        ],
+        'no_ops': [
+            name for name, entry in rules.items()
+            if entry['bytes_scanned'] and not entry['matches'] and not entry['applied_files']
+        ],
+    }
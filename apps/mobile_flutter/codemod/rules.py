@@ -0,0 +1,30 @@
+"""Rule data model. Rules themselves live in rule packs, see :mod:`codemod.packs`."""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Replace every occurrence of ``before`` with ``after``.
+
+    A structural rule has no ``before``; ``match`` holds its pattern as
+    canonical JSON (see :mod:`codemod.structure`) and ``after`` may refer to
+    the matched call's arguments as ``{{name}}``.
+
+    ``requires_import`` is a path relative to the package's ``lib``
+    directory that files must import once the rule matched in them; see
+    :mod:`codemod.imports`.
+    """
+
+    name: str
+    before: str
+    after: str
+    requires_import: Optional[str] = None
+    match: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    name: str
+    rules: Tuple[Rule, ...]
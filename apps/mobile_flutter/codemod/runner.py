@@ -0,0 +1,100 @@
+"""Spread a rule set over a tree of Dart files with a process pool."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from codemod.analysis import AnalysisStore
+from codemod.engine import CompiledRuleSet, FileResult, Task, process_file
+from codemod.report import PhaseTimer, merge_profiles
+
+
+def discover(roots: Iterable[Path]) -> List[Path]:
+    """Every ``*.dart`` file under ``roots``, sorted for stable output."""
+    paths = set()
+    for root in roots:
+        if root.is_file():
+            paths.add(root)
+        elif root.is_dir():
+            paths.update(p for p in root.rglob('*.dart') if p.is_file())
+    return sorted(paths)
+
+
+def partition(tasks: List[Task], n: int) -> List[List[Task]]:
+    """Split ``tasks`` into ``n`` batches of roughly equal total size.
+
+    Largest files are placed first, each into the currently lightest batch,
+    so one worker does not end up with both l10n files and the home screen.
+    """
+    batches = [[] for _ in range(n)]
+    loads = [0] * n
+    for task in sorted(tasks, key=lambda t: t.size, reverse=True):
+        i = loads.index(min(loads))
+        batches[i].append(task)
+        loads[i] += task.size
+    return [b for b in batches if b]
+
+
+def _run_batch(
+    tasks: List[Task],
+    compiled: CompiledRuleSet,
+    dry_run: bool,
+    profile_dir: Optional[Path],
+    max_passes: int = 1,
+    store: Optional[AnalysisStore] = None,
+) -> Tuple[List[FileResult], List[str]]:
+    timer = PhaseTimer(profile=profile_dir is not None)
+    results = [
+        process_file(t, compiled, dry_run, timer, max_passes=max_passes, store=store) for t in tasks
+    ]
+    return results, timer.dump(profile_dir) if profile_dir is not None else []
+
+
+def map_batches(fn: Callable, tasks: List[Task], jobs: Optional[int], *args) -> list:
+    """Call ``fn(batch, *args)`` for size-balanced batches of ``tasks`` on a process pool.
+
+    Returns the per-batch return values. With one job, or one task, the
+    single batch runs in this process.
+    """
+    if not tasks:
+        return []
+    jobs = jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(tasks)))
+    if jobs == 1:
+        return [fn(tasks, *args)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(fn, b, *args) for b in partition(tasks, jobs)]
+        return [future.result() for future in futures]
+
+
+def run(
+    tasks: List[Task],
+    compiled: CompiledRuleSet,
+    jobs: Optional[int] = None,
+    dry_run: bool = False,
+    profile_dir: Optional[Path] = None,
+    max_passes: int = 1,
+    store: Optional[AnalysisStore] = None,
+) -> List[FileResult]:
+    """Process ``tasks`` on up to ``jobs`` worker processes.
+
+    With ``profile_dir``, each phase is profiled in every worker and the
+    profiles are merged into ``<profile_dir>/<phase>.pstats``. ``max_passes``
+    and ``store`` are passed on to :func:`~codemod.engine.process_file`;
+    workers share the store through its files.
+    """
+    if profile_dir is not None:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+    results = []
+    parts = []
+    batches = map_batches(
+        _run_batch, tasks, jobs, compiled, dry_run, profile_dir, max_passes, store
+    )
+    for batch, batch_parts in batches:
+        results.extend(batch)
+        parts.extend(batch_parts)
+    if parts:
+        merge_profiles(profile_dir, parts)
+    results.sort(key=lambda r: r.path)
+    return results
@@ -0,0 +1,86 @@
+"""Read-only audit: rank structural migration candidates across the tree.
+
+Every call whose callee is a pattern's root ``call`` is a candidate. Its
+confidence is the share of the pattern's constraints it satisfies, so a
+Container with the right BoxDecoration but no outline border still shows
+up, below the exact matches.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from codemod import fileio
+from codemod.analysis import AnalysisStore
+from codemod.engine import Task
+from codemod.runner import map_batches
+from codemod.structure import Pattern, StructureIndex
+
+
+@dataclass
+class Candidate:
+    path: str
+    line: int
+    depth: int
+    confidence: float
+    rule: str
+    call: str
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def scan_file(
+    task: Task,
+    patterns: Sequence[Tuple[str, Pattern]],
+    min_confidence: float,
+    store: Optional[AnalysisStore] = None,
+) -> List[Candidate]:
+    found = []
+    with fileio.open_buffer(task.path) as buf:
+        needed = [(name, p) for name, p in patterns if p.call.encode('utf-8') in buf]
+        if not needed:
+            return found
+        index = store.analysis(buf).structure if store is not None else StructureIndex(buf)
+        for name, p in needed:
+            total = p.constraints()
+            for i in index.by_name.get(p.call, ()):
+                call = index.calls[i]
+                confidence = p.score(index, buf, call.start, call.end, i) / total
+                if confidence >= min_confidence:
+                    found.append(Candidate(
+                        task.label or str(task.path), index.line_of(call.start), call.depth,
+                        round(confidence, 3), name, call.name,
+                    ))
+    return found
+
+
+def _scan_batch(
+    tasks: List[Task], patterns, min_confidence: float, store: Optional[AnalysisStore] = None
+) -> Tuple[List[Candidate], List[str]]:
+    found = []
+    errors = []
+    for task in tasks:
+        try:
+            found += scan_file(task, patterns, min_confidence, store)
+        except OSError as e:
+            errors.append(f'{task.path}: {e}')
+    return found, errors
+
+
+def run(
+    tasks: List[Task],
+    patterns: Sequence[Tuple[str, Pattern]],
+    jobs=None,
+    min_confidence: float = 0.5,
+    store: Optional[AnalysisStore] = None,
+) -> Tuple[List[Candidate], List[str]]:
+    """Candidates ranked by confidence, then path and line, plus read errors."""
+    found = []
+    errors = []
+    for batch, batch_errors in map_batches(
+        _scan_batch, tasks, jobs, list(patterns), min_confidence, store
+    ):
+        found += batch
+        errors += batch_errors
+    found.sort(key=lambda c: (-c.confidence, c.path, c.line))
+    return found, errors
@@ -0,0 +1,415 @@
+"""Daemon mode: answer rewrite, dry-run and scan requests over a Unix socket.
+
+A one-off run pays for interpreter start, unpickling the compiled pack and
+loading the manifest, trigram and l10n indexes before it touches the one
+file an editor or a pre-commit hook asked about. ``modify_trends.py serve``
+pays that once and keeps all of it in memory, so a request costs what the
+file itself costs; token and structure indexes come from the shared
+analysis store, which the server prunes every :data:`PRUNE_INTERVAL`.
+
+The protocol is one JSON object per line each way. A request names a
+``command`` (``rewrite``, ``dry-run``, ``scan``, ``ping`` or ``stop``) and
+may carry ``paths`` relative to ``cwd``, ``pack``, ``fixed_point`` and
+``max_passes``, or ``pattern`` and ``min_confidence`` for a scan; the reply
+has ``ok`` and either the outcome or an ``error``. :mod:`codemod.client` is
+the command-line end of it.
+
+Warm state is only a cache: packs are recompiled when their digest changes,
+and the manifest and indexes are reloaded when another process rewrote
+them on disk. Requests are handled
+one at a time, so two editors saving at once cannot race on a file.
+"""
+
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from codemod import cli, journal, packs, runner, scan
+from codemod.cache import Manifest
+from codemod.engine import FileResult, Task, process_file
+from codemod.structure import Pattern
+from codemod.trigrams import TrigramIndex
+
+SOCKET = cli.CACHE_DIR / 'serve.sock'
+# Seconds between prunes of the analysis store, which every request may grow.
+PRUNE_INTERVAL = 600
+# A request line longer than this is refused rather than buffered.
+MAX_REQUEST = 1 << 20
+
+
+class ServeError(Exception):
+    pass
+
+
+def _stamp(path: Path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def file_dict(result: FileResult) -> dict:
+    return {
+        'path': result.path,
+        'changed': result.changed,
+        'matches': result.matches,
+        'passes': result.passes,
+        'conflicts': [str(c) for c in result.conflicts],
+        'error': result.error,
+    }
+
+
+class Server:
+    def __init__(self, path: Path = SOCKET, no_cache: bool = False,
+                 idle_timeout: float = 0, log=sys.stderr):
+        self.path = Path(path)
+        self.no_cache = no_cache
+        self.idle_timeout = idle_timeout
+        self.log = log
+        self.started = time.monotonic()
+        self.running = False
+        self.requests = 0
+        # pack path -> (digest, compiled rule set or scan patterns)
+        self.compiled: Dict[str, tuple] = {}
+        self.patterns: Dict[str, tuple] = {}
+        self.store = cli.open_store(no_cache)
+        self.pruned = time.monotonic()
+        # name -> (file stamp when loaded or last saved, object)
+        self.warm: Dict[str, tuple] = {}
+        self.handlers: Dict[str, Callable[[dict], dict]] = {
+            'dry-run': self.rewrite,
+            'ping': self.ping,
+            'rewrite': self.rewrite,
+            'scan': self.scan,
+            'stop': self.stop,
+        }
+
+    # -- warm state ---------------------------------------------------------
+
+    def _load(self, name: str, path: Path, factory: Callable):
+        """The object stored at ``path``, reloaded if another process rewrote it."""
+        stamp = _stamp(path)
+        held = self.warm.get(name)
+        if held is None or held[0] != stamp:
+            held = self.warm[name] = (stamp, factory())
+        return held[1]
+
+    def _saved(self, name: str, path: Path) -> None:
+        if name in self.warm:
+            self.warm[name] = (_stamp(path), self.warm[name][1])
+
+    def _compiled(self, pack: Path):
+        key = str(pack.resolve())
+        digest = packs.digest(pack)
+        held = self.compiled.get(key)
+        if held is None or held[0] != digest:
+            cache_dir = None if self.no_cache else cli.CACHE_DIR
+            held = self.compiled[key] = (digest, packs.compile_pack(pack, cache_dir))
+        return held[1]
+
+    def _patterns(self, request: dict, cwd: Path):
+        pattern = request.get('pattern')
+        if pattern is not None:
+            text = pattern
+            if not text.lstrip().startswith('{'):
+                text = (cwd / text).read_text(encoding='utf-8')
+            found = [('pattern', Pattern(json.loads(text)))]
+            found[0][1].anchor()
+            return found
+        pack = self._pack(request, cwd, packs.PACKS_DIR / 'appcard_outlined_container')
+        key = str(pack.resolve())
+        digest = packs.digest(pack)
+        held = self.patterns.get(key)
+        if held is None or held[0] != digest:
+            found = [
+                (rule.name, Pattern(json.loads(rule.match)))
+                for rule in packs.load(pack).rules if rule.match is not None
+            ]
+            for _, p in found:
+                p.anchor()
+            if not found:
+                raise ServeError(f'{pack} has no structural rules to scan for')
+            held = self.patterns[key] = (digest, found)
+        return held[1]
+
+    @staticmethod
+    def _pack(request: dict, cwd: Path, default: Path) -> Path:
+        pack = request.get('pack')
+        return default if pack is None else cwd / pack
+
+    @staticmethod
+    def _paths(request: dict, cwd: Path) -> List[Path]:
+        given = request.get('paths') or []
+        if not isinstance(given, list):
+            raise ServeError('paths must be a list')
+        roots = [cwd / p for p in given] or [cli.APP_ROOT / r for r in cli.DEFAULT_ROOTS]
+        return runner.discover(roots)
+
+    # -- commands -----------------------------------------------------------
+
+    def rewrite(self, request: dict) -> dict:
+        cwd = Path(request.get('cwd') or os.getcwd())
+        dry_run = request['command'] == 'dry-run'
+        max_passes = int(request.get('max_passes', 16)) if request.get('fixed_point') else 1
+        paths = self._paths(request, cwd)
+        if not paths:
+            raise ServeError('no Dart files found')
+        compiled = self._compiled(self._pack(request, cwd, packs.DEFAULT_PACK))
+        digests = frozenset(compiled.digests.values())
+
+        manifest = None
+        if not self.no_cache:
+            manifest_path = cli.CACHE_DIR / 'manifest.json'
+            trigram_path = cli.CACHE_DIR / 'trigrams.pickle'
+            manifest = self._load('manifest', manifest_path, lambda: Manifest(manifest_path))
+            trigrams = self._load('trigrams', trigram_path, lambda: TrigramIndex(trigram_path))
+        tasks, fresh = cli.plan(paths, manifest, digests)
+        ruled_out = 0
+        if manifest is not None:
+            tasks, ruled_out = cli.prefilter(tasks, compiled, manifest, trigrams)
+            self._saved('trigrams', trigram_path)
+
+        results = [
+            process_file(task, compiled, dry_run, max_passes=max_passes, store=self.store)
+            for task in tasks
+        ]
+
+        written = None
+        if not dry_run:
+            records = [
+                journal.Record(r.path, r.original_sha256, r.sha256, r.reverse)
+                for r in results if r.changed
+            ]
+            if records:
+                written = str(journal.write(cli.JOURNAL_DIR, records))
+            if manifest is not None:
+                for r in results:
+                    if not r.error:
+                        manifest.record(r.path, r.size, r.mtime_ns, r.sha256, r.rules)
+                manifest.save()
+                self._saved('manifest', manifest_path)
+                l10n_path = cli.CACHE_DIR / 'l10n_index.json'
+                index = self._load('l10n', l10n_path, cli.open_l10n_index)
+                index.refresh(r.path for r in results if r.changed)
+                index.save()
+                self._saved('l10n', l10n_path)
+
+        matched = set()
+        totals: Dict[str, int] = {}
+        for r in results:
+            matched.update(r.matches, r.applied)
+            matched.update(owner for c in r.conflicts for owner in c.owners)
+            for name, count in r.matches.items():
+                totals[name] = totals.get(name, 0) + count
+        evaluated = ruled_out or any(not r.skipped for r in results)
+        return {
+            'files': [file_dict(r) for r in results if r.changed or r.error or r.conflicts],
+            'diff': ''.join(r.diff for r in results),
+            'journal': written,
+            'total': len(paths),
+            'changed': sum(r.changed for r in results),
+            'unchanged': fresh + sum(r.skipped for r in results),
+            'ruled_out': ruled_out,
+            'added': sum(r.added for r in results),
+            'removed': sum(r.removed for r in results),
+            'rules': {rule.name: totals.get(rule.name, 0) for rule in compiled.ruleset.rules},
+            'unmatched': [
+                rule.name for rule in compiled.ruleset.rules
+                if evaluated and rule.name not in matched
+            ],
+        }
+
+    def scan(self, request: dict) -> dict:
+        cwd = Path(request.get('cwd') or os.getcwd())
+        patterns = self._patterns(request, cwd)
+        min_confidence = float(request.get('min_confidence', 0.5))
+        paths = self._paths(request, cwd)
+        found = []
+        errors = []
+        for path in paths:
+            try:
+                resolved = path.resolve()
+                task = Task(resolved, resolved.stat().st_size, label=cli.label(resolved))
+                found += scan.scan_file(task, patterns, min_confidence, self.store)
+            except OSError as e:
+                errors.append(f'{path}: {e}')
+        found.sort(key=lambda c: (-c.confidence, c.path, c.line))
+        return {
+            'candidates': [c.to_dict() for c in found],
+            'errors': errors,
+            'total': len(paths),
+        }
+
+    def ping(self, request: dict) -> dict:
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.monotonic() - self.started, 3),
+            'requests': self.requests,
+            'packs': sorted(self.compiled),
+            'analysis': {'loaded': self.store.loaded, 'computed': self.store.computed},
+        }
+
+    def stop(self, request: dict) -> dict:
+        self.running = False
+        return {}
+
+    def handle(self, line: bytes) -> dict:
+        """The reply to one request line; never raises for a bad request."""
+        started = time.perf_counter()
+        command = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ServeError('a request is a JSON object')
+            command = request.get('command')
+            handler = self.handlers.get(command)
+            if handler is None:
+                raise ServeError(f'unknown command {command!r}, expected one of '
+                                 + ', '.join(sorted(self.handlers)))
+            reply = handler(request)
+            reply['ok'] = True
+        except (OSError, ValueError, ServeError) as e:
+            # PackError, CycleError and bad JSON are ValueErrors too.
+            reply = {'ok': False, 'error': str(e)}
+        except Exception as e:
+            reply = {'ok': False, 'error': f'internal error: {e!r}'}
+        ms = (time.perf_counter() - started) * 1000
+        reply['ms'] = round(ms, 3)
+        self.requests += 1
+        if reply['ok'] and 'total' in reply:
+            print(f'{command} {reply["total"]} files in {ms:.1f} ms', file=self.log, flush=True)
+        elif not reply['ok']:
+            print(f'error: {reply["error"]}', file=self.log, flush=True)
+        self._prune()
+        return reply
+
+    def _prune(self) -> None:
+        """Prune the analysis store if :data:`PRUNE_INTERVAL` has passed since the last time."""
+        now = time.monotonic()
+        if now - self.pruned >= PRUNE_INTERVAL:
+            self.pruned = now
+            removed = self.store.prune()
+            if removed:
+                print(f'pruned {removed} analysis entries', file=self.log, flush=True)
+
+    # -- socket -------------------------------------------------------------
+
+    def _bind(self) -> socket.socket:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.path))
+            except OSError:
+                # Left behind by a server that was killed.
+                self.path.unlink()
+            else:
+                raise ServeError(f'a server is already listening on {self.path}')
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(str(self.path))
+        os.chmod(self.path, 0o600)
+        listener.listen(16)
+        listener.setblocking(False)
+        return listener
+
+    def serve_forever(self) -> None:
+        listener = self._bind()
+        inode = os.stat(self.path).st_ino
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        pending: Dict[socket.socket, bytes] = {}
+        self.running = True
+        last = time.monotonic()
+        print(f'serving on {self.path} (pid {os.getpid()})', file=self.log, flush=True)
+        try:
+            while self.running:
+                timeout = None
+                if self.idle_timeout:
+                    timeout = max(0.0, last + self.idle_timeout - time.monotonic())
+                events = selector.select(timeout)
+                if not events and self.idle_timeout and not pending:
+                    print('idle, stopping', file=self.log, flush=True)
+                    break
+                for key, _ in events:
+                    if key.fileobj is listener:
+                        try:
+                            conn, _ = listener.accept()
+                        except BlockingIOError:
+                            continue
+                        conn.setblocking(True)
+                        conn.settimeout(10)
+                        selector.register(conn, selectors.EVENT_READ)
+                        pending[conn] = b''
+                        continue
+                    conn = key.fileobj
+                    last = time.monotonic()
+                    if not self._read(conn, pending):
+                        selector.unregister(conn)
+                        del pending[conn]
+                        conn.close()
+                    if not self.running:
+                        break
+        finally:
+            for conn in pending:
+                conn.close()
+            selector.close()
+            listener.close()
+            try:
+                # Only remove the socket if a newer server has not replaced it.
+                if os.stat(self.path).st_ino == inode:
+                    self.path.unlink()
+            except OSError:
+                pass
+
+    def _read(self, conn: socket.socket, pending: Dict[socket.socket, bytes]) -> bool:
+        """Answer the complete lines received on ``conn``; False when it is done."""
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            return False
+        if not data:
+            return False
+        buf = pending[conn] + data
+        while b'\n' in buf and self.running:
+            line, buf = buf.split(b'\n', 1)
+            if not line.strip():
+                continue
+            reply = self.handle(line)
+            try:
+                conn.sendall(json.dumps(reply, separators=(',', ':')).encode('utf-8') + b'\n')
+            except OSError:
+                return False
+        if len(buf) > MAX_REQUEST:
+            reply = {'ok': False, 'error': f'request longer than {MAX_REQUEST} bytes'}
+            try:
+                conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+            except OSError:
+                pass
+            return False
+        pending[conn] = buf
+        return True
+
+
+def serve(path: Path = SOCKET, no_cache: bool = False, idle_timeout: float = 0) -> int:
+    """Run a server until it is stopped, interrupted or idle; returns an exit status."""
+    server = Server(path, no_cache, idle_timeout)
+    server.store.prune()
+    # Terminate like Ctrl-C so the socket file is removed.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except ServeError as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,411 @@
+"""Structural index of a Dart file: balanced brackets, calls and their arguments.
+
+One pass over the file's :class:`~codemod.tokens.TokenIndex`, its own or
+one the caller already has, records every balanced ``(``/``[``/``{`` span
+and, for each ``(`` preceded by a callee such as ``Container`` or
+``Border.all``, the call's span and its positional and named arguments.
+Rules can then ask for "the Container whose decoration is a BoxDecoration
+with a border" and go straight to the call's span through
+:attr:`StructureIndex.by_name`.
+
+Patterns are JSON objects::
+
+    {"call": "Container",
+     "args": {"decoration": {"call": "BoxDecoration",
+                             "args": {"border": {"call": "Border.all"}}}},
+     "without": ["margin"]}
+
+A node may also carry ``"contains"``, a string or list of strings whose
+tokens must all appear, as whole tokens and in order, in the matched value:
+``"colorScheme.surface"`` is not found in ``colorScheme.surfaceContainer``.
+``"is"`` is stricter: the value must be one of the given expressions, on its
+own or as the end of a member chain, so ``"colorScheme.surface"`` is
+``theme.colorScheme.surface`` but not ``colorScheme.surface.withValues(...)``
+or ``1 - colorScheme.surface``.
+"""
+
+import bisect
+import re
+from typing import Dict, List, Optional, Tuple
+
+from codemod.tokens import COMMENTS, TokenIndex
+
+OPENERS = {b'(': b')', b'[': b']', b'{': b'}'}
+CLOSERS = {b')': b'(', b']': b'[', b'}': b'{'}
+
+# Words that may precede '(' without making a call.
+NOT_CALLEES = frozenset(
+    b'if for while switch catch return assert await yield in is as else do case'.split()
+)
+PREFIXES = frozenset((b'const', b'new'))
+
+
+class Arg:
+    __slots__ = ('name', 'start', 'end', 'call')
+
+    def __init__(self, name: Optional[str], start: int, end: int):
+        self.name = name
+        self.start = start
+        self.end = end
+        # Index of the call this argument's value is, if it is one.
+        self.call = -1
+
+    def __repr__(self) -> str:
+        return f'Arg({self.name!r}, {self.start}, {self.end}, call={self.call})'
+
+
+class Call:
+    __slots__ = ('name', 'start', 'name_start', 'open', 'end', 'depth', 'args')
+
+    def __init__(self, name: str, start: int, name_start: int, open_: int, depth: int):
+        self.name = name
+        self.start = start            # includes a leading const/new
+        self.name_start = name_start  # first byte of the callee name
+        self.open = open_
+        self.end = -1                 # just past the closing paren
+        self.depth = depth
+        self.args: List[Arg] = []
+
+    def named(self, name: str) -> Optional[Arg]:
+        for arg in self.args:
+            if arg.name == name:
+                return arg
+        return None
+
+    def __repr__(self) -> str:
+        return f'Call({self.name!r}, {self.start}, {self.end}, depth={self.depth})'
+
+
+class _Frame:
+    __slots__ = ('char', 'open', 'call', 'arg_start', 'arg_end', 'arg_name', 'arg_tokens', 'first')
+
+    def __init__(self, char: bytes, open_: int, call: int):
+        self.char = char
+        self.open = open_
+        self.call = call
+        self.arg_start = -1
+        self.arg_end = -1
+        self.arg_name = None
+        self.arg_tokens = 0
+        self.first = None
+
+
+class StructureIndex:
+    """Bracket spans and calls of one buffer.
+
+    ``spans`` holds ``(open, end, char)`` for every balanced bracket pair;
+    ``calls`` every call, in source order; ``by_name`` maps a callee name to
+    indexes into ``calls``. Unbalanced closers are ignored and unclosed
+    openers are dropped, so a half-edited file still yields an index.
+    """
+
+    def __init__(self, buf, index: Optional[TokenIndex] = None):
+        self.spans: List[Tuple[int, int, bytes]] = []
+        self.calls: List[Call] = []
+        self._buf = buf
+        stack: List[_Frame] = []
+        recent: List[Tuple[bytes, int]] = []
+
+        if index is None:
+            index = TokenIndex(buf)
+        for tok, start, end in zip(index.symbols, index.starts, index.ends):
+            if tok[:2] in COMMENTS:
+                continue
+            top = stack[-1] if stack else None
+
+            if tok in OPENERS:
+                if top is not None:
+                    self._token(top, tok, start, end)
+                call = -1
+                if tok == b'(':
+                    call = self._callee(recent, start, len(stack))
+                stack.append(_Frame(tok, start, call))
+            elif tok in CLOSERS:
+                if top is None or top.char != CLOSERS[tok]:
+                    recent = [(tok, start)]
+                    continue
+                stack.pop()
+                self._close_arg(top)
+                self.spans.append((top.open, end, top.char))
+                if top.call >= 0:
+                    self.calls[top.call].end = end
+                if stack:
+                    stack[-1].arg_end = end
+            elif tok == b',' and top is not None:
+                self._close_arg(top)
+            elif top is not None:
+                self._token(top, tok, start, end)
+                if tok == b':' and top.arg_tokens == 2 and top.call >= 0 and top.first is not None:
+                    top.arg_name = top.first
+                    top.arg_start = -1
+                    top.arg_tokens = 0
+
+            recent.append((tok, start))
+            if len(recent) > 16:
+                del recent[:8]
+
+        self._link([c for c in self.calls if c.end >= 0])
+
+    @classmethod
+    def restore(cls, buf, spans: List[Tuple[int, int, bytes]], calls: List[Call]):
+        """An index from stored spans and calls, such as :mod:`codemod.analysis` keeps."""
+        index = cls.__new__(cls)
+        index.spans = spans
+        index._buf = buf
+        index._link(calls)
+        return index
+
+    def _link(self, calls: List[Call]) -> None:
+        """Set ``calls`` and derive the lookups and each argument's call."""
+        self.calls = calls
+        self.by_name: Dict[str, List[int]] = {}
+        self._lines: Optional[List[int]] = None
+        by_start = {}
+        for i, call in enumerate(calls):
+            self.by_name.setdefault(call.name, []).append(i)
+            by_start[call.start] = i
+            by_start[call.name_start] = i
+        for call in calls:
+            for arg in call.args:
+                arg.call = by_start.get(arg.start, -1)
+        self._by_name_start = {c.name_start: i for i, c in enumerate(calls)}
+
+    @staticmethod
+    def _token(frame: _Frame, tok: bytes, start: int, end: int) -> None:
+        if frame.arg_start < 0:
+            frame.arg_start = start
+            frame.arg_tokens = 0
+            frame.first = tok.decode('utf-8', 'replace') if _is_word(tok) else None
+        frame.arg_tokens += 1
+        frame.arg_end = end
+
+    def _close_arg(self, frame: _Frame) -> None:
+        if frame.call >= 0 and frame.arg_start >= 0:
+            self.calls[frame.call].args.append(Arg(frame.arg_name, frame.arg_start, frame.arg_end))
+        frame.arg_start = -1
+        frame.arg_name = None
+        frame.first = None
+
+    def _callee(self, recent: List[Tuple[bytes, int]], open_: int, depth: int) -> int:
+        """Record a call if the tokens before ``(`` name a callee; return its index."""
+        i = len(recent) - 1
+        if i < 0 or not _is_word(recent[i][0]) or recent[i][0] in NOT_CALLEES:
+            return -1
+        parts = [recent[i][0]]
+        name_start = recent[i][1]
+        while i >= 2 and recent[i - 1][0] in (b'.', b'?.') and _is_word(recent[i - 2][0]):
+            parts.insert(0, recent[i - 2][0])
+            name_start = recent[i - 2][1]
+            i -= 2
+        start = name_start
+        if i >= 1 and recent[i - 1][0] in PREFIXES:
+            start = recent[i - 1][1]
+        name = b'.'.join(parts).decode('utf-8', 'replace')
+        self.calls.append(Call(name, start, name_start, open_, depth))
+        return len(self.calls) - 1
+
+    def call_at(self, name_start: int) -> Optional[Call]:
+        """The call whose callee name begins at byte ``name_start``."""
+        i = self.call_index(name_start)
+        return None if i < 0 else self.calls[i]
+
+    def call_index(self, name_start: int) -> int:
+        """Position in ``calls`` of the call named at byte ``name_start``, or -1."""
+        return self._by_name_start.get(name_start, -1)
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number of a byte offset."""
+        if self._lines is None:
+            buf = self._buf
+            lines = []
+            pos = buf.find(b'\n')
+            while pos >= 0:
+                lines.append(pos)
+                pos = buf.find(b'\n', pos + 1)
+            self._lines = lines
+        return bisect.bisect_left(self._lines, offset) + 1
+
+
+def _is_word(tok: bytes) -> bool:
+    return bool(tok) and (tok[:1].isalpha() or tok[:1] in b'_$' or tok[0] >= 0x80)
+
+
+class Pattern:
+    """A compiled structural pattern node."""
+
+    def __init__(self, spec: dict):
+        unknown = set(spec) - {'call', 'args', 'contains', 'is', 'without'}
+        if unknown:
+            raise ValueError(f'unknown pattern keys: {", ".join(sorted(unknown))}')
+        self.call: Optional[str] = spec.get('call')
+        contains = spec.get('contains', ())
+        if isinstance(contains, str):
+            contains = (contains,)
+        self.contains = tuple(c.encode('utf-8') for c in contains)
+        self._contains = tuple(TokenIndex(c).symbols for c in self.contains)
+        alternatives = spec.get('is', ())
+        if isinstance(alternatives, str):
+            alternatives = (alternatives,)
+        self.is_ = tuple(TokenIndex(a.encode('utf-8')).symbols for a in alternatives)
+        self.args = {name: Pattern(sub) for name, sub in spec.get('args', {}).items()}
+        self.without = tuple(spec.get('without', ()))
+        if (self.args or self.without) and self.call is None:
+            raise ValueError('"args" and "without" need a "call"')
+
+    def anchor(self) -> bytes:
+        """The source text a match starts with, for the token prefilter."""
+        if self.call is None:
+            raise ValueError('a rule pattern needs a top-level "call"')
+        return self.call.encode('utf-8') + b'('
+
+    def words(self) -> List[bytes]:
+        """Source text every match contains: callee names, required argument names, ``contains``."""
+        words = list(self.contains)
+        if len(self.is_) == 1:
+            words.append(b''.join(self.is_[0]))
+        if self.call is not None:
+            words.append(self.call.encode('utf-8'))
+        for name, sub in self.args.items():
+            words.append(name.encode('utf-8'))
+            words += sub.words()
+        return words
+
+    def constraints(self) -> int:
+        """How many constraints :meth:`score` can count; a node's ``without`` list is one."""
+        return (
+            (self.call is not None) + len(self.contains) + bool(self.is_) + bool(self.without)
+            + sum(1 + sub.constraints() for sub in self.args.values())
+        )
+
+    def score(self, index: StructureIndex, buf, start: int, end: int, call: int) -> int:
+        """How many of this node's constraints hold for the value ``buf[start:end]``.
+
+        The absent arguments of ``without`` earn one point together, so a bare
+        call is not ranked high for everything it lacks.
+        """
+        score = 0
+        node = index.calls[call] if call >= 0 else None
+        if self.call is not None and node is not None and node.name == self.call:
+            score += 1
+        if self.contains or self.is_:
+            tokens = _value_tokens(buf, start, end)
+            score += sum(_find(tokens, c) for c in self._contains)
+            score += bool(self.is_) and self._is(tokens)
+        if node is None:
+            return score
+        score += bool(self.without) and all(node.named(name) is None for name in self.without)
+        for name, sub in self.args.items():
+            arg = node.named(name)
+            if arg is not None:
+                score += 1 + sub.score(index, buf, arg.start, arg.end, arg.call)
+        return score
+
+    def match(
+        self, index: StructureIndex, buf, start: int, end: int, call: int, prefix: str = ''
+    ) -> Optional[Dict[str, Tuple[int, int]]]:
+        """Captured ``{path: (start, end)}`` value spans if the value matches, else None.
+
+        Every named argument of a matched call is captured, nested ones under
+        a dotted path such as ``decoration.color``.
+        """
+        node = index.calls[call] if call >= 0 else None
+        if self.call is not None and (node is None or node.name != self.call):
+            return None
+        if self.contains or self.is_:
+            text = buf[start:end]
+            if not all(c in text for c in self.contains):
+                return None
+            tokens = _value_tokens(buf, start, end)
+            if not all(_find(tokens, c) for c in self._contains) or not self._is(tokens):
+                return None
+        captures: Dict[str, Tuple[int, int]] = {}
+        if node is None:
+            return captures
+        if any(node.named(name) is not None for name in self.without):
+            return None
+        for arg in node.args:
+            if arg.name is not None:
+                captures[prefix + arg.name] = (arg.start, arg.end)
+        for name, sub in self.args.items():
+            arg = node.named(name)
+            if arg is None:
+                return None
+            nested = sub.match(index, buf, arg.start, arg.end, arg.call, f'{prefix}{name}.')
+            if nested is None:
+                return None
+            captures.update(nested)
+        return captures
+
+    def _is(self, tokens: Tuple[bytes, ...]) -> bool:
+        """Whether the value is one of ``is``, or ``is`` is not set."""
+        if not self.is_:
+            return True
+        for expr in self.is_:
+            n = len(expr)
+            # Exactly the expression, or the last members of a longer chain.
+            if tokens[-n:] == expr and (len(tokens) == n or tokens[-n - 1] == b'.'):
+                return True
+        return False
+
+
+def _value_tokens(buf, start: int, end: int) -> Tuple[bytes, ...]:
+    return TokenIndex(bytes(buf[start:end])).symbols
+
+
+def _find(tokens: Tuple[bytes, ...], needle: Tuple[bytes, ...]) -> bool:
+    """Whether ``needle`` occurs in ``tokens`` as a run of whole tokens."""
+    n = len(needle)
+    first = needle[0] if n else None
+    for i in range(len(tokens) - n + 1):
+        if tokens[i] == first and tokens[i:i + n] == needle:
+            return True
+    return not n
+
+
+PLACEHOLDER_RE = re.compile(rb'\{\{\s*([\w.]+)\s*\}\}')
+
+
+def render(template: bytes, captures: Dict[str, Tuple[int, int]], buf) -> bytes:
+    """Fill ``{{name}}`` placeholders of a column-0 template with captured source.
+
+    A template line whose placeholder was not captured is dropped, so
+    optional arguments can be written as ``  padding: {{padding}},``.
+    Continuation lines of a captured value keep their indentation relative
+    to the line the value started on. Captured values come out with LF line
+    endings, like the template, for the caller to convert as a whole.
+    """
+    out = []
+    for line in template.split(b'\n'):
+        names = PLACEHOLDER_RE.findall(line)
+        if any(n.decode() not in captures for n in names):
+            continue
+        if not names:
+            out.append(line)
+            continue
+        indent = len(line) - len(line.lstrip(b' '))
+
+        def fill(m, indent=indent):
+            start, end = captures[m.group(1).decode()]
+            value = bytes(buf[start:end]).replace(b'\r\n', b'\n')
+            line_start = buf.rfind(b'\n', 0, start) + 1
+            origin = bytes(buf[line_start:start])
+            origin = len(origin) - len(origin.lstrip(b' '))
+            return _shift(value, indent - origin)
+
+        out.append(PLACEHOLDER_RE.sub(fill, line))
+    return b'\n'.join(out)
+
+
+def _shift(text: bytes, delta: int) -> bytes:
+    """Move every line but the first ``delta`` columns right (or left)."""
+    if delta == 0 or b'\n' not in text:
+        return text
+    lines = text.split(b'\n')
+    for i in range(1, len(lines)):
+        line = lines[i]
+        if delta > 0:
+            lines[i] = b' ' * delta + line if line.strip() else line
+        else:
+            strip = min(-delta, len(line) - len(line.lstrip(b' ')))
+            lines[i] = line[strip:]
+    return b'\n'.join(lines)
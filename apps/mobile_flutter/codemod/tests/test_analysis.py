@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod.analysis import _FIELD, _HEADER, AnalysisStore
+from codemod.imports import directives
+from codemod.l10n import extract
+from codemod.structure import StructureIndex
+from codemod.tokens import TokenIndex
+
+SOURCE = b"import 'a.dart';\n\nWidget a() => Text(t.trends_work, style: s);\n"
+L10N_SOURCE = (
+    b"import 'package:app/l10n/app_localizations.dart';\n"
+    b"Widget a(BuildContext c) {\n  final t = AppLocalizations.of(c);\n"
+    b"  return Card(child: Column(children: [Text(t.trendsTitle), Text('${t.trendsHours}')]));\n}\n"
+)
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        first = AnalysisStore(self.directory).analysis(L10N_SOURCE)
+        self.computed = (first.tokens, first.structure, first.directives, first.l10n_refs)
+        self.store = AnalysisStore(self.directory)
+        self.loaded = self.store.analysis(L10N_SOURCE)
+
+    def test_sections_load_as_they_were_computed(self):
+        tokens = self.loaded.tokens
+        expected = TokenIndex(L10N_SOURCE)
+        self.assertEqual(tokens.symbols, expected.symbols)
+        self.assertEqual(list(tokens.starts), list(expected.starts))
+        self.assertEqual(list(tokens.ends), list(expected.ends))
+
+        structure = self.loaded.structure
+        fresh = StructureIndex(L10N_SOURCE)
+        self.assertEqual(structure.spans, fresh.spans)
+        self.assertEqual([repr(c) for c in structure.calls], [repr(c) for c in fresh.calls])
+        self.assertEqual([[repr(a) for a in c.args] for c in structure.calls],
+                         [[repr(a) for a in c.args] for c in fresh.calls])
+        self.assertEqual(structure.by_name, fresh.by_name)
+
+        self.assertEqual([(d.keyword, d.uri, d.start, d.end) for d in self.loaded.directives],
+                         [(d.keyword, d.uri, d.start, d.end) for d in directives(L10N_SOURCE)])
+        self.assertEqual(self.loaded.l10n_refs, extract(L10N_SOURCE))
+        self.assertEqual((self.store.loaded, self.store.computed), (4, 0))
+
+    def test_each_section_is_loaded_once_per_analysis(self):
+        self.loaded.tokens
+        self.loaded.tokens
+        self.assertEqual(self.store.loaded, 1)
+
+
+class PruneTest(unittest.TestCase):
+    def test_least_recently_used_entries_go_first(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AnalysisStore(Path(tmp))
+            entries = []
+            for n in range(8):
+                analysis = store.analysis(SOURCE + b'// %d\n' % n)
+                analysis.tokens
+                path = store.path(analysis.sha256, 'tokens')
+                os.utime(path, ns=(n * 10**9, n * 10**9))
+                entries.append(path)
+            size = entries[0].stat().st_size
+            self.assertEqual(store.prune(size * 8), 0)
+            removed = store.prune(size * 4)
+            self.assertEqual(removed, 5)
+            self.assertEqual([p.exists() for p in entries], [False] * 5 + [True] * 3)
+            self.assertEqual(AnalysisStore(None).prune(0), 0)
+
+
+class DamagedEntryTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        first = AnalysisStore(self.directory)
+        first.analysis(SOURCE).tokens
+        self.assertEqual(first.computed, 1)
+        self.entry = first.path(first.analysis(SOURCE).sha256, 'tokens')
+        self.stored = self.entry.read_bytes()
+
+    def rebuilt(self):
+        store = AnalysisStore(self.directory)
+        index = store.analysis(SOURCE).tokens
+        self.assertEqual((store.loaded, store.computed), (0, 1))
+        expected = TokenIndex(SOURCE)
+        self.assertEqual(index.symbols, expected.symbols)
+        self.assertEqual(list(index.starts), list(expected.starts))
+        # The rebuilt entry is written back whole.
+        self.assertEqual(self.entry.read_bytes(), self.stored)
+
+    def test_short_header_is_a_miss(self):
+        self.entry.write_bytes(self.stored[:_HEADER.size - 1])
+        self.rebuilt()
+
+    def test_short_field_table_is_a_miss(self):
+        self.entry.write_bytes(self.stored[:_HEADER.size + _FIELD.size // 2])
+        self.rebuilt()
+
+    def test_truncated_arrays_are_a_miss(self):
+        self.entry.write_bytes(self.stored[:len(self.stored) - 3])
+        self.rebuilt()
+
+    def test_corrupt_typecode_is_a_miss(self):
+        data = bytearray(self.stored)
+        data[_HEADER.size + 12] = ord('?')
+        self.entry.write_bytes(bytes(data))
+        self.rebuilt()
+
+    def test_intact_entry_is_loaded(self):
+        store = AnalysisStore(self.directory)
+        store.analysis(SOURCE).tokens
+        self.assertEqual((store.loaded, store.computed), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
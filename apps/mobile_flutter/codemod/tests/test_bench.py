@@ -0,0 +1,37 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import runner
+from codemod.bench import generate, synth_file
+from codemod.engine import Task
+from codemod.packs import DEFAULT_PACK, compile_pack
+
+
+class CorpusTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = compile_pack(DEFAULT_PACK)
+
+    def test_files_reach_the_requested_size(self):
+        text = synth_file(random.Random(1), 20_000, 0, [])
+        self.assertGreaterEqual(len(text), 20_000)
+        self.assertEqual(synth_file(random.Random(1), 20_000, 0, []), text)
+
+    def test_embedded_rules_are_found_and_rewritten(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            total = generate(out, 1, [4_000, 8_000], self.compiled, seed=3)
+            paths = runner.discover([out])
+            self.assertEqual(len(paths), 2)
+            self.assertEqual(sum(p.stat().st_size for p in paths), total)
+            results = runner.run([Task(p, p.stat().st_size) for p in paths], self.compiled, 1,
+                                 dry_run=True)
+            self.assertFalse([r.error for r in results if r.error])
+            matches = sum(sum(r.matches.values()) for r in results)
+            self.assertEqual(matches, len(self.compiled.ruleset.rules))
+
+
+if __name__ == '__main__':
+    unittest.main()
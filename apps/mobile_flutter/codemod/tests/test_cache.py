@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod.cache import Manifest, content_digest, rule_digests
+from codemod.engine import CompiledRuleSet, Task, process_file
+from codemod.rules import Rule, RuleSet
+
+RULE = Rule('old_to_new', 'Text(t.trends_old)', 'Text(t.trends_new)')
+OTHER = Rule('a_to_b', 'Text(t.a)', 'Text(t.b)')
+
+
+class RuleDigestTest(unittest.TestCase):
+    def test_digest_changes_with_the_templates_only(self):
+        before = rule_digests(RuleSet('one', (RULE, OTHER)))
+        edited = Rule(RULE.name, RULE.before, 'Text(t.trends_newer)')
+        after = rule_digests(RuleSet('two', (edited, OTHER)))
+        self.assertNotEqual(before[RULE.name], after[RULE.name])
+        self.assertEqual(before[OTHER.name], after[OTHER.name])
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.path = self.dir / 'a.dart'
+        self.path.write_bytes(b'Widget a() => Text(t.trends_new);\n')
+
+    def record(self, manifest, rules):
+        st = os.stat(self.path)
+        manifest.record(str(self.path), st.st_size, st.st_mtime_ns,
+                        content_digest(self.path.read_bytes()), rules)
+
+    def test_fresh_until_the_file_or_the_rules_change(self):
+        manifest = Manifest(self.dir / 'manifest.json')
+        self.record(manifest, ['r1', 'r2'])
+        st = os.stat(self.path)
+        self.assertTrue(manifest.is_fresh(str(self.path), st, frozenset({'r1'})))
+        self.assertFalse(manifest.is_fresh(str(self.path), st, frozenset({'r1', 'r3'})))
+        self.path.write_bytes(b'Widget a() => Text(t.trends_old);\n// edited\n')
+        self.assertFalse(manifest.is_fresh(str(self.path), os.stat(self.path), frozenset({'r1'})))
+
+    def test_saved_entries_survive_a_reload(self):
+        manifest = Manifest(self.dir / 'cache' / 'manifest.json')
+        self.record(manifest, ['r1'])
+        manifest.save()
+        self.assertFalse(manifest.dirty)
+        self.assertEqual(Manifest(manifest.path).entry(str(self.path)), manifest.entry(str(self.path)))
+
+    def test_unreadable_manifest_starts_empty(self):
+        path = self.dir / 'manifest.json'
+        path.write_text('{not json')
+        self.assertEqual(Manifest(path).files, {})
+
+
+class PendingRulesTest(unittest.TestCase):
+    def test_only_rules_not_yet_run_on_the_content_are_applied(self):
+        compiled = CompiledRuleSet(RuleSet('test', (RULE, OTHER)))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'a.dart'
+            path.write_bytes(b'Widget a() => Text(t.a);\n')
+            sha = content_digest(path.read_bytes())
+            done = frozenset({compiled.digests[OTHER.name]})
+            result = process_file(Task(path, 0, sha, done), compiled)
+            self.assertFalse(result.changed)
+            self.assertEqual(sorted(result.rules), sorted(compiled.digests.values()))
+            # With a different hash on record, nothing counts as done.
+            result = process_file(Task(path, 0, '0' * 64, done), compiled)
+            self.assertTrue(result.changed)
+
+    def test_file_with_every_rule_done_is_skipped(self):
+        compiled = CompiledRuleSet(RuleSet('test', (RULE,)))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'a.dart'
+            path.write_bytes(b'Widget a() => Text(t.trends_old);\n')
+            sha = content_digest(path.read_bytes())
+            result = process_file(Task(path, 0, sha, frozenset(compiled.digests.values())), compiled)
+            self.assertTrue(result.skipped)
+            self.assertFalse(result.changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from codemod.diff import unified
+
+
+class UnifiedTest(unittest.TestCase):
+    def test_counts_skip_the_file_headers(self):
+        old = b'--count;\nx = 1;\n'
+        new = b'++count;\nx = 1;\n'
+        text, added, removed = unified(old, new, 'lib/a.dart')
+        self.assertEqual((added, removed), (1, 1))
+        self.assertTrue(text.startswith('--- a/lib/a.dart\n+++ b/lib/a.dart\n'))
+        self.assertIn('\n---count;\n+++count;\n', text)
+
+    def test_missing_final_newline_is_marked(self):
+        text, added, removed = unified(b'a\nb', b'a\nc', 'a.dart')
+        self.assertEqual((added, removed), (1, 1))
+        self.assertIn('-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n', text)
+
+    def test_identical_contents_give_no_diff(self):
+        self.assertEqual(unified(b'a\n', b'a\n', 'a.dart'), ('', 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
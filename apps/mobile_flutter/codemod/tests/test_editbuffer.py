@@ -0,0 +1,64 @@
+import unittest
+
+from codemod.editbuffer import EditBuffer
+from codemod.fileio import splice
+
+
+class EditBufferTest(unittest.TestCase):
+    def test_disjoint_edits_are_sorted(self):
+        buf = EditBuffer()
+        buf.add(6, 11, b'there', 'b')
+        buf.add(0, 5, b'HELLO', 'a')
+        edits, owners, conflicts = buf.resolve()
+        self.assertEqual(edits, [(0, 5, b'HELLO'), (6, 11, b'there')])
+        self.assertEqual(owners, ['a', 'b'])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(splice(b'hello world', edits), b'HELLO there')
+
+    def test_overlapping_edits_are_all_left_out(self):
+        buf = EditBuffer()
+        buf.add(0, 4, b'x', 'a')
+        buf.add(2, 6, b'y', 'b')
+        buf.add(5, 8, b'z', 'c')
+        buf.add(10, 12, b'w', 'd')
+        edits, owners, conflicts = buf.resolve()
+        self.assertEqual((edits, owners), ([(10, 12, b'w')], ['d']))
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0].owners, ['a', 'b', 'c'])
+        self.assertEqual(conflicts[0].spans, [(0, 4), (2, 6), (5, 8)])
+        self.assertEqual(conflicts[0].start, 0)
+
+    def test_order_of_adding_does_not_change_the_outcome(self):
+        spans = [(0, 4, 'a'), (2, 6, 'b'), (8, 9, 'c')]
+        results = []
+        for order in (spans, spans[::-1]):
+            buf = EditBuffer()
+            for start, end, owner in order:
+                buf.add(start, end, owner.encode(), owner)
+            edits, owners, conflicts = buf.resolve()
+            results.append((edits, owners, sorted(sorted(c.owners) for c in conflicts)))
+        self.assertEqual(results[0], results[1])
+
+    def test_touching_edits_and_insertions_do_not_conflict(self):
+        buf = EditBuffer()
+        buf.add(0, 3, b'A', 'replace')
+        buf.add(3, 3, b'+', 'insert_at_end')
+        buf.add(3, 3, b'-', 'insert_again')
+        buf.add(3, 5, b'B', 'next')
+        buf.add(0, 0, b'>', 'insert_at_start')
+        edits, owners, conflicts = buf.resolve()
+        self.assertEqual(conflicts, [])
+        self.assertEqual(owners, ['insert_at_start', 'replace', 'insert_at_end', 'insert_again', 'next'])
+        self.assertEqual(splice(b'abcde', edits), b'>A+-B')
+
+    def test_bad_spans_are_rejected(self):
+        buf = EditBuffer()
+        with self.assertRaises(ValueError):
+            buf.add(5, 4, b'', 'backwards')
+        with self.assertRaises(ValueError):
+            buf.add(-1, 2, b'', 'negative')
+        self.assertEqual(len(buf), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod.engine import CompiledRuleSet, Task, process_file
+from codemod.rules import Rule, RuleSet
+from codemod.tokens import TokenIndex
+
+# A rule whose replacement contains its own pattern.
+WRAP = Rule(
+    'pad_work',
+    'Text(t.trends_work)',
+    'Padding(\n  padding: EdgeInsets.zero,\n  child: Text(t.trends_work),\n)',
+)
+
+
+# The first rule's output is the second rule's input.
+CHAIN = (
+    Rule('old_to_mid', 'Text(t.trends_old)', 'Text(t.trends_mid)'),
+    Rule('mid_to_new', 'Text(t.trends_mid)', 'Text(t.trends_new)'),
+)
+
+
+class AppliedRuleTest(unittest.TestCase):
+    def setUp(self):
+        self.compiled = CompiledRuleSet(RuleSet('test', (WRAP,)))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'a.dart'
+        self.path.write_bytes(b'Widget a() => Text(t.trends_work);\n')
+
+    def test_wrapping_rule_is_not_applied_again_after_an_edit(self):
+        first = process_file(Task(self.path, 0), self.compiled)
+        self.assertTrue(first.changed)
+        # The edit changes the hash, so the manifest no longer vouches for the rule.
+        edited = self.path.read_bytes() + b'// edited\n'
+        self.path.write_bytes(edited)
+        again = process_file(Task(self.path, 0, first.sha256, frozenset(first.rules)), self.compiled)
+        self.assertIsNone(again.error)
+        self.assertFalse(again.changed)
+        self.assertEqual(again.applied, ['pad_work'])
+        self.assertEqual(self.path.read_bytes(), edited)
+
+    def test_wrapping_rule_reaches_a_fixed_point(self):
+        result = process_file(Task(self.path, 0), self.compiled, max_passes=4)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.passes, 1)
+        self.assertEqual(self.path.read_bytes().count(b'Padding('), 1)
+
+
+class RecordedRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.compiled = CompiledRuleSet(RuleSet('test', CHAIN))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'a.dart'
+        self.path.write_bytes(b'Widget a() => Text(t.trends_mid);\nWidget b() => Text(t.trends_old);\n')
+
+    def test_rules_are_not_recorded_for_contents_they_did_not_see(self):
+        first = process_file(Task(self.path, 0), self.compiled)
+        self.assertTrue(first.changed)
+        self.assertEqual(first.rules, [])
+        again = process_file(Task(self.path, 0, first.sha256, frozenset(first.rules)), self.compiled)
+        self.assertTrue(again.changed)
+        self.assertEqual(again.matches, {'mid_to_new': 1})
+        self.assertEqual(self.path.read_bytes().count(b'trends_new'), 2)
+
+    def test_converged_rules_are_recorded(self):
+        result = process_file(Task(self.path, 0), self.compiled, max_passes=4)
+        self.assertTrue(result.changed)
+        self.assertEqual(sorted(result.rules), sorted(self.compiled.digests.values()))
+        self.assertEqual(self.path.read_bytes().count(b'trends_new'), 2)
+
+
+class FormattingTest(unittest.TestCase):
+    def test_rule_matches_however_the_block_is_formatted(self):
+        rule = Rule(
+            'card', 'Container(\n  child: Text(t.trends_work),\n)', 'AppCard(child: Text(t.trends_work))'
+        )
+        compiled = CompiledRuleSet(RuleSet('test', (rule,)))
+        buf = b'Widget a() => Container(child: Text(t.trends_work,),);\n'
+        edits, matches, applied = compiled.rewrite(buf)
+        self.assertEqual(matches, {'card': 1})
+        self.assertEqual(edits, [(14, buf.index(b';'), b'AppCard(child: Text(t.trends_work))')])
+
+
+class ImportConflictTest(unittest.TestCase):
+    def test_matches_count_only_the_edits_written(self):
+        rules = (
+            Rule('header', "import 'a0.dart';\nWidget a", "import 'a0.dart';\nWidget b",
+                 requires_import='design/card.dart'),
+            Rule('old_to_new', 'Text(t.trends_old)', 'Text(t.trends_new)'),
+        )
+        compiled = CompiledRuleSet(RuleSet('test', rules))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        (root / 'pubspec.yaml').write_text('name: app\n')
+        (root / 'lib').mkdir()
+        path = root / 'lib' / 'a.dart'
+        path.write_bytes(b"import 'a0.dart';\nWidget a() => Text(t.trends_old);\n")
+        result = process_file(Task(path, 0), compiled)
+        self.assertIsNone(result.error)
+        # The import goes right after the line the first rule rewrites.
+        self.assertEqual([c.owners for c in result.conflicts], [['header', 'import design/card.dart']])
+        self.assertEqual(result.matches, {'old_to_new': 1})
+        self.assertEqual(result.rule_stats['header']['matches'], 0)
+        self.assertEqual(path.read_bytes(), b"import 'a0.dart';\nWidget a() => Text(t.trends_new);\n")
+
+
+class ConvergeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'a.dart'
+        self.source = b'Widget a() => Column(children: [Text(t.trends_old), Text(t.trends_x)]);\n'
+        self.path.write_bytes(self.source)
+
+    def run_rules(self, rules, max_passes):
+        return process_file(Task(self.path, 0), CompiledRuleSet(RuleSet('test', rules)),
+                            max_passes=max_passes)
+
+    def test_each_pass_rewrites_the_previous_pass_output(self):
+        result = self.run_rules(CHAIN, 4)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.passes, 2)
+        self.assertEqual(result.matches, {'old_to_mid': 1, 'mid_to_new': 1})
+        self.assertEqual(self.path.read_bytes(), self.source.replace(b'trends_old', b'trends_new'))
+
+    def test_rules_undoing_each_other_are_reported(self):
+        rules = (
+            Rule('x_to_y', 'Text(t.trends_x)', 'Text(t.trends_y)'),
+            Rule('y_to_x', 'Text(t.trends_y)', 'Text(t.trends_x)'),
+        )
+        result = self.run_rules(rules, 8)
+        self.assertIn('rules undo each other (x_to_y, y_to_x)', result.error)
+        self.assertFalse(result.changed)
+        self.assertEqual(self.path.read_bytes(), self.source)
+
+    def test_too_many_passes_is_an_error(self):
+        self.assertIsNone(self.run_rules(CHAIN, 2).error)
+        self.path.write_bytes(self.source)
+        longer = CHAIN + (Rule('new_to_final', 'Text(t.trends_new)', 'Text(t.trends_final)'),)
+        result = self.run_rules(longer, 2)
+        self.assertEqual(result.error, 'no fixed point after 2 passes')
+        self.assertEqual(self.path.read_bytes(), self.source)
+
+
+class EnclosingTest(unittest.TestCase):
+    def test_finds_the_structural_calls_open_around_each_region(self):
+        box = Rule('box_to_card', '', 'Card(child: {{child}})',
+                   match=json.dumps({'call': 'Box', 'args': {'child': {}}}))
+        compiled = CompiledRuleSet(RuleSet('test', (box,)))
+        buf = (b'Widget a() => Box(child: Row(children: [Text(t.x)]));\n'
+               b'Widget b() => Text(t.y);\n'
+               b'Widget c() => Box(child: Box(child: Text(t.z)));\n')
+        index = TokenIndex(buf)
+        boxes = [i for i, tok in enumerate(index.symbols) if tok == b'Box']
+        regions = [(buf.index(name), buf.index(name) + 3) for name in (b't.x', b't.y', b't.z')]
+        found = compiled._enclosing(index, regions, None)
+        self.assertEqual(sorted(first for first, _ in found), boxes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import random
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import fileio
+from codemod.fileio import commit, invert, line_edits, open_buffer, splice, stage
+from codemod.tokens import newline_at
+
+
+class SpliceTest(unittest.TestCase):
+    def test_replacements_insertions_and_deletions(self):
+        buf = b'abcdefgh'
+        edits = [(0, 0, b'>'), (1, 3, b'XYZ'), (5, 6, b''), (8, 8, b'<')]
+        self.assertEqual(splice(buf, edits), b'>aXYZdegh<')
+
+    def test_invert_restores_the_original(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            buf = bytes(rng.choice(b'ab\n') for _ in range(rng.randrange(4, 30)))
+            cuts = sorted(rng.sample(range(len(buf) + 1), rng.randrange(0, 6) & ~1))
+            edits = [(s, e, b'x' * rng.randrange(4)) for s, e in zip(cuts[::2], cuts[1::2])]
+            new = splice(buf, edits)
+            self.assertEqual(splice(new, invert(buf, edits)), buf)
+
+    def test_line_edits_turn_old_into_new(self):
+        old = b'one\ntwo\nthree\nfour\n'
+        new = b'one\n2\nthree\nfour\nfive\n'
+        edits = line_edits(old, new)
+        self.assertEqual(edits, [(4, 8, b'2\n'), (19, 19, b'five\n')])
+        self.assertEqual(splice(old, edits), new)
+        self.assertEqual(line_edits(old, old), [])
+
+
+class WriteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'a.dart'
+        self.path.write_bytes(b'hello world\n')
+        os.chmod(self.path, 0o640)
+
+    def test_stage_leaves_the_original_until_commit(self):
+        with open_buffer(self.path) as buf:
+            tmp = stage(self.path, buf, [(0, 5, b'goodbye')])
+        self.assertEqual(self.path.read_bytes(), b'hello world\n')
+        commit(tmp, self.path)
+        self.assertEqual(self.path.read_bytes(), b'goodbye world\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(os.listdir(self.path.parent), ['a.dart'])
+
+    def test_large_files_are_mapped(self):
+        data = b'x' * fileio.MMAP_THRESHOLD
+        self.path.write_bytes(data)
+        with open_buffer(self.path) as buf:
+            self.assertNotIsInstance(buf, bytes)
+            self.assertEqual(splice(buf, [(0, 1, b'y')]), b'y' + data[1:])
+
+
+class NewlineTest(unittest.TestCase):
+    def test_line_ending_of_the_line(self):
+        buf = b'a\r\nb\nc'
+        self.assertEqual(newline_at(buf, 0), b'\r\n')
+        self.assertEqual(newline_at(buf, 3), b'\n')
+        self.assertEqual(newline_at(buf, 5), b'\n')
+        self.assertEqual(newline_at(b'a\r\nb', 3), b'\r\n')
+        self.assertEqual(newline_at(b'ab', 1), b'\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
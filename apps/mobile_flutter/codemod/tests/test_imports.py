@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import imports
+from codemod.fileio import splice
+from codemod.imports import ImportTable, directives
+
+
+class DirectivesTest(unittest.TestCase):
+    def test_header_directives_only(self):
+        source = (
+            b"// comment\n@Deprecated('x;')\nlibrary a;\n"
+            b"import 'dart:async';\nimport \"b.dart\" show B;\npart 'c.g.dart';\n"
+            b"class A {}\nimport 'late.dart';\n"
+        )
+        found = directives(source)
+        self.assertEqual([(d.keyword, d.uri) for d in found],
+                         [('import', 'dart:async'), ('import', 'b.dart'), ('part', 'c.g.dart')])
+        self.assertEqual(source[found[1].start:found[1].end], b'import "b.dart" show B;')
+
+
+class ImportTableTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        (self.root / 'pubspec.yaml').write_text('name: app\n')
+        self.lib = self.root / 'lib'
+        for name in ('design/components/components.dart', 'design/design.dart',
+                     'config/app_theme.dart', 'screens/card.dart'):
+            (self.lib / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.lib / name).write_text('')
+        (self.lib / 'design/design.dart').write_text("export 'components/components.dart';\n")
+        (self.lib / 'config/app_theme.dart').write_text("export '../design/design.dart';\n")
+        self.path = str(self.lib / 'screens' / 'card.dart')
+        self.addCleanup(imports._packages.clear)
+
+    def table(self, source: bytes) -> ImportTable:
+        return ImportTable(source, self.path)
+
+    def test_package_and_relative_uris_resolve_to_files(self):
+        table = self.table(
+            b"import 'package:app/config/app_theme.dart';\nimport '../design/design.dart';\n"
+        )
+        self.assertEqual(table.package.name, 'app')
+        self.assertEqual(sorted(table.imports), [
+            str(self.lib / 'config/app_theme.dart'), str(self.lib / 'design/design.dart'),
+        ])
+
+    def test_required_import_through_re_exports(self):
+        target = self.table(b'').target('design/components/components.dart')
+        self.assertEqual(target, os.path.normpath(self.lib / 'design/components/components.dart'))
+        self.assertTrue(self.table(b"import '../config/app_theme.dart';\n").provides(target))
+        self.assertFalse(self.table(b"import 'package:flutter/material.dart';\n").provides(target))
+
+    def test_insertion_keeps_imports_sorted(self):
+        source = (
+            b"import 'package:flutter/material.dart';\n\n"
+            b"import '../config/app_theme.dart';\nimport 'other.dart';\n\nclass A {}\n"
+        )
+        table = self.table(source)
+        at, text = table.insertion(table.target('design/components/components.dart'))
+        self.assertEqual(splice(source, [(at, at, text)]), (
+            b"import 'package:flutter/material.dart';\n\n"
+            b"import '../config/app_theme.dart';\nimport '../design/components/components.dart';\n"
+            b"import 'other.dart';\n\nclass A {}\n"
+        ))
+
+    def test_insertion_follows_package_style_and_line_endings(self):
+        source = b"import 'package:app/config/app_theme.dart';\r\n\r\nclass A {}\r\n"
+        table = self.table(source)
+        at, text = table.insertion(table.target('design/design.dart'))
+        self.assertEqual(splice(source, [(at, at, text)]), (
+            b"import 'package:app/config/app_theme.dart';\r\n"
+            b"import 'package:app/design/design.dart';\r\n\r\nclass A {}\r\n"
+        ))
+        at, text = self.table(b'class A {}\n').insertion(table.target('design/design.dart'))
+        self.assertEqual((at, text), (0, b"import '../design/design.dart';\n\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import journal
+from codemod.cache import content_digest
+from codemod.engine import CompiledRuleSet, Task, process_file
+from codemod.journal import Record, decode, encode, undo, undo_file
+from codemod.rules import Rule, RuleSet
+
+RULE = Rule('old_to_new', 'Text(t.trends_old)', 'Padding(child: Text(t.trends_new))')
+
+
+class EncodingTest(unittest.TestCase):
+    def test_records_round_trip(self):
+        records = [
+            Record('/tmp/a.dart', 'ab' * 32, 'cd' * 32,
+                   [(0, 3, b'old'), (10, 10, b''), (12, 20, b'\xff')]),
+            Record('/tmp/café.dart', '00' * 32, '11' * 32, []),
+        ]
+        data = encode(records)
+        self.assertTrue(data.startswith(journal.MAGIC))
+        self.assertEqual(decode(data), records)
+
+    def test_other_files_are_rejected(self):
+        with self.assertRaises(ValueError):
+            decode(b'PK\x03\x04')
+
+
+class UndoTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.compiled = CompiledRuleSet(RuleSet('test', (RULE,)))
+        self.originals = {}
+        records = []
+        for n in range(3):
+            path = self.dir / f'{n}.dart'
+            source = f'Widget w{n}() => Column(children: [Text(t.trends_old), Text(t.x{n})]);\r\n'
+            self.originals[path] = source.encode()
+            path.write_bytes(self.originals[path])
+            result = process_file(Task(path, 0), self.compiled)
+            self.assertTrue(result.changed)
+            records.append(Record(result.path, result.original_sha256, result.sha256, result.reverse))
+        self.records = decode(encode(records))
+
+    def test_undo_restores_every_file(self):
+        self.assertEqual([problem for _, problem in undo(self.records, jobs=2)], [None] * 3)
+        for path, original in self.originals.items():
+            self.assertEqual(path.read_bytes(), original)
+        # A second undo finds the files already restored.
+        self.assertEqual([problem for _, problem in undo(self.records, jobs=1)], [None] * 3)
+
+    def test_files_edited_since_the_run_are_left_alone(self):
+        record = self.records[0]
+        edited = Path(record.path).read_bytes() + b'// mine\n'
+        Path(record.path).write_bytes(edited)
+        self.assertEqual(undo_file(record), 'changed since the run, left as is')
+        self.assertEqual(Path(record.path).read_bytes(), edited)
+
+    def test_bad_reverse_edits_are_not_applied(self):
+        record = self.records[0]
+        current = Path(record.path).read_bytes()
+        broken = Record(record.path, record.pre, record.post, [(0, 1, b'?')])
+        self.assertEqual(undo_file(broken), 'reverse edits do not reproduce the original, left as is')
+        self.assertEqual(content_digest(Path(record.path).read_bytes()), content_digest(current))
+
+    def test_only_the_newest_journals_are_kept(self):
+        directory = self.dir / 'journal'
+        directory.mkdir()
+        for n in range(journal.KEEP + 3):
+            (directory / f'19700101-0000{n:02d}-1.journal').write_bytes(b'')
+        newest = journal.write(directory, self.records)
+        kept = journal.journals(directory)
+        self.assertEqual(len(kept), journal.KEEP)
+        self.assertEqual(kept[-1], newest)
+        self.assertEqual(decode(newest.read_bytes()), self.records)
+
+
+if __name__ == '__main__':
+    unittest.main()
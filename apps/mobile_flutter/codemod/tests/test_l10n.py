@@ -0,0 +1,80 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod.l10n import L10nIndex, extract
+
+SOURCE = b'''import 'l10n/app_localizations.dart';
+
+class Card extends StatelessWidget {
+  Widget build(BuildContext context) {
+    final t = AppLocalizations.of(context);
+    final title = AppLocalizations.of(context)!.trendsTitle;
+    // t.inAComment
+    final label = 'x t.inAString';
+    final rows = items.map((t) => t.totalHours).toList();
+    return Text('${t.trendsSubtitle} ${AppLocalizations.of(context).trendsHours}'
+        + t.localeName + t.trendsSubtitle);
+  }
+}
+
+String format(AppLocalizations? l, int n) => l?.trendsCount(n) ?? '';
+'''
+
+
+class ExtractTest(unittest.TestCase):
+    def test_keys_and_lines(self):
+        self.assertEqual(extract(SOURCE), {
+            'trendsTitle': [6],
+            'trendsSubtitle': [10, 11],
+            'trendsHours': [10],
+            'trendsCount': [15],
+        })
+
+    def test_files_without_localizations_have_no_keys(self):
+        self.assertEqual(extract(b'final t = Theme.of(context);\nvar x = t.title;\n'), {})
+
+
+class ReportTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        self.lib = root / 'lib'
+        self.arb_dir = self.lib / 'l10n'
+        self.arb_dir.mkdir(parents=True)
+        self.source = self.lib / 'card.dart'
+        self.source.write_bytes(SOURCE)
+        # Generated sources are not references.
+        (self.arb_dir / 'app_localizations.dart').write_bytes(b'String get unusedKey => t.unusedKey;\n')
+        keys = {'trendsTitle': 'T', 'trendsSubtitle': 'S', 'trendsHours': 'H', 'unusedKey': 'U'}
+        (self.arb_dir / 'app_en.arb').write_text(json.dumps(dict(keys, **{'@trendsTitle': {}})))
+        del keys['trendsHours']
+        (self.arb_dir / 'app_de.arb').write_text(json.dumps(keys))
+        self.path = root / 'index.json'
+
+    def index(self) -> L10nIndex:
+        return L10nIndex(self.path, self.arb_dir, self.arb_dir)
+
+    def test_report_and_incremental_update(self):
+        index = self.index()
+        paths = sorted(self.lib.rglob('*.dart'))
+        self.assertEqual(index.update(paths), 1)
+        report = index.report()
+        self.assertEqual(report['keys'], 4)
+        self.assertEqual(report['referenced'], 3)
+        self.assertEqual(report['unused'], ['unusedKey'])
+        self.assertEqual(report['missing'], {'trendsCount': [f'{self.source.resolve()}:15']})
+        self.assertEqual(report['untranslated'], {'app_de': ['trendsHours']})
+        index.save()
+
+        reloaded = self.index()
+        self.assertEqual(reloaded.update(paths), 0)
+        self.source.write_bytes(SOURCE + b'var u = AppLocalizations.of(c).unusedKey;\n')
+        self.assertEqual(reloaded.update(paths), 1)
+        self.assertEqual(reloaded.report()['unused'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
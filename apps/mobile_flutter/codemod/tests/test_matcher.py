@@ -0,0 +1,43 @@
+import unittest
+
+from codemod.matcher import Automaton
+
+
+def naive(patterns, haystack):
+    found = []
+    for end in range(1, len(haystack) + 1):
+        for index, pattern in enumerate(patterns):
+            start = end - len(pattern)
+            if start >= 0 and list(haystack[start:end]) == list(pattern):
+                found.append((start, end, index))
+    return found
+
+
+class AutomatonTest(unittest.TestCase):
+    def test_finds_overlapping_and_nested_patterns(self):
+        patterns = ['he', 'she', 'his', 'hers']
+        matches = list(Automaton(patterns).iter_matches('ushers'))
+        self.assertEqual(sorted(matches), sorted([(1, 4, 1), (2, 4, 0), (2, 6, 3)]))
+
+    def test_agrees_with_a_naive_search(self):
+        patterns = ['a', 'ab', 'bab', 'bc', 'bca', 'c', 'caa', 'abcab']
+        haystack = 'abccabcabbcaababcabca'
+        self.assertEqual(
+            sorted(Automaton(patterns).iter_matches(haystack)), sorted(naive(patterns, haystack))
+        )
+
+    def test_token_tuples(self):
+        patterns = [(b'Text', b'(', b't'), (b't', b'.', b'x')]
+        haystack = (b'Text', b'(', b't', b'.', b'x', b')')
+        self.assertEqual(list(Automaton(patterns).iter_matches(haystack)), [(0, 3, 0), (2, 5, 1)])
+
+    def test_duplicate_patterns_both_report(self):
+        self.assertEqual(sorted(Automaton(['ab', 'ab']).iter_matches('xab')), [(1, 3, 0), (1, 3, 1)])
+
+    def test_empty_pattern_is_refused(self):
+        with self.assertRaises(ValueError):
+            Automaton(['a', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import packs
+from codemod.packs import PackError, compile_pack, digest, load
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def write(self, rules, name='pack'):
+        (self.dir / 'pack.json').write_text(json.dumps({'name': name, 'rules': rules}))
+        return self.dir
+
+    def test_bundled_packs_load(self):
+        for pack in packs.PACKS_DIR.iterdir():
+            self.assertTrue(load(pack).rules, pack.name)
+
+    def test_templates_inline_or_from_files(self):
+        (self.dir / 'r.after').write_text('Text(t.b)')
+        ruleset = load(self.write([{'name': 'r', 'before': 'Text(t.a)', 'after_file': 'r.after',
+                                    'requires_import': 'ui/b.dart'}]))
+        rule = ruleset.rules[0]
+        self.assertEqual((rule.before, rule.after, rule.requires_import),
+                         ('Text(t.a)', 'Text(t.b)', 'ui/b.dart'))
+
+    def test_invalid_packs_are_rejected(self):
+        bad = [
+            [],
+            [{'before': 'a', 'after': 'b'}],
+            [{'name': 'r', 'before': 'a', 'after': 'b'}, {'name': 'r', 'before': 'c', 'after': 'd'}],
+            [{'name': 'r', 'after': 'b'}],
+            [{'name': 'r', 'before': 'a', 'after': 'b', 'import': 'package:x/y.dart'}],
+            [{'name': 'r', 'before': 'a', 'after': 'b', 'requires_import': 'package:x/y.dart'}],
+        ]
+        for rules in bad:
+            with self.subTest(rules=rules), self.assertRaises(PackError):
+                load(self.write(rules))
+        (self.dir / 'pack.json').write_text('{')
+        with self.assertRaises(PackError):
+            load(self.dir)
+
+
+class CompileTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.pack = self.dir / 'pack'
+        self.pack.mkdir()
+        (self.pack / 'r.before').write_text('Text(t.a)')
+        (self.pack / 'pack.json').write_text(json.dumps(
+            {'name': 'p', 'rules': [{'name': 'r', 'before_file': 'r.before', 'after': 'Text(t.b)'}]}))
+
+    def test_digest_covers_the_template_files(self):
+        before = digest(self.pack)
+        (self.pack / 'r.before').write_text('Text(t.c)')
+        self.assertNotEqual(digest(self.pack), before)
+
+    def test_compiled_pack_is_cached_and_rebuilt_when_corrupt(self):
+        cache = self.dir / 'cache'
+        first = compile_pack(self.pack, cache)
+        cached = cache / 'compiled' / f'{digest(self.pack)}.pickle'
+        self.assertTrue(cached.exists())
+        mtime = os.stat(cached).st_mtime_ns
+        second = compile_pack(self.pack, cache)
+        self.assertEqual(os.stat(cached).st_mtime_ns, mtime)
+        self.assertEqual(second.ruleset, first.ruleset)
+        cached.write_bytes(b'not a pickle')
+        third = compile_pack(self.pack, cache)
+        self.assertEqual(third.ruleset, first.ruleset)
+        self.assertNotEqual(cached.read_bytes(), b'not a pickle')
+
+
+if __name__ == '__main__':
+    unittest.main()
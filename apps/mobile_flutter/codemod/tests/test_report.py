@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import report
+from codemod.engine import CompiledRuleSet, Task, process_file
+from codemod.report import PhaseTimer, merge_profiles
+from codemod.rules import Rule, RuleSet
+
+RULES = (
+    Rule('old_to_new', 'Text(t.trends_old)', 'Text(t.trends_new)'),
+    Rule('never_seen', 'Text(t.trends_gone)', 'Text(t.trends_here)'),
+)
+
+
+class BuildTest(unittest.TestCase):
+    def test_counters_are_summed_per_rule(self):
+        compiled = CompiledRuleSet(RuleSet('test', RULES))
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [Path(tmp) / name for name in ('a.dart', 'b.dart', 'c.dart')]
+            paths[0].write_bytes(b'a() => Text(t.trends_old);\nb() => Text(t.trends_old);\n')
+            paths[1].write_bytes(b'a() => Text(t.trends_old);\n')
+            paths[2].write_bytes(b'a() => Text(t.trends_new);\n')
+            results = [process_file(Task(p, 0), compiled, dry_run=True) for p in paths]
+        built = report.build(results, compiled.ruleset, 1.0, fresh=2, dry_run=True, ruled_out=1)
+        self.assertEqual(built['files'], {
+            'total': 6, 'ruled_out_by_index': 1, 'unchanged_since_last_run': 2,
+            'evaluated': 3, 'changed': 2, 'errors': 0,
+        })
+        stats = built['rules']['old_to_new']
+        self.assertEqual((stats['matches'], stats['files'], stats['applied_files']), (3, 2, 1))
+        self.assertGreater(stats['bytes_rewritten'], 0)
+        self.assertEqual(built['no_ops'], ['never_seen'])
+        self.assertEqual(set(built['phases']), set(report.PHASES))
+
+
+class ProfileTest(unittest.TestCase):
+    def test_worker_profiles_merge_into_one_file_per_phase(self):
+        phases = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            parts = []
+            for _ in range(2):
+                timer = PhaseTimer(profile=True)
+                with timer('match', phases):
+                    sorted(range(1000))
+                parts += timer.dump(Path(tmp))
+            self.assertEqual(len(parts), 2)
+            merged = merge_profiles(Path(tmp), parts)
+            self.assertEqual([p.name for p in merged], ['match.pstats'])
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ['match.pstats'])
+        self.assertGreater(phases['match'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import runner
+from codemod.engine import CompiledRuleSet, Task
+from codemod.rules import Rule, RuleSet
+
+RULE = Rule('old_to_new', 'Text(t.trends_old)', 'Text(t.trends_new)')
+
+
+def _sizes(batch, scale):
+    return [t.size * scale for t in batch]
+
+
+class DiscoverTest(unittest.TestCase):
+    def test_finds_dart_files_once_and_sorted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'b').mkdir()
+            for name in ('b/z.dart', 'a.dart', 'notes.md'):
+                (root / name).write_text('')
+            found = runner.discover([root, root / 'a.dart', root / 'missing'])
+            self.assertEqual(found, [root / 'a.dart', root / 'b' / 'z.dart'])
+
+
+class PartitionTest(unittest.TestCase):
+    def test_batches_are_balanced_by_size(self):
+        tasks = [Task(Path(f'{n}.dart'), n) for n in (90, 50, 40, 10, 5, 5)]
+        batches = runner.partition(tasks, 2)
+        self.assertEqual(sorted(sum(t.size for t in b) for b in batches), [100, 100])
+        self.assertEqual(sorted(t.size for b in batches for t in b), sorted(t.size for t in tasks))
+
+    def test_no_empty_batches(self):
+        self.assertEqual(len(runner.partition([Task(Path('a.dart'), 1)], 4)), 1)
+
+
+class MapBatchesTest(unittest.TestCase):
+    def test_single_job_runs_one_batch_in_process(self):
+        tasks = [Task(Path(f'{n}.dart'), n) for n in (1, 2, 3)]
+        self.assertEqual(runner.map_batches(_sizes, tasks, 1, 10), [[10, 20, 30]])
+        self.assertEqual(runner.map_batches(_sizes, [], 4, 10), [])
+
+    def test_pool_covers_every_task(self):
+        tasks = [Task(Path(f'{n}.dart'), n) for n in range(1, 9)]
+        batches = runner.map_batches(_sizes, tasks, 3, 1)
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(sorted(s for b in batches for s in b), list(range(1, 9)))
+
+
+class RunTest(unittest.TestCase):
+    def test_results_are_sorted_by_path_whatever_the_jobs(self):
+        compiled = CompiledRuleSet(RuleSet('test', (RULE,)))
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(4):
+                path = Path(tmp) / f'{i}.dart'
+                path.write_bytes(b'Widget a() => Text(t.trends_old);\n' * (i + 1))
+                paths.append(path)
+            tasks = [Task(p, p.stat().st_size) for p in paths]
+            results = runner.run(tasks, compiled, jobs=2, dry_run=True)
+            self.assertEqual([r.path for r in results], [str(p) for p in paths])
+            self.assertEqual([r.matches for r in results], [{'old_to_new': i + 1} for i in range(4)])
+            self.assertTrue(all(b'trends_old' in p.read_bytes() for p in paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
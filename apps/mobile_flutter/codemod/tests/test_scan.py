@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import scan
+from codemod.engine import Task
+from codemod.structure import Pattern
+
+PATTERN = Pattern({
+    'call': 'Container',
+    'args': {'decoration': {'call': 'BoxDecoration', 'args': {'border': {}}}},
+})
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def task(self, name: str, source: bytes) -> Task:
+        path = self.dir / name
+        path.write_bytes(source)
+        return Task(path, len(source))
+
+    def test_candidates_are_ranked_by_confidence(self):
+        tasks = [
+            self.task('a.dart', b'a() => Container(child: x);\n'),
+            self.task('b.dart', b'b() =>\n  Container(decoration: BoxDecoration(border: b));\n'),
+            self.task('c.dart', b'c() => Container(decoration: BoxDecoration(color: c));\n'),
+            self.task('d.dart', b'd() => Text(x);\n'),
+            Task(self.dir / 'missing.dart', 0),
+        ]
+        total = PATTERN.constraints()
+        found, errors = scan.run(tasks, [('outlined', PATTERN)], jobs=1, min_confidence=0.5)
+        self.assertEqual(
+            [(Path(c.path).name, c.line, c.confidence) for c in found],
+            [('b.dart', 2, 1.0), ('c.dart', 1, round((total - 1) / total, 3))],
+        )
+        self.assertEqual(found[0].to_dict()['rule'], 'outlined')
+        self.assertEqual(len(errors), 1)
+        self.assertIn('missing.dart', errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import server
+from codemod.analysis import AnalysisStore
+
+
+class CountingStore(AnalysisStore):
+    def __init__(self):
+        super().__init__(None)
+        self.prunes = 0
+
+    def prune(self, max_bytes: int = 0) -> int:
+        self.prunes += 1
+        return 0
+
+
+class PruneTest(unittest.TestCase):
+    def setUp(self):
+        self.server = server.Server(Path('unused.sock'), no_cache=True, log=io.StringIO())
+        self.server.store = CountingStore()
+
+    def ping(self) -> dict:
+        return self.server.handle(json.dumps({'command': 'ping'}).encode())
+
+    def test_store_is_pruned_once_the_interval_has_passed(self):
+        self.ping()
+        self.assertEqual(self.server.store.prunes, 0)
+        self.server.pruned -= server.PRUNE_INTERVAL
+        self.ping()
+        self.ping()
+        self.assertEqual(self.server.store.prunes, 1)
+
+    def test_ping_reports_the_store(self):
+        reply = self.ping()
+        self.assertTrue(reply['ok'])
+        self.assertEqual(reply['analysis'], {'loaded': 0, 'computed': 0})
+
+
+class RequestTest(unittest.TestCase):
+    def setUp(self):
+        self.server = server.Server(Path('unused.sock'), no_cache=True, log=io.StringIO())
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.path = self.dir / 'a.dart'
+        self.source = b'Widget a() => Container(decoration: BoxDecoration(border: b));\n'
+        self.path.write_bytes(self.source)
+
+    def request(self, **fields) -> dict:
+        return self.server.handle(json.dumps(dict(fields, cwd=str(self.dir))).encode())
+
+    def test_bad_requests_get_an_error_reply(self):
+        for line in (b'{', b'[1]', b'{"command": "explode"}'):
+            with self.subTest(line=line):
+                reply = self.server.handle(line)
+                self.assertFalse(reply['ok'])
+                self.assertIn('ms', reply)
+        self.assertIn("unknown command 'explode'", self.server.handle(b'{"command": "explode"}')['error'])
+        self.assertFalse(self.request(command='dry-run', paths='a.dart')['ok'])
+
+    def test_dry_run_reuses_the_compiled_pack(self):
+        for _ in range(2):
+            reply = self.request(command='dry-run', paths=['a.dart'])
+            self.assertTrue(reply['ok'])
+            self.assertEqual((reply['total'], reply['changed'], reply['journal']), (1, 0, None))
+        self.assertEqual(len(self.server.compiled), 1)
+        self.assertEqual(self.path.read_bytes(), self.source)
+
+    def test_scan_with_an_inline_pattern(self):
+        pattern = json.dumps({'call': 'Container', 'args': {'decoration': {'call': 'BoxDecoration'}}})
+        reply = self.request(command='scan', paths=['a.dart'], pattern=pattern)
+        self.assertTrue(reply['ok'])
+        self.assertEqual([(c['line'], c['confidence']) for c in reply['candidates']], [(1, 1.0)])
+
+    def test_stop(self):
+        self.server.running = True
+        self.assertTrue(self.request(command='stop')['ok'])
+        self.assertFalse(self.server.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import packs
+from codemod.engine import CompiledRuleSet, Task, process_file
+from codemod.rules import Rule, RuleSet
+from codemod.structure import Pattern, StructureIndex
+
+# A structural rule that copies a multi-line argument into its output.
+TO_CARD = Rule(
+    'box_to_card',
+    '',
+    'Card(\n  child: {{child}},\n)',
+    match=json.dumps({'call': 'Box', 'args': {'child': {}}}, sort_keys=True),
+)
+
+
+class IndexTest(unittest.TestCase):
+    def test_calls_and_named_arguments(self):
+        source = b'Widget a() => const Container(\n  padding: p,\n  child: Border.all(width: 1),\n);\n'
+        index = StructureIndex(source)
+        self.assertEqual([c.name for c in index.calls], ['a', 'Container', 'Border.all'])
+        container = index.calls[index.by_name['Container'][0]]
+        self.assertEqual(source[container.start:container.end].split(b'(')[0], b'const Container')
+        self.assertTrue(source[container.start:container.end].endswith(b')'))
+        self.assertEqual([a.name for a in container.args], ['padding', 'child'])
+        child = container.named('child')
+        self.assertEqual(source[child.start:child.end], b'Border.all(width: 1)')
+        self.assertIs(index.calls[child.call], index.call_at(source.index(b'Border')))
+        self.assertEqual(index.call_index(source.index(b'Border')), 2)
+        self.assertEqual(index.call_index(0), -1)
+        self.assertEqual(index.line_of(child.start), 3)
+
+    def test_keywords_strings_and_comments_are_not_calls(self):
+        source = b'if (a) { f("g(") /* h( */; }'
+        index = StructureIndex(source)
+        self.assertEqual([c.name for c in index.calls], ['f'])
+        self.assertEqual(len(index.spans), 3)
+
+    def test_unbalanced_brackets_still_index(self):
+        index = StructureIndex(b') f(x) g(')
+        self.assertEqual([(c.name, c.end) for c in index.calls if c.end >= 0], [('f', 6)])
+
+
+class RenderTest(unittest.TestCase):
+    def setUp(self):
+        self.compiled = CompiledRuleSet(RuleSet('test', (TO_CARD,)))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'a.dart'
+
+    def rewrite(self, source: bytes) -> bytes:
+        self.path.write_bytes(source)
+        result = process_file(Task(self.path, 0), self.compiled)
+        self.assertIsNone(result.error)
+        self.assertTrue(result.changed)
+        return self.path.read_bytes()
+
+    def test_captured_lines_keep_crlf_endings(self):
+        source = b'Widget a() => Box(\n  child: Column(\n    children: [],\n  ),\n);\n'
+        out = self.rewrite(source.replace(b'\n', b'\r\n'))
+        self.assertNotIn(b'\r\r', out)
+        self.assertEqual(out.count(b'\r\n'), out.count(b'\n'))
+        self.assertEqual(out.replace(b'\r\n', b'\n'), self.rewrite(source))
+
+
+class ScoreTest(unittest.TestCase):
+    def setUp(self):
+        rule = packs.load(Path(__file__).parents[1] / 'packs' / 'appcard_outlined_container').rules[0]
+        self.pattern = Pattern(json.loads(rule.match))
+
+    def confidence(self, source: bytes) -> float:
+        index = StructureIndex(source)
+        i = index.by_name['Container'][0]
+        call = index.calls[i]
+        return self.pattern.score(index, source, call.start, call.end, i) / self.pattern.constraints()
+
+    def test_bare_container_is_not_a_near_miss(self):
+        self.assertLess(self.confidence(b'Container(child: x)'), 0.25)
+
+    def test_forbidden_argument_costs_one_point(self):
+        source = (
+            b'Container(padding: p, decoration: BoxDecoration(color: colorScheme.surface, '
+            b'borderRadius: AppRadius.md, border: Border.all(color: colorScheme.outlineVariant)), '
+            b'child: x)'
+        )
+        self.assertEqual(self.confidence(source), 1.0)
+        total = self.pattern.constraints()
+        sized = source.replace(b'child: x', b'width: 3, child: x')
+        self.assertEqual(self.confidence(sized), (total - 1) / total)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+
+from codemod.fileio import splice
+from codemod.tokens import TokenIndex, line_indent, pattern
+
+
+class NormalizationTest(unittest.TestCase):
+    def test_formatting_does_not_change_the_stream(self):
+        compact = b'Text(t.trends_work, style: s)'
+        formatted = b'Text(\n  t.trends_work,\n  style:   s,\n)'
+        self.assertEqual(TokenIndex(compact).symbols, TokenIndex(formatted).symbols)
+
+    def test_crlf_and_lf_give_the_same_stream(self):
+        source = b'Column(\n  children: [\n    a,\n  ],\n)\n'
+        self.assertEqual(
+            TokenIndex(source).symbols, TokenIndex(source.replace(b'\n', b'\r\n')).symbols
+        )
+
+    def test_trailing_comma_is_dropped_only_before_a_closer(self):
+        self.assertEqual(TokenIndex(b'f(a, b,)').symbols, (b'f', b'(', b'a', b',', b'b', b')'))
+        self.assertEqual(TokenIndex(b'[a, b, ]').symbols, (b'[', b'a', b',', b'b', b']'))
+
+    def test_comment_whitespace_is_collapsed(self):
+        self.assertEqual(TokenIndex(b'x /*  a\n   b */ y').symbols, (b'x', b'/* a b */', b'y'))
+
+    def test_strings_and_operators_stay_whole(self):
+        source = b"a ?? b?.c ... 'it''s, ok' \"x(\" r'\\d'"
+        self.assertEqual(
+            TokenIndex(source).symbols,
+            (b'a', b'??', b'b', b'?.', b'c', b'...', b"'it'", b"'s, ok'", b'"x("', b"r'\\d'"),
+        )
+
+    def test_offsets_point_back_into_the_source(self):
+        source = b'Text(\n  t.x,\n)'
+        index = TokenIndex(source)
+        self.assertEqual([source[s:e] for s, e in zip(index.starts, index.ends)], list(index.symbols))
+        self.assertEqual(index.span(0, len(index)), (0, len(source)))
+
+
+class PatternTest(unittest.TestCase):
+    def test_trailing_comma_is_dropped_and_reported(self):
+        self.assertEqual(pattern('Text(t.x),\n'), ((b'Text', b'(', b't', b'.', b'x', b')'), True))
+        self.assertEqual(pattern('Text(t.x)'), ((b'Text', b'(', b't', b'.', b'x', b')'), False))
+
+
+class LineIndentTest(unittest.TestCase):
+    def test_leading_whitespace_of_the_line(self):
+        buf = b'a\n    \tb(c)\n'
+        self.assertEqual(line_indent(buf, buf.index(b'c')), b'    \t')
+        self.assertEqual(line_indent(buf, 0), b'')
+
+
+class PatchedTest(unittest.TestCase):
+    # Replacements that neither open nor close a string or a comment, which
+    # is all a rule's rendered output can do between whole tokens.
+    TEXTS = (b'', b'x', b' Text(t.a) ', b',', b')', b'(', b'child: y,\n', b'[a, b]')
+
+    def test_patched_index_matches_a_full_lex(self):
+        rng = random.Random(3)
+        source = b'Widget a() => Column(children: [Text(t.x), Padding(child: f(y, z,),),],);\n' * 3
+        index = TokenIndex(source)
+        for _ in range(300):
+            picks = sorted(rng.sample(range(len(index.symbols)), rng.randrange(1, 5)))
+            edits = []
+            for k in picks:
+                start = index.starts[k]
+                end = index.ends[k] if rng.random() < 0.7 else start
+                if not edits or start >= edits[-1][1]:
+                    edits.append((start, end, rng.choice(self.TEXTS)))
+            new = splice(source, edits)
+            patched, windows, regions = index.patched(new, edits, 4)
+            full = TokenIndex(new)
+            self.assertEqual(patched.symbols, full.symbols, edits)
+            self.assertEqual(list(patched.starts), list(full.starts))
+            self.assertEqual(list(patched.ends), list(full.ends))
+            self.assertEqual([new[a:b] for a, b in regions], [text for _, _, text in edits])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod.trigrams import TrigramIndex, grams, literals
+
+
+def _words(path: Path):
+    return set(path.read_bytes().rstrip(b';\n').split())
+
+
+class LiteralsTest(unittest.TestCase):
+    def test_longest_identifier_runs(self):
+        words = [b'Container', b'(', b'decoration', b':', b'BoxDecoration', b'x', b'colorScheme.surface']
+        self.assertEqual(literals(words), (b'BoxDecoration', b'colorScheme', b'decoration', b'Container'))
+        self.assertEqual(grams(b'a.abcd ab'), {b'abc', b'bcd'})
+
+
+class TrigramIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.index_path = self.dir / 'trigrams.pickle'
+
+    def write(self, name: str, text: bytes) -> Path:
+        path = self.dir / name
+        path.write_bytes(text)
+        return path
+
+    def names(self, index, rules):
+        return sorted(Path(p).name for p in index.candidates(rules))
+
+    def test_no_file_containing_the_literals_is_missed(self):
+        rng = random.Random(7)
+        vocabulary = [b'Container', b'BoxDecoration', b'Padding', b'colorScheme', b'Text', b'Border']
+        paths = [
+            self.write(f'{n}.dart', b' '.join(rng.sample(vocabulary, 3)) + b';\n') for n in range(40)
+        ]
+        index = TrigramIndex(None)
+        self.assertEqual(index.update(paths), 40)
+        for _ in range(50):
+            wanted = tuple(rng.sample(vocabulary, 2))
+            expected = {
+                str(p) for p in paths if all(w in _words(p) for w in wanted)
+            }
+            self.assertEqual(index.candidates([[wanted]]), expected)
+
+    def test_rules_alternatives_and_the_empty_literal_set(self):
+        self.write('a.dart', b'Container(child: Text(x))')
+        self.write('b.dart', b'Padding(child: Text(x))')
+        index = TrigramIndex(None)
+        index.update(sorted(self.dir.glob('*.dart')))
+        self.assertEqual(self.names(index, [[(b'Container',)]]), ['a.dart'])
+        self.assertEqual(self.names(index, [[(b'Container',), (b'Padding',)]]), ['a.dart', 'b.dart'])
+        self.assertEqual(self.names(index, [[(b'Container', b'Padding')]]), [])
+        self.assertEqual(self.names(index, [[(b'Sized',)], [()]]), ['a.dart', 'b.dart'])
+
+    def test_changes_deletions_and_persistence(self):
+        a = self.write('a.dart', b'Container()')
+        b = self.write('b.dart', b'Padding()')
+        index = TrigramIndex(self.index_path)
+        index.update([a, b])
+        index.save()
+
+        reloaded = TrigramIndex(self.index_path)
+        self.assertEqual(reloaded.update([a, b]), 0)
+        self.assertEqual(reloaded.sha256(str(a)), index.sha256(str(a)))
+        a.write_bytes(b'Padding(child: x)')
+        os.unlink(b)
+        c = self.write('c.dart', b'Container()')
+        self.assertEqual(reloaded.update([a, c]), 2)
+        self.assertEqual(self.names(reloaded, [[(b'Padding',)]]), ['a.dart'])
+        self.assertEqual(self.names(reloaded, [[(b'Container',)]]), ['c.dart'])
+        self.assertTrue(all(reloaded.postings.values()))
+        # The deleted file's slot is handed to the next new one.
+        reloaded.update([a, c, self.write('d.dart', b'Text()')])
+        self.assertEqual(sorted(entry[0] for entry in reloaded.files.values()), [0, 1, 2])
+
+    def test_corrupt_index_starts_over(self):
+        self.index_path.write_bytes(b'not a pickle')
+        index = TrigramIndex(self.index_path)
+        self.assertEqual(index.files, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from codemod import journal
+from codemod.cache import Manifest, content_digest
+from codemod.engine import CompiledRuleSet
+from codemod.rules import Rule, RuleSet
+from codemod.watch import Watcher
+
+RULE = Rule('old_to_new', 'Text(t.trends_old)', 'Text(t.trends_new)')
+
+
+class WatchJournalTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name) / 'lib'
+        self.root.mkdir()
+        self.journals = Path(tmp.name) / 'journal'
+        self.path = self.root / 'a.dart'
+        # Sizes differ from the saves below, so polling sees them on any clock.
+        self.path.write_bytes(b'Widget a() => Text(t.x);\n')
+        self.watcher = Watcher(
+            [self.root], CompiledRuleSet(RuleSet('test', (RULE,))), None,
+            out=io.StringIO(), journal_dir=self.journals,
+        )
+
+    def test_each_batch_of_rewrites_can_be_undone(self):
+        saved = b'Widget a() => Text(t.trends_old);\n'
+        self.path.write_bytes(saved)
+        results = self.watcher.apply(self.watcher.poll())
+        self.assertEqual([r.changed for r in results], [True])
+        self.assertEqual(self.path.read_bytes(), b'Widget a() => Text(t.trends_new);\n')
+        written = journal.journals(self.journals)
+        self.assertEqual(len(written), 1)
+        records = journal.decode(written[0].read_bytes())
+        self.assertEqual(journal.undo(records, jobs=1), [(str(self.path.resolve()), None)])
+        self.assertEqual(self.path.read_bytes(), saved)
+
+    def test_unchanged_batch_writes_no_journal(self):
+        self.path.write_bytes(b'Widget b() => Text(t.trends_new);\n')
+        self.watcher.apply(self.watcher.poll())
+        self.assertEqual(journal.journals(self.journals), [])
+
+
+class PollTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name) / 'lib'
+        (self.root / '.hidden').mkdir(parents=True)
+        self.manifest = Manifest(Path(tmp.name) / 'manifest.json')
+        self.watcher = Watcher(
+            [self.root], CompiledRuleSet(RuleSet('test', (RULE,))), self.manifest, out=io.StringIO(),
+        )
+
+    def test_only_new_and_modified_dart_files_are_reported(self):
+        path = self.root / 'a.dart'
+        path.write_bytes(b'Widget a() => Text(t.trends_old);\n')
+        (self.root / 'notes.md').write_text('x')
+        (self.root / '.hidden' / 'b.dart').write_text('x')
+        changed = self.watcher.poll()
+        self.assertEqual(changed, [str(path.resolve())])
+        self.assertEqual(self.watcher.poll(), [])
+        self.watcher.apply(changed)
+        # The rewrite itself is not picked up by the next poll.
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.manifest.entry(changed[0])['sha256'], content_digest(path.read_bytes()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+"""Normalized Dart token stream with offsets back into the source bytes.
+
+Whitespace is dropped, comment whitespace is collapsed and a trailing comma
+before a closing bracket is removed, so ``dart format`` churn does not change
+the stream. Each token keeps its ``[start, end)`` byte offsets in the
+original buffer so matches can be spliced back into it. The buffer may be
+``bytes`` or an ``mmap``; CR is whitespace, so CRLF and LF files produce the
+same stream. The structure index, the import and localization scanners all
+walk this stream, so a file is lexed once however many of them look at it;
+:func:`kind` tells comments, strings, words and operators apart.
+"""
+
+import bisect
+import re
+from typing import List, Sequence, Tuple
+
+TOKEN_RE = re.compile(
+    rb"""
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>
+          r?'''.*?'''
+        | r?\"\"\".*?\"\"\"
+        | r'[^'\n]*'
+        | r"[^"\n]*"
+        | '(?:[^'\\\n]|\\.)*'
+        | "(?:[^"\\\n]|\\.)*"
+      )
+    | (?P<word>[A-Za-z_$\x80-\xff][\w$\x80-\xff]*|\d[\w.]*)
+    | (?P<op>\.\.\.|\?\?=|>>>=|>>>|<<=|>>=|\?\.|\?\?|=>|==|!=|<=|>=|&&|\|\||\+\+|--|[-+*/%&|^~]=|\.\.|.)
+    """,
+    re.S | re.X,
+)
+
+CLOSERS = frozenset((b')', b']', b'}'))
+COMMENTS = (b'//', b'/*')
+
+
+class TokenIndex:
+    """Tokens of one buffer: ``symbols[i]`` spans ``starts[i]:ends[i]``."""
+
+    __slots__ = ('symbols', 'starts', 'ends')
+
+    def __init__(self, buf):
+        symbols: List[bytes] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        _lex(buf, 0, len(buf), symbols, starts, ends)
+        self.symbols = tuple(symbols)
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def restore(cls, symbols: Tuple[bytes, ...], starts: Sequence[int], ends: Sequence[int]):
+        """An index from its parts; ``starts`` and ``ends`` may be any int sequence."""
+        index = cls.__new__(cls)
+        index.symbols = symbols
+        index.starts = starts
+        index.ends = ends
+        return index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def span(self, first: int, last: int) -> Tuple[int, int]:
+        """Byte offsets covering tokens ``first`` up to but excluding ``last``."""
+        return self.starts[first], self.ends[last - 1]
+
+    def patched(self, buf, edits: List[Tuple[int, int, bytes]], margin: int):
+        """The index of ``buf``, which is this index's buffer with ``edits`` applied.
+
+        Only the tokens around each edit, ``margin`` tokens either side, are
+        lexed again; the others are shifted. Returns the new index, the
+        re-lexed ``(first, last)`` token windows, and the byte ranges the
+        edits produced, all in ``buf`` coordinates.
+        """
+        n = len(self.symbols)
+        old_starts, old_ends = self.starts, self.ends
+        windows = []  # [first, last, old byte start, old byte end, edits]
+        for edit in edits:
+            start, end = edit[0], edit[1]
+            a = max(0, bisect.bisect_right(old_ends, start) - margin)
+            b = min(n, bisect.bisect_left(old_starts, end) + margin)
+            lo = min(start, old_starts[a] if a < n else start)
+            hi = max(end, old_ends[b - 1] if b > a else end)
+            if windows and a <= windows[-1][1]:
+                w = windows[-1]
+                w[1], w[3] = max(w[1], b), max(w[3], hi)
+                w[4].append(edit)
+            else:
+                windows.append([a, b, lo, hi, [edit]])
+
+        symbols: List[bytes] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        spans = []
+        regions = []
+        delta = 0
+        kept = 0
+        for a, b, lo, hi, window_edits in windows:
+            symbols.extend(self.symbols[kept:a])
+            starts.extend(x + delta for x in old_starts[kept:a])
+            ends.extend(x + delta for x in old_ends[kept:a])
+            new_lo = lo + delta
+            for start, end, text in window_edits:
+                at = start + delta
+                regions.append((at, at + len(text)))
+                delta += len(text) - (end - start)
+            first = len(symbols)
+            _lex(buf, new_lo, hi + delta, symbols, starts, ends)
+            # The comma-before-closer rule, across the window's right edge;
+            # _lex already applies it across the left one.
+            if b < n and symbols and symbols[-1] == b',' and self.symbols[b] in CLOSERS:
+                symbols.pop()
+                starts.pop()
+                ends.pop()
+            spans.append((first, len(symbols)))
+            kept = b
+        symbols.extend(self.symbols[kept:])
+        starts.extend(x + delta for x in old_starts[kept:])
+        ends.extend(x + delta for x in old_ends[kept:])
+
+        return TokenIndex.restore(tuple(symbols), starts, ends), spans, regions
+
+
+def _lex(buf, pos: int, endpos: int, symbols: List[bytes], starts: List[int], ends: List[int]) -> None:
+    """Append the normalized tokens of ``buf[pos:endpos]`` to the three lists."""
+    for m in TOKEN_RE.finditer(buf, pos, endpos):
+        kind = m.lastgroup
+        if kind == 'ws':
+            continue
+        symbol = m.group()
+        if kind == 'comment':
+            symbol = b' '.join(symbol.split())
+        elif symbol in CLOSERS and symbols and symbols[-1] == b',':
+            symbols.pop()
+            starts.pop()
+            ends.pop()
+        symbols.append(symbol)
+        starts.append(m.start())
+        ends.append(m.end())
+
+
+def kind(symbol: bytes) -> str:
+    """``'comment'``, ``'string'``, ``'word'`` or ``'op'``: what a symbol of the stream is."""
+    c = symbol[:1]
+    if symbol[:2] in COMMENTS:
+        return 'comment'
+    if c in (b"'", b'"') or c == b'r' and symbol[1:2] in (b"'", b'"'):
+        return 'string'
+    if c.isalnum() or c in (b'_', b'$') or c[0] >= 0x80:
+        return 'word'
+    return 'op'
+
+
+def pattern(text: str) -> Tuple[Tuple[bytes, ...], bool]:
+    """Normalized symbols of a rule template.
+
+    A trailing comma is dropped too, since in the file it may be followed by
+    a closer and therefore be normalized away. The flag reports whether one
+    was dropped, so the replacement can drop its own.
+    """
+    symbols = TokenIndex(text.encode('utf-8')).symbols
+    if symbols and symbols[-1] == b',':
+        return symbols[:-1], True
+    return symbols, False
+
+
+def line_indent(buf, offset: int) -> bytes:
+    """Leading whitespace of the line containing ``offset``."""
+    line_start = buf.rfind(b'\n', 0, offset) + 1
+    line = buf[line_start:offset]
+    return line[:len(line) - len(line.lstrip(b' \t'))]
+
+
+def newline_at(buf, offset: int) -> bytes:
+    """The line ending used by the line containing ``offset``.
+
+    Falls back to the previous line's ending on the last line, and to LF.
+    """
+    end = buf.find(b'\n', offset)
+    if end < 0:
+        end = buf.rfind(b'\n', 0, offset)
+    return b'\r\n' if end > 0 and buf[end - 1:end] == b'\r' else b'\n'
@@ -0,0 +1,165 @@
+"""Persistent trigram index of the Dart tree, to skip files no rule can match.
+
+Every file's identifier-like runs (``[A-Za-z0-9_$]+``) are cut into
+trigrams, and each trigram maps to a bitset of the files containing it. A
+rule contributes literals that any file it matches must contain, such as
+``_buildWeeklyHoursChart`` or ``BoxDecoration``; a file is a candidate for
+the rule only if it has every trigram of every literal. Whitespace and
+trailing commas never split an identifier, so this agrees with the
+token-level matching of :mod:`codemod.engine`, and a lookup costs the same
+however many files the tree has.
+
+The index lives in ``.dart_tool/codemod/trigrams.pickle``. Files are
+re-read only when their size or mtime changed, and re-indexed only when
+their content hash did too.
+"""
+
+import os
+import pickle
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from codemod import fileio
+from codemod.cache import content_digest
+
+INDEX_VERSION = 1
+WORD_RE = re.compile(rb'[\w$]+')
+# Literals per alternative; the longest ones rule out the most files.
+MAX_LITERALS = 4
+
+Literals = Tuple[bytes, ...]
+
+
+def grams(data) -> Set[bytes]:
+    """Trigrams of the identifier runs of ``data``."""
+    out = set()
+    for word in set(WORD_RE.findall(data)):
+        for i in range(len(word) - 2):
+            out.add(word[i:i + 3])
+    return out
+
+
+def literals(words: Iterable[bytes]) -> Literals:
+    """The longest identifier runs of ``words``, which a matching file must contain."""
+    runs = set()
+    for word in words:
+        runs.update(w for w in WORD_RE.findall(word) if len(w) >= 3)
+    return tuple(sorted(runs, key=lambda w: (-len(w), w))[:MAX_LITERALS])
+
+
+class TrigramIndex:
+    """Trigram postings over a set of files, kept up to date by stat and hash."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        # path -> [slot, size, mtime_ns, sha256, sorted trigrams joined]
+        self.files: Dict[str, list] = {}
+        self.postings: Dict[bytes, int] = {}
+        self.free: List[int] = []
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            if data['version'] == INDEX_VERSION:
+                self.files, self.postings, self.free = data['files'], data['postings'], data['free']
+        except Exception:
+            # Missing, truncated or from another version: start over.
+            pass
+
+    def update(self, paths: Iterable[Path]) -> int:
+        """Index new and changed ``paths`` and drop deleted files; returns files re-read."""
+        read = 0
+        for path in paths:
+            key = str(path)
+            st = os.stat(key)
+            entry = self.files.get(key)
+            if entry is not None and entry[1] == st.st_size and entry[2] == st.st_mtime_ns:
+                continue
+            with fileio.open_buffer(path) as buf:
+                sha = content_digest(buf)
+                found = grams(buf) if entry is None or entry[3] != sha else None
+            read += 1
+            if found is None:
+                entry[1], entry[2] = st.st_size, st.st_mtime_ns
+            else:
+                slot = self._remove(key) if entry is not None else self._slot()
+                bit = 1 << slot
+                postings = self.postings
+                for gram in found:
+                    postings[gram] = postings.get(gram, 0) | bit
+                self.files[key] = [slot, st.st_size, st.st_mtime_ns, sha, b''.join(sorted(found))]
+            self.dirty = True
+        for key in [k for k in self.files if not os.path.exists(k)]:
+            self.free.append(self._remove(key))
+            del self.files[key]
+            self.dirty = True
+        return read
+
+    def _slot(self) -> int:
+        if self.free:
+            return self.free.pop()
+        return len(self.files)
+
+    def _remove(self, key: str) -> int:
+        """Clear a file's bits from the postings; returns its slot."""
+        slot, *_, packed = self.files[key]
+        mask = ~(1 << slot)
+        postings = self.postings
+        for i in range(0, len(packed), 3):
+            gram = packed[i:i + 3]
+            bits = postings[gram] & mask
+            if bits:
+                postings[gram] = bits
+            else:
+                del postings[gram]
+        return slot
+
+    def sha256(self, key: str) -> Optional[str]:
+        entry = self.files.get(key)
+        return entry[3] if entry is not None else None
+
+    def candidates(self, rules: Sequence[Sequence[Literals]]) -> Set[str]:
+        """Indexed files that some rule may match.
+
+        ``rules`` holds, per rule, alternatives of literals; a file is a
+        candidate when it contains all literals of some alternative. An
+        alternative without literals makes every file a candidate.
+        """
+        everything = 0
+        for entry in self.files.values():
+            everything |= 1 << entry[0]
+        wanted = 0
+        for alternatives in rules:
+            for words in alternatives:
+                bits = everything
+                for word in words:
+                    for i in range(len(word) - 2):
+                        bits &= self.postings.get(word[i:i + 3], 0)
+                        if not bits:
+                            break
+                wanted |= bits
+                if wanted == everything:
+                    return set(self.files)
+        return {key for key, entry in self.files.items() if wanted >> entry[0] & 1}
+
+    def save(self) -> None:
+        if self.path is None or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.trigrams-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(
+                    {'version': INDEX_VERSION, 'files': self.files,
+                     'postings': self.postings, 'free': self.free},
+                    f, protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
@@ -0,0 +1,133 @@
+"""Watch mode: re-apply the rules to Dart files as they are saved.
+
+Polls the watched trees for stat changes, waits for a quiet period so an
+editor's burst of saves is handled once, then processes just the changed
+files in this process. The compiled pack and the manifest stay warm
+between changes, so a save costs what lexing and matching the file costs.
+Rewritten files are re-indexed in the localization key index as well.
+
+Each batch of rewrites gets its own undo journal, like a one-off run. Stop
+the watcher before undoing, or it rewrites the restored files again.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from codemod import journal
+from codemod.analysis import AnalysisStore
+from codemod.cache import Manifest
+from codemod.engine import CompiledRuleSet, FileResult, Task, process_file
+from codemod.l10n import L10nIndex
+
+
+def _stat_tree(roots: Iterable[Path]) -> Dict[str, Tuple[int, int]]:
+    stats = {}
+    for root in roots:
+        if root.is_file():
+            st = root.stat()
+            stats[str(root.resolve())] = (st.st_mtime_ns, st.st_size)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if name.endswith('.dart'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    stats[os.path.realpath(path)] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+class Watcher:
+    def __init__(
+        self,
+        roots: List[Path],
+        compiled: CompiledRuleSet,
+        manifest: Optional[Manifest],
+        interval: float = 0.1,
+        debounce: float = 0.1,
+        out=sys.stdout,
+        l10n_index: Optional[L10nIndex] = None,
+        store: Optional[AnalysisStore] = None,
+        journal_dir: Optional[Path] = None,
+    ):
+        self.roots = [Path(r) for r in roots]
+        self.compiled = compiled
+        self.manifest = manifest
+        self.interval = interval
+        self.debounce = debounce
+        self.out = out
+        self.l10n_index = l10n_index
+        self.store = store
+        self.journal_dir = journal_dir
+        self.seen = _stat_tree(self.roots)
+
+    def poll(self) -> List[str]:
+        """Paths created or modified since the last poll."""
+        current = _stat_tree(self.roots)
+        changed = [p for p, st in current.items() if self.seen.get(p) != st]
+        self.seen = current
+        return changed
+
+    def apply(self, paths: Iterable[str]) -> List[FileResult]:
+        results = []
+        for path in sorted(paths):
+            entry = self.manifest.entry(path) if self.manifest is not None else None
+            size = self.seen.get(path, (0, 0))[1]
+            if entry is None:
+                task = Task(Path(path), size)
+            else:
+                task = Task(Path(path), size, entry['sha256'], frozenset(entry['rules']))
+            started = time.perf_counter()
+            result = process_file(task, self.compiled, store=self.store)
+            elapsed = (time.perf_counter() - started) * 1000
+            results.append(result)
+            if result.error:
+                print(f'error: {path}: {result.error}', file=sys.stderr)
+                continue
+            for conflict in result.conflicts:
+                print(f'conflict: {path}: {conflict}', file=sys.stderr)
+            if self.manifest is not None:
+                self.manifest.record(path, result.size, result.mtime_ns, result.sha256, result.rules)
+            # Our own write is not a change to react to.
+            self.seen[path] = (result.mtime_ns, result.size)
+            if result.changed:
+                rules = ', '.join(f'{k} x{v}' for k, v in sorted(result.matches.items()))
+                print(f'rewrote {path} ({rules}) in {elapsed:.1f} ms', file=self.out, flush=True)
+        records = [
+            journal.Record(r.path, r.original_sha256, r.sha256, r.reverse)
+            for r in results if r.changed
+        ]
+        if records and self.journal_dir is not None:
+            written = journal.write(self.journal_dir, records)
+            print(f'journal: {written.name}, "modify_trends.py undo" restores these files',
+                  file=self.out, flush=True)
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.l10n_index is not None:
+            self.l10n_index.refresh(r.path for r in results if r.changed)
+            self.l10n_index.save()
+        return results
+
+    def run(self) -> None:
+        print(
+            f'watching {len(self.seen)} Dart files for {self.compiled.ruleset.name} (Ctrl-C to stop)',
+            file=self.out, flush=True,
+        )
+        pending = set()
+        last_change = 0.0
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                pending.update(changed)
+                last_change = now
+            elif pending and now - last_change >= self.debounce:
+                self.apply(pending)
+                pending.clear()
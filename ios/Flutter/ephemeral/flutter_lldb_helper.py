@@ -2,31 +2,386 @@
 # Generated file, do not edit.
 #
 
+import collections
+import json
+import os
+import threading
+import time
+
 import lldb
 
+MARKER = b'IHELPED!'
+
+
+def _setting(name, default):
+    """Integer tuning knob, overridable through the environment of lldb."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value, 0)
+    except ValueError:
+        print(f'Ignoring {name}={value!r}, not an integer')
+        return default
+
+
+# Largest single WriteMemory transfer. A page range is written in chunks of
+# at most this size, so no buffer is ever as large as the range itself.
+CHUNK_SIZE = _setting('FLUTTER_LLDB_CHUNK_SIZE', 1 << 20)
+# Bytes of zero-filled buffers kept between hits for reuse.
+POOL_BUDGET = _setting('FLUTTER_LLDB_POOL_BUDGET', 4 << 20)
+# When set, write only the first bytes of every page instead of zero-filling
+# the whole range. The first page still starts with MARKER.
+TOUCH_MODE = bool(_setting('FLUTTER_LLDB_TOUCH', 0))
+# Page granularity of touch mode; 16 KiB on arm64 iOS.
+TOUCH_PAGE = _setting('FLUTTER_LLDB_TOUCH_PAGE', 16 << 10)
+
+
+# The engine's hook, matched against the symbols of MODULES only: evaluating
+# a regex against every symbol of every image is what makes attaching and
+# each image load slow. FLUTTER_LLDB_MODULES takes a comma separated list of
+# module names; set it empty to search every module.
+RX_PAGES_SYMBOL = 'NOTIFY_DEBUGGER_ABOUT_RX_PAGES'
+RX_PAGES_REGEX = f'^{RX_PAGES_SYMBOL}$'
+# Never matches, so a breakpoint on it searches like ours without a location.
+PROBE_REGEX = f'^{RX_PAGES_SYMBOL}_probe$'
+MODULES = tuple(
+    m.strip() for m in os.environ.get('FLUTTER_LLDB_MODULES', 'Flutter').split(',') if m.strip()
+)
+# Carried over with the breakpoints from the dummy target, so they can be
+# found again in the real one.
+BREAKPOINT_NAME = 'flutter-rx-pages'
+
+
+class BufferPool:
+    """Immutable zero-filled buffers by size, optionally starting with MARKER.
+
+    Buffers are reused across hits, least recently used ones are dropped to
+    stay within ``budget`` bytes, and a buffer larger than the budget is
+    made for one write only.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.buffers = {}
+
+    def get(self, size, marked=False):
+        key = (size, marked)
+        buf = self.buffers.pop(key, None)
+        if buf is None:
+            buf = MARKER + bytes(size - len(MARKER)) if marked else bytes(size)
+            if size > self.budget:
+                return buf
+            self.used += size
+            while self.used > self.budget:
+                old = next(iter(self.buffers))
+                del self.buffers[old]
+                self.used -= old[0]
+        # Re-inserted last, so iteration order is least recently used first.
+        self.buffers[key] = buf
+        return buf
+
+    def clear(self):
+        self.buffers.clear()
+        self.used = 0
+
+
+_pool = BufferPool(POOL_BUDGET)
+
+
+def plan_writes(base, page_len, touch=None, chunk_size=None, page_size=None):
+    """(address, size, marked) of the writes that hand the range over.
+
+    The write at ``base`` is marked: it starts with MARKER, which
+    NOTIFY_DEBUGGER_ABOUT_RX_PAGES checks to see that this handler ran.
+    Like the handler always did, a range shorter than MARKER still gets
+    all of it.
+    """
+    if page_len <= len(MARKER):
+        yield base, len(MARKER), True
+        return
+    touch = TOUCH_MODE if touch is None else touch
+    chunk_size = max(len(MARKER), CHUNK_SIZE if chunk_size is None else chunk_size)
+    page_size = TOUCH_PAGE if page_size is None else page_size
+    if touch:
+        yield base, len(MARKER), True
+        for offset in range(page_size, page_len, page_size):
+            yield base + offset, 1, False
+        return
+    for offset in range(0, page_len, chunk_size):
+        yield base + offset, min(chunk_size, page_len - offset), offset == 0
+
+
+def write_pages(process, base, page_len, pool=None, **options):
+    """Write the range through ``process``.
+
+    Returns the bytes written, the WriteMemory calls made and the error that
+    stopped them, or None.
+    """
+    pool = _pool if pool is None else pool
+    written = 0
+    writes = 0
+    error = lldb.SBError()
+    for address, size, marked in plan_writes(base, page_len, **options):
+        process.WriteMemory(address, pool.get(size, marked), error)
+        writes += 1
+        if not error.Success():
+            return written, writes, error
+        written += size
+    return written, writes, None
+
+
+class Stats:
+    """What the breakpoint handler did since loading or the last reset.
+
+    Recording a hit is a few integer updates and a deque append; the
+    percentiles are only worked out when the stats are shown.
+    """
+
+    # Latest handler latencies kept for the percentiles.
+    SAMPLES = 4096
+
+    def __init__(self):
+        # How the breakpoint was set up; kept across resets.
+        self.breakpoint = None
+        self.modules = MODULES  # () once it searches every module
+        self.setup_seconds = 0.0
+        # What resolving it against the loaded modules costs, once measured.
+        self.resolve_seconds = None
+        self.resolve_modules = (0, 0)  # searched, loaded
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.writes = 0
+        self.seconds = 0.0
+        # page_len.bit_length() -> hits: bucket k holds lengths below 2**k.
+        self.page_lens = collections.Counter()
+        self.latencies = collections.deque(maxlen=self.SAMPLES)
+        self.since = time.time()
+
+    def record(self, page_len, written, writes, seconds, failed):
+        self.hits += 1
+        self.failures += failed
+        self.bytes_written += written
+        self.writes += writes
+        self.seconds += seconds
+        self.page_lens[page_len.bit_length()] += 1
+        self.latencies.append(seconds)
+
+    def percentile(self, q):
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'failures': self.failures,
+            'bytes_written': self.bytes_written,
+            'writes': self.writes,
+            'seconds': self.seconds,
+            'page_len_histogram': {
+                f'<{_size(1 << bits)}' if bits else '0': count
+                for bits, count in sorted(self.page_lens.items())
+            },
+            'latency_ms': {
+                name: self.percentile(q) * 1000
+                for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+            },
+            'since': self.since,
+            'breakpoint': self.breakpoint,
+            'setup_ms': self.setup_seconds * 1000,
+            'resolve_ms': None if self.resolve_seconds is None else self.resolve_seconds * 1000,
+            'resolve_modules': {
+                'searched': self.resolve_modules[0], 'loaded': self.resolve_modules[1],
+            },
+        }
+
+    def format(self):
+        data = self.to_dict()
+        lines = [
+            f'NOTIFY_DEBUGGER_ABOUT_RX_PAGES: {self.hits} hits, {self.failures} failed, '
+            f'{_size(self.bytes_written)} in {self.writes} writes, '
+            f'{self.seconds * 1000:.1f} ms in the handler '
+            f'over {time.time() - self.since:.0f} s',
+            f'  breakpoint {self.breakpoint}, set up in {self.setup_seconds * 1000:.2f} ms',
+        ]
+        if self.resolve_seconds is None:
+            lines.append('  not resolved yet: the hook has not loaded')
+        else:
+            lines.append(
+                f'  resolves in {self.resolve_seconds * 1000:.2f} ms, searching '
+                f'{self.resolve_modules[0]} of {self.resolve_modules[1]} loaded modules'
+            )
+        if self.hits:
+            lines.append('  latency: ' + ', '.join(
+                f'{name} {ms:.3f} ms' for name, ms in data['latency_ms'].items()
+            ))
+            lines.append('  page_len:')
+            lines.extend(
+                f'    {bucket:>10} {count}' for bucket, count in data['page_len_histogram'].items()
+            )
+        return '\n'.join(lines)
+
+
+def _size(n):
+    for unit in ('B', 'KiB', 'MiB'):
+        if n < 1024:
+            return f'{round(n, 1):g} {unit}'
+        n /= 1024
+    return f'{round(n, 1):g} GiB'
+
+
+stats = Stats()
+
+
 def handle_new_rx_page(frame: lldb.SBFrame, bp_loc, extra_args, intern_dict):
     """Intercept NOTIFY_DEBUGGER_ABOUT_RX_PAGES and touch the pages."""
+    started = time.perf_counter()
     base = frame.register["x0"].GetValueAsAddress()
     page_len = frame.register["x1"].GetValueAsUnsigned()
 
     # Note: NOTIFY_DEBUGGER_ABOUT_RX_PAGES will check contents of the
     # first page to see if handled it correctly. This makes diagnosing
     # misconfiguration (e.g. missing breakpoint) easier.
-    data = bytearray(page_len)
-    data[0:8] = b'IHELPED!'
-
-    error = lldb.SBError()
-    frame.GetThread().GetProcess().WriteMemory(base, data, error)
-    if not error.Success():
+    written, writes, error = write_pages(frame.GetThread().GetProcess(), base, page_len)
+    stats.record(page_len, written, writes, time.perf_counter() - started, error is not None)
+    if error is not None:
         print(f'Failed to write into {base}[+{page_len}]', error)
         return
 
-def __lldb_init_module(debugger: lldb.SBDebugger, _):
-    target = debugger.GetDummyTarget()
-    # Caveat: must use BreakpointCreateByRegEx here and not
-    # BreakpointCreateByName. For some reasons callback function does not
-    # get carried over from dummy target for the later.
-    bp = target.BreakpointCreateByRegex("^NOTIFY_DEBUGGER_ABOUT_RX_PAGES$")
+
+def rx_stats_command(debugger, command, result, internal_dict):
+    """flutter-rx-stats [reset|json]: what the RX page breakpoint has cost so far."""
+    args = command.split()
+    if args == ['reset']:
+        stats.reset()
+        result.AppendMessage('RX page stats reset')
+    elif args == ['json']:
+        result.AppendMessage(json.dumps(stats.to_dict(), indent=2))
+    elif not args:
+        result.AppendMessage(stats.format())
+    else:
+        result.SetError('usage: flutter-rx-stats [reset|json]')
+
+
+def create_breakpoint(target, modules=None, regex=RX_PAGES_REGEX):
+    """The RX page breakpoint on ``target``, and where it looks for the hook.
+
+    Caveat: must use BreakpointCreateByRegEx here and not
+    BreakpointCreateByName. For some reasons callback function does not
+    get carried over from dummy target for the later. The regex is limited
+    to ``modules`` instead; without them, or with an lldb whose bindings
+    lack the module list overload, it searches every module as before.
+    Modules that never load are caught later, by check_breakpoint.
+    """
+    modules = MODULES if modules is None else modules
+    if modules:
+        module_list = lldb.SBFileSpecList()
+        for name in modules:
+            module_list.Append(lldb.SBFileSpec(name, False))
+        try:
+            bp = target.BreakpointCreateByRegex(regex, module_list, lldb.SBFileSpecList())
+        except (AttributeError, NotImplementedError, TypeError):
+            bp = None
+        if bp is not None and bp.IsValid():
+            return bp, 'in ' + ', '.join(modules)
+    return target.BreakpointCreateByRegex(regex), 'in all modules'
+
+
+def arm(bp):
     bp.SetScriptCallbackFunction('{}.handle_new_rx_page'.format(__name__))
     bp.SetAutoContinue(True)
-    print("-- LLDB integration loaded --")
+    bp.AddName(BREAKPOINT_NAME)
+
+
+def time_resolution(target):
+    """Time resolving our breakpoint against the modules loaded in ``target``.
+
+    lldb resolves breakpoints inside the module load, before any event
+    reaches us, so the same search is repeated on a probe: the regex
+    breakpoint limited as ours is, for a name that never matches, deleted
+    right after. Recorded in the stats with how many modules it searched.
+    """
+    started = time.perf_counter()
+    probe, _ = create_breakpoint(target, stats.modules, PROBE_REGEX)
+    stats.resolve_seconds = time.perf_counter() - started
+    target.BreakpointDelete(probe.GetID())
+    names = [
+        target.GetModuleAtIndex(i).GetFileSpec().GetFilename()
+        for i in range(target.GetNumModules())
+    ]
+    searched = sum(n in stats.modules for n in names) if stats.modules else len(names)
+    stats.resolve_modules = (searched, len(names))
+
+
+def check_breakpoint(target):
+    """Fall back to every module when the hook loaded outside MODULES.
+
+    A breakpoint limited to modules is valid even if none of them ever
+    loads, as with a misnamed or statically linked engine, so
+    create_breakpoint cannot tell. Once the hook's symbol is loaded in
+    ``target``, our breakpoints having no location means it is elsewhere:
+    the plain regex is added and a warning printed. Either way, the first
+    time the breakpoint resolves its cost is measured by time_resolution.
+    Returns True when nothing is left to check in ``target``.
+    """
+    ours = lldb.SBBreakpointList(target)
+    target.FindBreakpointsByName(BREAKPOINT_NAME, ours)
+    if not ours.GetSize():
+        return True
+    if any(ours.GetBreakpointAtIndex(i).GetNumLocations() for i in range(ours.GetSize())):
+        if stats.resolve_seconds is None:
+            time_resolution(target)
+        return True
+    if not target.FindSymbols(RX_PAGES_SYMBOL).GetSize():
+        return False
+    arm(target.BreakpointCreateByRegex(RX_PAGES_REGEX))
+    stats.breakpoint = f'in all modules, {RX_PAGES_SYMBOL} is not in {", ".join(MODULES)}'
+    stats.modules = ()
+    time_resolution(target)
+    print(f'warning: {RX_PAGES_SYMBOL} is not in {", ".join(MODULES)}, '
+          f'breaking on it in every module instead; check FLUTTER_LLDB_MODULES')
+    return True
+
+
+def watch_module_loads(debugger):
+    """Run check_breakpoint on every target as images load, on a daemon thread."""
+    listener = lldb.SBListener('flutter-rx-pages')
+    listener.StartListeningForEventClass(
+        debugger, lldb.SBTarget.GetBroadcasterClassName(), lldb.SBTarget.eBroadcastBitModulesLoaded)
+
+    def run():
+        event = lldb.SBEvent()
+        while True:
+            if not listener.WaitForEvent(60, event):
+                continue
+            target = lldb.SBTarget.GetTargetFromEvent(event)
+            if target.IsValid():
+                check_breakpoint(target)
+
+    thread = threading.Thread(target=run, name='flutter-rx-pages', daemon=True)
+    thread.start()
+    return thread
+
+
+def __lldb_init_module(debugger: lldb.SBDebugger, _):
+    started = time.perf_counter()
+    target = debugger.GetDummyTarget()
+    bp, where = create_breakpoint(target)
+    arm(bp)
+    stats.breakpoint = where
+    stats.modules = () if where == 'in all modules' else MODULES
+    # Also there to time resolving the breakpoint, which setup_seconds on
+    # the empty dummy target cannot show.
+    watch_module_loads(debugger)
+    stats.setup_seconds = time.perf_counter() - started
+    debugger.HandleCommand(
+        'command script add -f {}.rx_stats_command flutter-rx-stats'.format(__name__))
+    print(f"-- LLDB integration loaded (breakpoint {where}, "
+          f"{stats.setup_seconds * 1000:.2f} ms) --")
@@ -0,0 +1,576 @@
+"""Check and benchmark flutter_lldb_helper without a debugger or a device.
+
+    python3 flutter_lldb_helper_bench.py                  # check, then every stream and mode
+    python3 flutter_lldb_helper_bench.py --stream mixed --hits 2000
+    python3 flutter_lldb_helper_bench.py --check-only
+
+A stand-in ``lldb`` module is installed before the helper is imported:
+frames carry ``x0``/``x1`` registers, ``SBProcess.WriteMemory`` copies into
+a local buffer standing for the target's memory, and ``SBError`` can be made
+to fail. Synthetic NOTIFY_DEBUGGER_ABOUT_RX_PAGES streams are replayed
+through ``handle_new_rx_page`` in three modes: ``baseline`` (the handler as
+it was, one buffer as large as the range per hit), ``pooled`` (the default)
+and ``touch``. Throughput is wall time over the whole stream; peak memory is
+the largest Python allocation above the target buffer, from tracemalloc.
+The stand-in WriteMemory is a local copy, so the numbers are the handler's
+own cost; on a device each write is also a round trip and every byte a
+transfer, which the ``writes`` and MiB columns stand for.
+
+The check pass replays every stream with the target memory poisoned before
+each hit and verifies the contract: the range starts with ``IHELPED!``,
+the rest of it is zero (full writes) or every page starts with a zero
+(touch), nothing outside it is written, a failed write is reported, and
+``__lldb_init_module`` sets up the breakpoint, limited to the Flutter
+module or falling back to the plain regex, and the stats command. The
+plain regex is also added when the hook loads outside the Flutter module,
+and resolving the breakpoint is timed once the hook has loaded.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+BASE = 0x1_0000_0000
+POISON = 0xAA
+CANARY = 64
+MARKER = b'IHELPED!'
+
+
+# -- stand-in lldb ----------------------------------------------------------
+
+class SBError:
+    def __init__(self):
+        self.message = None
+
+    def Success(self):
+        return self.message is None
+
+    def Fail(self):
+        return self.message is not None
+
+    def SetErrorString(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message or 'success'
+
+
+class SBValue:
+    def __init__(self, value):
+        self.value = value
+
+    def GetValueAsAddress(self):
+        return self.value
+
+    def GetValueAsUnsigned(self):
+        return self.value
+
+
+class SBProcess:
+    """Target memory: one buffer at BASE, reused for every hit."""
+
+    def __init__(self, capacity):
+        self.memory = bytearray(capacity)
+        self.writes = 0
+        self.fail_at = None  # write number that fails, for the error path
+
+    def WriteMemory(self, address, buf, error):
+        self.writes += 1
+        if self.fail_at is not None and self.writes == self.fail_at:
+            error.SetErrorString('memory write failed')
+            return 0
+        offset = address - BASE
+        if offset < 0 or offset + len(buf) > len(self.memory):
+            error.SetErrorString(f'write outside the mapped range at {address:#x}')
+            return 0
+        self.memory[offset:offset + len(buf)] = buf
+        return len(buf)
+
+
+class SBThread:
+    def __init__(self, process):
+        self.process = process
+
+    def GetProcess(self):
+        return self.process
+
+
+class SBFrame:
+    def __init__(self, process, base, page_len):
+        self.register = {'x0': SBValue(base), 'x1': SBValue(page_len)}
+        self.thread = SBThread(process)
+
+    def GetThread(self):
+        return self.thread
+
+
+class SBFileSpec:
+    def __init__(self, path, resolve=False):
+        self.path = path
+
+    def GetFilename(self):
+        return os.path.basename(self.path)
+
+
+class SBModule:
+    def __init__(self, path):
+        self.spec = SBFileSpec(path)
+
+    def GetFileSpec(self):
+        return self.spec
+
+
+class SBFileSpecList:
+    def __init__(self):
+        self.specs = []
+
+    def Append(self, spec):
+        self.specs.append(spec)
+
+    def GetSize(self):
+        return len(self.specs)
+
+
+class SBBreakpoint:
+    made = 0
+
+    def __init__(self, kind, spec, modules=()):
+        SBBreakpoint.made += 1
+        self.id = SBBreakpoint.made
+        self.kind = kind
+        self.spec = spec
+        self.modules = modules
+        self.callback = None
+        self.auto_continue = False
+        self.names = []
+        # Set by a check to stand for where the breakpoint resolved.
+        self.locations = 0
+
+    def IsValid(self):
+        return True
+
+    def GetID(self):
+        return self.id
+
+    def GetNumLocations(self):
+        return self.locations
+
+    def AddName(self, name):
+        self.names.append(name)
+
+    def SetScriptCallbackFunction(self, name):
+        self.callback = name
+
+    def SetAutoContinue(self, value):
+        self.auto_continue = value
+
+
+class SBBreakpointList:
+    def __init__(self, target):
+        self.breakpoints = []
+
+    def GetSize(self):
+        return len(self.breakpoints)
+
+    def GetBreakpointAtIndex(self, i):
+        return self.breakpoints[i]
+
+
+class SBSymbolContextList(list):
+    def GetSize(self):
+        return len(self)
+
+
+class SBTarget:
+    eBroadcastBitModulesLoaded = 1 << 1
+
+    def __init__(self, module_lists=True, symbols=(), modules=()):
+        self.breakpoints = []
+        # Every breakpoint ever created, deleted ones included.
+        self.created = []
+        # False stands for bindings without the module list overload.
+        self.module_lists = module_lists
+        # Names of the symbols in the loaded images, and the images.
+        self.symbols = set(symbols)
+        self.modules = [SBModule(path) for path in modules]
+
+    @staticmethod
+    def GetBroadcasterClassName():
+        return 'lldb.target'
+
+    @staticmethod
+    def GetTargetFromEvent(event):
+        return event.target
+
+    def IsValid(self):
+        return True
+
+    def FindBreakpointsByName(self, name, found):
+        found.breakpoints = [bp for bp in self.breakpoints if name in bp.names]
+        return True
+
+    def FindSymbols(self, name):
+        return SBSymbolContextList([name] if name in self.symbols else [])
+
+    def GetNumModules(self):
+        return len(self.modules)
+
+    def GetModuleAtIndex(self, i):
+        return self.modules[i]
+
+    def BreakpointDelete(self, bp_id):
+        found = [bp for bp in self.breakpoints if bp.id == bp_id]
+        for bp in found:
+            self.breakpoints.remove(bp)
+        return bool(found)
+
+    def BreakpointCreateByRegex(self, regex, module_list=None, comp_unit_list=None):
+        if module_list is not None and not self.module_lists:
+            raise TypeError('BreakpointCreateByRegex() takes 2 arguments')
+        modules = tuple(s.path for s in module_list.specs) if module_list is not None else ()
+        bp = SBBreakpoint('regex', regex, modules)
+        self.breakpoints.append(bp)
+        self.created.append(bp)
+        return bp
+
+    def BreakpointCreateByName(self, name, *args):
+        bp = SBBreakpoint('name', (name,) + args)
+        self.breakpoints.append(bp)
+        self.created.append(bp)
+        return bp
+
+
+class SBEvent:
+    def __init__(self, target=None):
+        self.target = target
+
+
+class SBListener:
+    # Every listener made, for checks to post events to.
+    made = []
+
+    def __init__(self, name=''):
+        self.name = name
+        self.events = queue.Queue()
+        self.classes = []
+        SBListener.made.append(self)
+
+    def StartListeningForEventClass(self, debugger, broadcaster_class, mask):
+        self.classes.append((broadcaster_class, mask))
+        return mask
+
+    def WaitForEvent(self, seconds, event):
+        try:
+            event.target = self.events.get(timeout=seconds).target
+        except queue.Empty:
+            return False
+        return True
+
+
+class SBDebugger:
+    def __init__(self):
+        self.dummy = SBTarget()
+        self.commands = []
+
+    def GetDummyTarget(self):
+        return self.dummy
+
+    def HandleCommand(self, command):
+        self.commands.append(command)
+
+
+class SBCommandReturnObject:
+    def __init__(self):
+        self.output = []
+        self.error = None
+
+    def AppendMessage(self, message):
+        self.output.append(message)
+
+    def SetError(self, message):
+        self.error = message
+
+
+def install_fake_lldb():
+    module = types.ModuleType('lldb')
+    for cls in (SBError, SBValue, SBProcess, SBThread, SBFrame, SBFileSpec, SBModule,
+                SBFileSpecList, SBBreakpoint, SBBreakpointList, SBSymbolContextList,
+                SBTarget, SBEvent, SBListener, SBDebugger, SBCommandReturnObject):
+        setattr(module, cls.__name__, cls)
+    sys.modules['lldb'] = module
+    return module
+
+
+install_fake_lldb()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import flutter_lldb_helper as helper  # noqa: E402
+
+
+# -- streams and modes ------------------------------------------------------
+
+def stream(name, hits, rng):
+    """page_len of each hit of a synthetic notification stream."""
+    page = 16 << 10
+    if name == 'small':
+        return [page * rng.randint(1, 4) for _ in range(hits)]
+    if name == 'mixed':
+        # Log-uniform from one page to 8 MiB, as when code grows in bursts.
+        return [page * round(2 ** rng.uniform(0, 9)) for _ in range(hits)]
+    if name == 'large':
+        return [(16 << 20) + page * rng.randint(0, 1024) for _ in range(max(1, hits // 20))]
+    raise ValueError(f'unknown stream {name!r}')
+
+
+STREAMS = ('small', 'mixed', 'large')
+MODES = ('baseline', 'pooled', 'touch')
+
+
+def baseline_handler(frame, bp_loc, extra_args, intern_dict):
+    """handle_new_rx_page before pooled writes, for comparison.
+
+    Records into the helper's stats like the helper does, so both count
+    the bytes actually written.
+    """
+    started = time.perf_counter()
+    base = frame.register["x0"].GetValueAsAddress()
+    page_len = frame.register["x1"].GetValueAsUnsigned()
+    data = bytearray(page_len)
+    data[0:8] = b'IHELPED!'
+    error = helper.lldb.SBError()
+    written = frame.GetThread().GetProcess().WriteMemory(base, data, error)
+    helper.stats.record(page_len, written, 1, time.perf_counter() - started, not error.Success())
+    if not error.Success():
+        print(f'Failed to write into {base}[+{page_len}]', error)
+
+
+@contextlib.contextmanager
+def mode(name):
+    """The handler for ``name``, with the helper's settings and state reset."""
+    touch = helper.TOUCH_MODE
+    helper.TOUCH_MODE = name == 'touch'
+    helper._pool.clear()
+    helper.stats.reset()
+    try:
+        yield baseline_handler if name == 'baseline' else helper.handle_new_rx_page
+    finally:
+        helper.TOUCH_MODE = touch
+
+
+def bench(stream_name, mode_name, lengths):
+    process = SBProcess(max(lengths + [len(MARKER)]))
+    frames = [SBFrame(process, BASE, n) for n in lengths]
+    with mode(mode_name) as handler:
+        started = time.perf_counter()
+        for frame in frames:
+            handler(frame, None, None, {})
+        elapsed = time.perf_counter() - started
+        writes = process.writes
+        # What went to the target: touch mode writes a byte per page, not the range.
+        written = helper.stats.bytes_written
+    # Traced separately: tracemalloc would slow down the timed pass.
+    with mode(mode_name) as handler:
+        tracemalloc.start()
+        floor = tracemalloc.get_traced_memory()[0]
+        for frame in frames:
+            handler(frame, None, None, {})
+        peak = tracemalloc.get_traced_memory()[1] - floor
+        tracemalloc.stop()
+    return {
+        'stream': stream_name,
+        'mode': mode_name,
+        'hits': len(lengths),
+        'bytes': written,
+        'seconds': elapsed,
+        'hits_per_s': len(lengths) / elapsed,
+        'mib_per_s': written / elapsed / (1 << 20),
+        'writes': writes,
+        'peak_bytes': peak,
+    }
+
+
+# -- contract checks --------------------------------------------------------
+
+def check_hit(handler, process, page_len, touch):
+    """Problems with one replayed hit, poisoning the range and a canary first."""
+    memory = process.memory
+    end = max(page_len, len(MARKER))
+    memory[:end + CANARY] = bytes([POISON]) * (end + CANARY)
+    handler(SBFrame(process, BASE, page_len), None, None, {})
+    problems = []
+    if memory[:len(MARKER)] != MARKER:
+        problems.append('range does not start with IHELPED!')
+    if memory.count(POISON, end, end + CANARY) != CANARY:
+        problems.append('wrote past the end of the range')
+    if touch:
+        page = helper.TOUCH_PAGE
+        if any(memory[offset] != 0 for offset in range(page, page_len, page)):
+            problems.append('a page was not touched')
+    elif memory.count(0, len(MARKER), end) != end - len(MARKER):
+        problems.append('range is not zero after the marker')
+    return [f'{page_len} bytes: {p}' for p in problems]
+
+
+def check(streams, hits, seed):
+    problems = []
+    lengths = [0, 1, 7, 8, 9, 4096, helper.CHUNK_SIZE - 1, helper.CHUNK_SIZE,
+               helper.CHUNK_SIZE + 1, 3 * helper.CHUNK_SIZE + 5]
+    rng = random.Random(seed)
+    for name in streams:
+        lengths += stream(name, min(hits, 50), rng)
+    process = SBProcess(max(lengths) + CANARY)
+    for mode_name in MODES:
+        with mode(mode_name) as handler:
+            for page_len in lengths:
+                problems += [f'{mode_name}: {p}' for p in
+                             check_hit(handler, process, page_len, mode_name == 'touch')]
+            # The pool stays within its budget whatever the sizes were.
+            if helper._pool.used > helper._pool.budget:
+                problems.append(f'{mode_name}: buffer pool over budget')
+
+    # A failed write is reported and counted, and stops the hit.
+    with mode('pooled') as handler:
+        process = SBProcess(3 * helper.CHUNK_SIZE)
+        process.fail_at = 2
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            handler(SBFrame(process, BASE, 3 * helper.CHUNK_SIZE), None, None, {})
+        if 'Failed to write' not in out.getvalue():
+            problems.append('failed write not reported')
+        if process.writes != 2 or helper.stats.failures != 1:
+            problems.append('failed write did not stop the hit or was not counted')
+        result = SBCommandReturnObject()
+        helper.rx_stats_command(None, 'json', result, {})
+        if json.loads(result.output[0])['hits'] != 1:
+            problems.append('flutter-rx-stats json does not count the hit')
+
+    debugger = SBDebugger()
+    with contextlib.redirect_stdout(io.StringIO()):
+        helper.__lldb_init_module(debugger, {})
+    callbacks = [bp for bp in debugger.dummy.breakpoints
+                 if bp.callback == f'{helper.__name__}.handle_new_rx_page' and bp.auto_continue]
+    if not callbacks:
+        problems.append('no auto-continuing breakpoint calls handle_new_rx_page')
+    elif callbacks[0].spec != helper.RX_PAGES_REGEX or callbacks[0].modules != helper.MODULES:
+        problems.append(f'breakpoint is {callbacks[0].spec} in {callbacks[0].modules or "all modules"}')
+    if not any('flutter-rx-stats' in c for c in debugger.commands):
+        problems.append('flutter-rx-stats is not registered')
+
+    # Without modules, or without the module list overload, the plain regex.
+    for target, modules in ((SBTarget(), ()), (SBTarget(module_lists=False), ('Flutter',))):
+        bp, _ = helper.create_breakpoint(target, modules)
+        if bp.spec != helper.RX_PAGES_REGEX or bp.modules:
+            problems.append(f'no fallback to the plain regex for modules {modules}')
+    problems += check_locations(debugger)
+    return problems
+
+
+def check_locations(debugger):
+    """The plain regex is added once the hook loads outside the modules, and only then.
+
+    The first time the breakpoint resolves, resolving it is timed on a
+    probe that searches the same modules and is deleted again.
+    """
+    problems = []
+    images = ('/usr/lib/libSystem.B.dylib', '/app/Frameworks/Flutter.framework/Flutter', '/app/Runner')
+    where, modules = helper.stats.breakpoint, helper.stats.modules
+
+    def launched(symbols, locations):
+        # A target primed from the dummy one, its breakpoint resolved at ``locations``.
+        helper.stats.breakpoint, helper.stats.modules = where, modules
+        helper.stats.resolve_seconds = None
+        target = SBTarget(symbols=symbols, modules=images)
+        for bp in debugger.dummy.breakpoints:
+            copy = SBBreakpoint(bp.kind, bp.spec, bp.modules)
+            copy.callback, copy.auto_continue, copy.names = bp.callback, bp.auto_continue, bp.names
+            copy.locations = locations
+            target.breakpoints.append(copy)
+        return target
+
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for symbols, locations, fallback, searched, case in (
+            ((), 0, False, None, 'before the hook loaded'),
+            ((helper.RX_PAGES_SYMBOL,), 1, False, (1, 3), 'with the hook in the modules'),
+            ((helper.RX_PAGES_SYMBOL,), 0, True, (3, 3), 'with the hook outside the modules'),
+        ):
+            target = launched(symbols, locations)
+            helper.check_breakpoint(target)
+            probes = [bp for bp in target.created if bp.spec == helper.PROBE_REGEX]
+            if searched is None and (probes or helper.stats.resolve_seconds is not None):
+                problems.append(f'resolution timed {case}')
+            elif searched is not None and (
+                len(probes) != 1 or helper.stats.resolve_seconds is None
+                or helper.stats.resolve_modules != searched
+                or probes[0].modules != (() if fallback else helper.MODULES)
+            ):
+                problems.append(f'resolution not timed on one probe like the breakpoint {case}')
+            added = target.breakpoints[1:]
+            if bool(added) != fallback:
+                problems.append(f'plain regex {"not " if fallback else ""}added {case}')
+            elif added and (added[0].spec != helper.RX_PAGES_REGEX or added[0].modules
+                            or added[0].callback != f'{helper.__name__}.handle_new_rx_page'):
+                problems.append(f'fallback breakpoint {added[0].spec} is not the plain regex')
+        if 'warning' not in out.getvalue():
+            problems.append('fallback to the plain regex not reported')
+
+        # The same, driven by a modules-loaded event.
+        listeners = [l for l in SBListener.made if l.classes]
+        target = launched((helper.RX_PAGES_SYMBOL,), 0)
+        if not listeners:
+            problems.append('__lldb_init_module does not listen for loaded modules')
+        else:
+            listeners[-1].events.put(SBEvent(target))
+            deadline = time.monotonic() + 2
+            while len(target.breakpoints) == 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if len(target.breakpoints) == 1:
+                problems.append('a modules-loaded event does not check the breakpoint')
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--stream', choices=STREAMS, action='append', help='default: all')
+    parser.add_argument('--mode', choices=MODES, action='append', help='default: all')
+    parser.add_argument('--hits', type=int, default=1000, help='hits per stream (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check-only', action='store_true', help='check the contract, skip the benchmark')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+    streams = args.stream or STREAMS
+
+    problems = check(streams, args.hits, args.seed)
+    for problem in problems:
+        print(f'FAIL {problem}', file=sys.stderr)
+    if problems or args.check_only:
+        print(f'{len(problems)} contract problems.', file=sys.stderr)
+        return 1 if problems else 0
+
+    rows = []
+    for name in streams:
+        lengths = stream(name, args.hits, random.Random(args.seed))
+        for mode_name in args.mode or MODES:
+            row = bench(name, mode_name, lengths)
+            rows.append(row)
+            if not args.json:
+                print(
+                    f"{row['stream']:>6} {row['mode']:>8}  {row['hits']:>6} hits  "
+                    f"{row['bytes'] / (1 << 20):>9.1f} MiB  {row['seconds']:>7.3f} s  "
+                    f"{row['hits_per_s']:>9.0f} hits/s  {row['mib_per_s']:>8.0f} MiB/s  "
+                    f"{row['writes']:>7} writes  peak {row['peak_bytes'] / (1 << 20):>6.2f} MiB"
+                )
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())